@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import subprocess
+
+import box
+import face
+import boxfile
+import gcodegen
+import gcodefile
+import postproc
+import rendercache
+
+REPEATS = 7
+MINRUNTIME = 0.05		# seconds; each timed run repeats the call until it takes this long
+THRESHOLD = 0.15		# fractional change that counts as a regression
+TOOLRAD = 1.5
+XVFBDISPLAY = ":97"
+
+# what each figure is measured in, and whether bigger is better
+UNITS = {"ms": False, "lines/s": True, "MB/s": True}
+
+suites = ["render", "generate", "write", "redraw"]
+
+def measure(fn, repeats=REPEATS):
+	# seconds per call in the fastest of repeats timed runs; anything slower
+	# was the machine doing something else.  The first, untimed runs pick how
+	# many calls make up a run, so that short calls are not lost in timer
+	# resolution and first-call costs are not counted.
+	number = 1
+	while True:
+		start = time.perf_counter()
+		for j in range(number):
+			fn()
+		if time.perf_counter() - start >= MINRUNTIME:
+			break
+		number *= 2
+
+	runs = []
+	for i in range(repeats):
+		start = time.perf_counter()
+		for j in range(number):
+			fn()
+		runs.append((time.perf_counter() - start) / number)
+	return min(runs)
+
+def corpus():
+	# synthetic boxes covering the shapes that matter for speed: tab density,
+	# relief, blind joints, openings and dividers
+	boxes = []
+	st = boxfile.defaultState()
+	boxes.append(["plain", st])
+
+	st = boxfile.defaultState()
+	st["tabcount"] = [4, 4, 4]
+	boxes.append(["tabs4", st])
+
+	st = boxfile.defaultState()
+	st["width"] = 400.0
+	st["height"] = 300.0
+	st["depth"] = 250.0
+	st["tabcount"] = [24, 32, 24]
+	st["tablength"] = [5, 5, 5]
+	st["relief"] = box.HRELIEF
+	boxes.append(["dense-relief", st])
+
+	st = boxfile.defaultState()
+	st["tabcount"] = [3, 3, 3]
+	st["blindtabs"] = [True, False, False, False, True, True]
+	st["relief"] = box.WRELIEF
+	boxes.append(["blind", st])
+
+	st = boxfile.defaultState()
+	st["width"] = 300.0
+	st["depth"] = 200.0
+	st["tabcount"] = [3, 5, 5]
+	st["dividers"] = [[box.DIVIDER_ACROSS, -40.0], [box.DIVIDER_ACROSS, 40.0], [box.DIVIDER_ALONG, 0.0]]
+	st["circles"][box.FACE_TOP] = [[[x, y], 6.0] for x in [-100, -50, 0, 50, 100] for y in [-50, 0, 50]]
+	st["rectangles"][box.FACE_FRONT] = [[[x, 0.0], 20.0, 10.0] for x in [-90, -30, 30, 90]]
+	boxes.append(["dividers-openings", st])
+	return [[n, boxfile.normalizeState(st)] for n, st in boxes]
+
+def benchRender(results, repeats):
+	# one face outline, uncached, across tab counts and relief modes
+	reliefs = [["none", face.face.setNoRelief], ["h", face.face.setHRelief], ["w", face.face.setWRelief]]
+	for tabs in [0, 4, 16, 64]:
+		for rname, setRelief in reliefs:
+			fc = face.face(300.0, 400.0, 6.0)
+			fc.setTabCount(face.FHEIGHT, tabs)
+			fc.setTabCount(face.FWIDTH, tabs)
+			fc.setTabLen(face.FHEIGHT, 3)
+			fc.setTabLen(face.FWIDTH, 3)
+			fc.setTabType(face.FHEIGHT, box.SLOTS)
+			setRelief(fc)
+			t = measure(lambda: fc.render(TOOLRAD, False, False, [False] * 4), repeats)
+			results["render/tabs%d/relief-%s" % (tabs, rname)] = [t * 1000.0, "ms"]
+
+def programsFor(state, post):
+	bx = box.fromState(state, TOOLRAD)
+	gen = gcodegen.GCodeGenerator()
+	gen.setSettings({"post": post})
+	programs = []
+	for pid in bx.panelTypes():
+		programs.append(gen.generate(bx, pid, TOOLRAD))
+	return programs
+
+def benchGenerate(results, repeats):
+	# every panel of a box from a cold render cache, as a batch job sees it
+	for name, state in corpus():
+		for post in postproc.postNames:
+			out = []
+			def run():
+				rendercache.cache.clear()
+				out[:] = programsFor(state, post)
+			t = measure(run, repeats)
+			lines = sum([len(p) for p in out])
+			size = sum([sum([len(l) + 1 for l in p]) for p in out])
+			key = "generate/%s/%s" % (name, post)
+			results[key + "/time"] = [t * 1000.0, "ms"]
+			results[key + "/lines"] = [lines / t, "lines/s"]
+			results[key + "/bytes"] = [size / t / 1e6, "MB/s"]
+
+def benchWrite(results, repeats):
+	gcode = []
+	for name, state in corpus():
+		for p in programsFor(state, postproc.DEFAULTPOST):
+			gcode.extend(p)
+	size = sum([len(l) + 1 for l in gcode]) / 1e6
+
+	d = tempfile.mkdtemp()
+	try:
+		for cname, compression in [["plain", gcodefile.COMPRESS_NONE], ["gzip", gcodefile.COMPRESS_GZIP], ["zstd", gcodefile.COMPRESS_ZSTD]]:
+			if compression == gcodefile.COMPRESS_ZSTD and gcodefile.zstandard is None:
+				print("write/zstd skipped: zstandard is not installed")
+				continue
+			fn = os.path.join(d, "bench.nc")
+			t = measure(lambda: gcodefile.writeGCode(fn, gcode, compression), repeats)
+			results["write/%s/time" % cname] = [t * 1000.0, "ms"]
+			results["write/%s/bytes" % cname] = [size / t, "MB/s"]
+	finally:
+		shutil.rmtree(d)
+
+def virtualDisplay():
+	# an Xvfb server for the redraw benchmarks when there is no display
+	if os.environ.get("DISPLAY") or sys.platform in ["win32", "darwin"]:
+		return None
+	if shutil.which("Xvfb") is None:
+		return None
+	p = subprocess.Popen(["Xvfb", XVFBDISPLAY, "-screen", "0", "1024x768x24"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	time.sleep(1.0)
+	os.environ["DISPLAY"] = XVFBDISPLAY
+	return p
+
+def benchRedraw(results, repeats):
+	xvfb = virtualDisplay()
+	try:
+		try:
+			import wx
+			from gcframe import GcFrame
+		except ImportError as e:
+			print("redraw skipped: %s" % str(e))
+			return
+
+		app = wx.App(False)
+		frame = wx.Frame(None, wx.ID_ANY, "bench")
+		gcf = GcFrame(frame)
+		frame.Show()
+
+		for name, state in corpus():
+			bx = box.fromState(state, TOOLRAD)
+			pts, c, r = bx.render(box.FACE_TOP, TOOLRAD)
+			gcf.setData(pts, c, r + bx.getSlots(box.FACE_TOP), TOOLRAD, 0)
+			t = measure(gcf.redrawGraph, repeats)
+			results["redraw/%s/face" % name] = [t * 1000.0, "ms"]
+
+			tiles = []
+			for pid in bx.panelTypes():
+				pts, c, r = bx.render(pid, TOOLRAD)
+				tiles.append([bx.panelName(pid), pts, c, r + bx.getSlots(pid)])
+			gcf.setTiles(tiles, 0)
+			t = measure(gcf.redrawGraph, repeats)
+			results["redraw/%s/tiles" % name] = [t * 1000.0, "ms"]
+			gcf.clearTiles()
+
+		frame.Destroy()
+		app.Destroy()
+	finally:
+		if xvfb is not None:
+			xvfb.terminate()
+
+def run(only=None, repeats=REPEATS):
+	results = {}
+	for s in suites:
+		if only is None or s in only:
+			globals()["bench" + s.capitalize()](results, repeats)
+	return results
+
+def environment():
+	return {
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"machine": platform.machine(),
+		"node": platform.node(),
+	}
+
+def best(a, b):
+	# the better of two measurements of every figure
+	out = dict(a)
+	for n, [v, unit] in b.items():
+		if n not in out or (v > out[n][0]) == UNITS[unit]:
+			out[n] = [v, unit]
+	return out
+
+def compare(results, baseline, threshold=THRESHOLD):
+	# [name, value, unit, baseline value, change, regressed] for every figure
+	# measured both times.  change is positive when things got better.
+	rows = []
+	for n in sorted(results.keys()):
+		v, unit = results[n]
+		if n not in baseline:
+			rows.append([n, v, unit, None, None, False])
+			continue
+		b = baseline[n][0]
+		if b == 0 or v == 0:
+			rows.append([n, v, unit, b, None, False])
+			continue
+		change = v / b - 1.0 if UNITS[unit] else b / v - 1.0
+		rows.append([n, v, unit, b, change, change < -threshold])
+	return rows
+
+def report(rows):
+	lines = ["%-48s %12s %-8s %12s %8s" % ("benchmark", "value", "unit", "baseline", "change")]
+	for n, v, unit, b, change, regressed in rows:
+		if b is None:
+			lines.append("%-48s %12.3f %-8s %12s %8s" % (n, v, unit, "-", "-"))
+		else:
+			lines.append("%-48s %12.3f %-8s %12.3f %+7.1f%%%s" % (n, v, unit, b, (change or 0.0) * 100.0, "  REGRESSED" if regressed else ""))
+	return "\n".join(lines)
+
+def saveBaseline(path, results):
+	d = {"environment": environment(), "results": results}
+	tfn = path + ".tmp"
+	with open(tfn, "w") as fp:
+		json.dump(d, fp, indent=1, sort_keys=True)
+	os.replace(tfn, path)
+
+def loadBaseline(path):
+	with open(path, "r") as fp:
+		return json.load(fp)["results"]
+
+if __name__ == "__main__":
+	only = None
+	repeats = REPEATS
+	threshold = THRESHOLD
+	save = None
+	baseline = None
+	for a in sys.argv[1:]:
+		if a.startswith("--only="):
+			only = a[7:].split(",")
+		elif a.startswith("--repeats="):
+			repeats = int(a[10:])
+		elif a.startswith("--threshold="):
+			threshold = float(a[12:])
+		elif a.startswith("--save="):
+			save = a[7:]
+		elif a.startswith("--compare="):
+			baseline = a[10:]
+		else:
+			print("usage: %s [--only=%s] [--repeats=n] [--save=baseline.json] [--compare=baseline.json] [--threshold=f]" % (sys.argv[0], ",".join(suites)))
+			sys.exit(1)
+
+	results = run(only, repeats)
+	base = {}
+	if baseline is not None:
+		try:
+			base = loadBaseline(baseline)
+		except (OSError, ValueError, KeyError) as e:
+			print("Unable to load baseline %s: %s" % (baseline, str(e)))
+			sys.exit(2)
+
+	rows = compare(results, base, threshold)
+	suspect = sorted(set([r[0].split("/")[0] for r in rows if r[5]]))
+	if len(suspect) > 0:
+		# measure again before calling it a regression; a single slow run is
+		# more often the machine than the code
+		results = best(results, run(suspect, repeats))
+		rows = compare(results, base, threshold)
+	print(report(rows))
+	if save is not None:
+		saveBaseline(save, results)
+		print("baseline saved to %s" % save)
+
+	regressed = [r[0] for r in rows if r[5]]
+	if len(regressed) > 0:
+		print("%d benchmark(s) regressed by more than %d%%" % (len(regressed), int(threshold * 100)))
+		sys.exit(1)
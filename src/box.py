@@ -1,6 +1,13 @@
+import logging
+
 import face
+import boxfile
+import tablayout
+import rendercache
+import panelgraph
+import metrics
 
-import configparser
+log = logging.getLogger(__name__)
 
 CORNER_FRONT_SIDE = 0
 CORNER_FRONT_TOP = 1
@@ -20,10 +27,36 @@ faceTypes = [FACE_TOP, FACE_BOTTOM, FACE_LEFT, FACE_RIGHT, FACE_FRONT, FACE_BACK
 TABS = 0
 SLOTS = 1
 
+# the face edges that meet at each corner type; all of them share one tab layout
+jointFaces = [
+	[[FACE_FRONT, face.FHEIGHT], [FACE_BACK, face.FHEIGHT], [FACE_LEFT, face.FHEIGHT], [FACE_RIGHT, face.FHEIGHT]],
+	[[FACE_FRONT, face.FWIDTH], [FACE_BACK, face.FWIDTH], [FACE_TOP, face.FWIDTH], [FACE_BOTTOM, face.FWIDTH]],
+	[[FACE_LEFT, face.FWIDTH], [FACE_RIGHT, face.FWIDTH], [FACE_TOP, face.FHEIGHT], [FACE_BOTTOM, face.FHEIGHT]],
+]
+
 NRELIEF = 0
 HRELIEF = 1
 WRELIEF = 2
 
+faceNames = ["Top", "Bottom", "Left", "Right", "Front", "Back"]
+
+# the panel on each side of every face, in panelgraph side order
+faceSides = [
+	[FACE_LEFT, FACE_BACK, FACE_RIGHT, FACE_FRONT],
+	[FACE_RIGHT, FACE_BACK, FACE_LEFT, FACE_FRONT],
+	[FACE_FRONT, FACE_TOP, FACE_BACK, FACE_BOTTOM],
+	[FACE_BACK, FACE_TOP, FACE_FRONT, FACE_BOTTOM],
+	[FACE_LEFT, FACE_TOP, FACE_RIGHT, FACE_BOTTOM],
+	[FACE_RIGHT, FACE_TOP, FACE_LEFT, FACE_BOTTOM],
+]
+
+# dividers parallel to the front and back, placed along the depth, or parallel
+# to the sides, placed along the width; positions are measured from the center
+DIVIDER_ACROSS = 0
+DIVIDER_ALONG = 1
+
+dividerTypes = [DIVIDER_ACROSS, DIVIDER_ALONG]
+
 class box:
 	def __init__(self, h, w, d, thk):
 		self.Width = w
@@ -34,10 +67,18 @@ class box:
 		self.TabCt = [0, 0, 0]
 		self.TabLen = [10, 10, 10]
 		self.TabType = [TABS, TABS, TABS]
+		self.TabPitch = [0, 0, 0]
+		self.MinWeb = 5.0
+		self.CornerClear = 10.0
+		self.OpeningClear = 2.0
 		self.Relief = NRELIEF
 		
 		self.BlindTabs = [False, False, False, False, False, False]
 		
+		self.Dividers = []
+		self.DividerTabCt = 2
+		self.DividerTabLen = 10
+		
 		self.currentFace = None
 		self.initFaces()
 		
@@ -70,192 +111,161 @@ class box:
 		for fc in self.faces:
 			fc.setNoRelief()
 			
-	def saveBox(self, fn):
-		config = ConfigParser.SafeConfigParser()
+		self.graph = panelgraph.PanelGraph()
+		for ft in faceTypes:
+			self.graph.addPanel(ft, faceNames[ft], self.faces[ft])
+		for ft in faceTypes:
+			for side in panelgraph.sides:
+				other = faceSides[ft][side]
+				if other > ft:
+					c = [ct for ct in cornerTypes if ft in [e[0] for e in jointFaces[ct]] and other in [e[0] for e in jointFaces[ct]]][0]
+					self.graph.connect(ft, side, other, faceSides[other].index(ft), c)
+			
+	def buildDividers(self):
+		for pid in self.graph.panelIds():
+			if pid not in faceTypes:
+				self.graph.removePanel(pid)
+		del self.faces[len(faceTypes):]
+		
+		placed = []
+		for dt, pos in self.Dividers:
+			if not self.dividerFits(dt, pos):
+				log.warning("divider at %f does not fit the box; ignored", pos)
+				continue
+			
+			pid = len(self.faces)
+			if dt == DIVIDER_ACROSS:
+				fc = face.face(self.Height, self.Width, self.Wall)
+			else:
+				fc = face.face(self.Height, self.Depth, self.Wall)
+			fc.setTabType(face.FHEIGHT, TABS)
+			fc.setTabType(face.FWIDTH, TABS)
+			fc.setTabLen(face.FHEIGHT, self.DividerTabLen)
+			fc.setTabLen(face.FWIDTH, self.DividerTabLen)
+			fc.setTabCount(face.FHEIGHT, self.DividerTabCt)
+			fc.setTabCount(face.FWIDTH, self.DividerTabCt)
+			fc.setPlainSides([False, True, False, False])
+			if self.Relief == HRELIEF:
+				fc.setHRelief()
+			elif self.Relief == WRELIEF:
+				fc.setWRelief()
+			else:
+				fc.setNoRelief()
+			self.faces.append(fc)
+			self.graph.addPanel(pid, "Divider %d" % (pid - len(faceTypes) + 1), fc)
+			
+			# the right, back and bottom faces are seen from outside the box, so
+			# their x axis runs the opposite way to the left and front faces
+			if dt == DIVIDER_ACROSS:
+				self.graph.attach(pid, panelgraph.SIDE_LEFT, FACE_LEFT, panelgraph.AXIS_X, pos)
+				self.graph.attach(pid, panelgraph.SIDE_RIGHT, FACE_RIGHT, panelgraph.AXIS_X, -pos)
+				self.graph.attach(pid, panelgraph.SIDE_BOTTOM, FACE_BOTTOM, panelgraph.AXIS_Y, pos)
+			else:
+				self.graph.attach(pid, panelgraph.SIDE_LEFT, FACE_FRONT, panelgraph.AXIS_X, pos)
+				self.graph.attach(pid, panelgraph.SIDE_RIGHT, FACE_BACK, panelgraph.AXIS_X, -pos)
+				self.graph.attach(pid, panelgraph.SIDE_BOTTOM, FACE_BOTTOM, panelgraph.AXIS_X, -pos)
+				
+			# dividers that cross are joined with a half lap: the one running
+			# across is notched from the top, the one running along from the bottom
+			for qid, qt, qpos in placed:
+				if qt == dt:
+					continue
+				if dt == DIVIDER_ACROSS:
+					self.graph.notch(pid, qid, panelgraph.AXIS_X, qpos, True)
+					self.graph.notch(qid, pid, panelgraph.AXIS_X, pos, False)
+				else:
+					self.graph.notch(qid, pid, panelgraph.AXIS_X, pos, True)
+					self.graph.notch(pid, qid, panelgraph.AXIS_X, qpos, False)
+			placed.append([pid, dt, pos])
+			
+	def dividerFits(self, dt, pos):
+		if dt == DIVIDER_ACROSS:
+			limit = self.Depth / 2.0 - 1.5 * self.Wall
+		else:
+			limit = self.Width / 2.0 - 1.5 * self.Wall
+		return abs(pos) <= limit
+		
+	def setDividers(self, dividers):
+		for dt, pos in dividers:
+			if dt not in dividerTypes or not self.dividerFits(dt, pos):
+				raise ValueError("divider at %s does not fit the box" % str(pos))
+		self.Dividers = [[dt, pos] for dt, pos in dividers]
+		self.buildDividers()
+		
+	def setDividerTabs(self, n, l):
+		self.DividerTabCt = n
+		self.DividerTabLen = l
+		self.buildDividers()
+		
+	def panelTypes(self):
+		return self.graph.panelIds()
+	
+	def panelName(self, pid):
+		return self.graph.panels[pid].name
+	
+	def getSlots(self, pid):
+		return self.graph.slotsFor(pid)
+	
+	def getNotches(self, pid):
+		return self.graph.notchesFor(pid)
+			
+	def getState(self):
+		state = self.getSettingsState()
+		state["circles"] = [self.faces[f].renderCircles() for f in faceTypes]
+		state["rectangles"] = [self.faces[f].renderRects() for f in faceTypes]
+		return state
+	
+	def getSettingsState(self):
+		return {
+			"width": self.Width,
+			"height": self.Height,
+			"depth": self.Depth,
+			"wall": self.Wall,
+			"tabcount": self.TabCt[:],
+			"tablength": self.TabLen[:],
+			"tabtype": self.TabType[:],
+			"tabpitch": self.TabPitch[:],
+			"minweb": self.MinWeb,
+			"cornerclear": self.CornerClear,
+			"openingclear": self.OpeningClear,
+			"relief": self.Relief,
+			"blindtabs": self.BlindTabs[:],
+			"dividers": [[dt, pos] for dt, pos in self.Dividers],
+			"dividertabcount": self.DividerTabCt,
+			"dividertablength": self.DividerTabLen,
+		}
 
-		section = 'box'
-		config.add_section(section)
-		config.set(section, 'width', str(self.Width))
-		config.set(section, 'height', str(self.Height))
-		config.set(section, 'depth', str(self.Depth))
-		config.set(section, 'wall', str(self.Wall))
-		config.set(section, 'tabcount', str(self.TabCt))
-		config.set(section, 'tablength', str(self.TabLen))
-		config.set(section, 'tabtype', str(self.TabType))
-		config.set(section, 'relief', str(self.Relief))
-		
-		section = "blindtabs"
-		config.add_section(section)
+	def setState(self, state, toolrad):
+		self.setWidth(state["width"])
+		self.setHeight(state["height"])
+		self.setDepth(state["depth"])
+		self.setWall(state["wall"], toolrad)
+		self.setTabLayoutLimits(state["minweb"], state["cornerclear"], state["openingclear"])
+		for c in cornerTypes:
+			self.setTabCount(c, state["tabcount"][c])
+			self.setTabLen(c, state["tablength"][c])
+			self.setTabType(c, state["tabtype"][c])
+			self.setTabPitch(c, state["tabpitch"][c])
+		self.setRelief(state["relief"])
+		self.setBlindTabs(state["blindtabs"][:])
+		self.Dividers = [[dt, pos] for dt, pos in state["dividers"]]
+		self.setDividerTabs(state["dividertabcount"], state["dividertablength"])
 		for f in faceTypes:
-			config.set(section, "face_%d" % f, str(self.BlindTabs[f]))
+			self.setCircles(f, state["circles"][f])
+			self.setRectangles(f, state["rectangles"][f])
 
-		for f in faceTypes:
-			c = self.faces[f].renderCircles()
-			if len(c) != 0:
-				section = "face_%d_circles" % f
-				config.add_section(section)
-				config.set(section, "cx", str([x[0][0] for x in c]))
-				config.set(section, "cy", str([y[0][1] for y in c]))
-				config.set(section, "radii", str([r[1] for r in c]))
-			r = self.faces[f].renderRects()
-			if len(r) != 0:
-				section = "face_%d_rectangles" % f
-				config.add_section(section)
-				config.set(section, "cx", str([x[0][0] for x in r]))
-				config.set(section, "cy", str([y[0][1] for y in r]))
-				config.set(section, "width", str([w[1] for w in r]))
-				config.set(section, "height", str([h[2] for h in r]))
-		
-		with open(fn, 'wb') as configfile:
-			config.write(configfile)
+	def saveBox(self, fn):
+		boxfile.writeBox(fn, self.getState())
 			
 	def loadBox(self, fn, toolrad):
-		s = ""
-		config = ConfigParser.SafeConfigParser()
-		config.read(fn)
-
-		section = 'box'	  
-		if config.has_section(section):
-			for n, v in config.items(section):
-				if n == 'width':
-					try:
-						w = float(v)
-					except:
-						print("invalid value in box file for width")
-						w = 100
-					self.setWidth(w)
-				elif n == 'height':
-					try:
-						h = float(v)
-					except:
-						print("invalid value in box file for height")
-						h = 100
-					self.setHeight(h)
-				elif n == 'depth':
-					try:
-						d = float(v)
-					except:
-						print("invalid value in box file for depth")
-						d = 100
-					self.setDepth(d)
-				elif n == 'wall':
-					try:
-						w = float(v)
-					except:
-						print("invalid value in box file for wall")
-						w = 6
-					self.setWall(w, toolrad)
-
-				elif n == 'tabcount':
-					try:
-						exec("s=%s" % v)
-					except:
-						print("invalid value in box file for tabcount")
-						s = [0, 0, 0]
-					for c in cornerTypes:
-						self.setTabCount(c, s[c])
-				elif n == 'tablength':
-					try:
-						exec("s=%s" % v)
-					except:
-						print("invalid value in box file for tablength")
-						s = [10, 10, 10]
-					for c in cornerTypes:
-						self.setTabLen(c, s[c])
-				elif n == 'tabtype':
-					try:
-						exec("s=%s" % v)
-					except:
-						print("invalid value in box file for tabtype")
-						s = [0, 0, 0]
-					for c in cornerTypes:
-						self.setTabType(c, s[c])
-				elif n == 'relief':
-					try:
-						r = int(v)
-					except:
-						print("invalid value in box file for relief")
-						r = NRELIEF
-					self.setRelief(r)
-				else:
-					print("Unknown parameter: %s" % n)
-		
-		section = "blindtabs"
-		if config.has_section(section):
-			for f in faceTypes:
-				try:
-					flg = config.get(section, "face_%d" % f)
-					if flg.startswith("T") or flg.startswith("t"):
-						flg = True
-					else:
-						flg = False
-				except:
-					flg = False
-				self.BlindTabs[f] = flg
-					
-		for f in faceTypes:
-			section = "face_%d_circles" % f
-			if config.has_section(section):
-				cx = ""
-				cy = ""
-				rad = ""
-				try:
-					cxs = config.get(section, "cx")
-					exec("cx=%s" % cxs)
-					cys = config.get(section, "cy")
-					exec("cy=%s" % cys)
-					rads = config.get(section, "radii")
-					exec("rad=%s" % rads)
-				except:
-					print("Unable to process section %s" % section)
-					continue
-				
-				lx = len(cx);
-				ly = len(cy)
-				lr = len(rad)
-				if lx != ly or ly != lr or lr != lx:
-					print("Invalid data for section %s" % section)
-					continue
-				
-				c = []
-				for i in range(lx):
-					c.append([[cx[i], cy[i]], rad[i]])
-					
-				self.setCircles(f, c)
-				
-			section = "face_%d_rectangles" % f
-			if config.has_section(section):
-				cx = ""
-				cy = ""
-				lx = ""
-				ly = ""
-				try:
-					cxs = config.get(section, "cx")
-					exec("cx=%s" % cxs)
-					cys = config.get(section, "cy")
-					exec("cy=%s" % cys)
-					lxs = config.get(section, "width")
-					exec("lx=%s" % lxs)
-					lys = config.get(section, "height")
-					exec("ly=%s" % lys)
-				except:
-					print("Unable to process section %s" % section)
-					continue
-				
-				lencx = len(cx);
-				lency = len(cy)
-				lenlx = len(lx)
-				lenly = len(ly)
-				if lencx != lency or lency != lenlx or lenlx != lenly:
-					print("Invalid data for section %s" % section)
-					continue
-				
-				r = []
-				for i in range(lencx):
-					r.append([[cx[i], cy[i]], lx[i], ly[i]])
-					
-				self.setRectangles(f, r)
+		try:
+			state = boxfile.readBox(fn)
+		except (OSError, boxfile.BoxFileError) as e:
+			log.error("Unable to load box file %s: %s", fn, str(e))
+			return False
 
+		self.setState(state, toolrad)
+		return True
 			
 	def setHeight(self, nh):
 		self.Height = nh
@@ -263,6 +273,8 @@ class box:
 		self.faces[FACE_RIGHT].setHeight(nh)
 		self.faces[FACE_FRONT].setHeight(nh)
 		self.faces[FACE_BACK].setHeight(nh)
+		self.applyTabLayout(CORNER_FRONT_SIDE)
+		self.buildDividers()
 		
 	def setWidth(self, nw):
 		self.Width = nw
@@ -270,6 +282,8 @@ class box:
 		self.faces[FACE_BOTTOM].setWidth(nw)
 		self.faces[FACE_FRONT].setWidth(nw)
 		self.faces[FACE_BACK].setWidth(nw)
+		self.applyTabLayout(CORNER_FRONT_TOP)
+		self.buildDividers()
 		
 	def setDepth(self, nd):
 		self.Depth = nd
@@ -277,13 +291,15 @@ class box:
 		self.faces[FACE_BOTTOM].setHeight(nd)
 		self.faces[FACE_LEFT].setWidth(nd)
 		self.faces[FACE_RIGHT].setWidth(nd)
+		self.applyTabLayout(CORNER_SIDE_TOP)
+		self.buildDividers()
 		
 	def setWall(self, nw, toolrad):
 		self.Wall = nw
 		for fc in self.faces:
 			fc.setWall(nw)
-			
-		self.render(self.currentFace, toolrad)
+		self.applyTabLayouts()
+		self.buildDividers()
 		
 	def setBlindTabs(self, bt):
 		self.BlindTabs = bt
@@ -320,6 +336,7 @@ class box:
 			self.faces[FACE_RIGHT].setTabCount(face.FWIDTH, n)
 			self.faces[FACE_TOP].setTabCount(face.FHEIGHT, n)
 			self.faces[FACE_BOTTOM].setTabCount(face.FHEIGHT, n)
+		self.applyTabLayout(cornerType)
 		
 	def setTabLen(self, cornerType, l):
 		self.TabLen[cornerType] = l
@@ -338,6 +355,45 @@ class box:
 			self.faces[FACE_RIGHT].setTabLen(face.FWIDTH, l)
 			self.faces[FACE_TOP].setTabLen(face.FHEIGHT, l)
 			self.faces[FACE_BOTTOM].setTabLen(face.FHEIGHT, l)
+		self.applyTabLayout(cornerType)
+		
+	def setTabPitch(self, cornerType, p):
+		self.TabPitch[cornerType] = p
+		self.applyTabLayout(cornerType)
+		
+	def setTabLayoutLimits(self, minWeb, cornerClear, openingClear):
+		self.MinWeb = minWeb
+		self.CornerClear = cornerClear
+		self.OpeningClear = openingClear
+		self.applyTabLayouts()
+		
+	def applyTabLayouts(self):
+		for c in cornerTypes:
+			self.applyTabLayout(c)
+		
+	def applyTabLayout(self, cornerType):
+		edges = jointFaces[cornerType]
+		if self.TabPitch[cornerType] <= 0:
+			for ft, horw in edges:
+				if self.faces[ft].tabsFixed(horw):
+					self.faces[ft].setTabs(horw, None)
+					self.faces[ft].setTabCount(horw, self.TabCt[cornerType])
+			return
+		
+		keepOut = []
+		for ft, horw in edges:
+			keepOut.extend(self.faces[ft].edgeKeepOut(horw, self.OpeningClear))
+			
+		w, h = self.faces[edges[0][0]].getDim()
+		if edges[0][1] == face.FWIDTH:
+			length = w
+		else:
+			length = h
+			
+		tabs = tablayout.solveTabs(length, self.TabLen[cornerType], self.TabPitch[cornerType],
+					self.MinWeb, self.CornerClear, keepOut, self.OpeningClear)
+		for ft, horw in edges:
+			self.faces[ft].setTabs(horw, tabs)
 		
 	def setTabType(self, cornerType, tt):
 		self.TabType[cornerType] = tt;
@@ -363,32 +419,61 @@ class box:
 			
 	def setCircles(self, facetype, c):
 		self.faces[facetype].setCircles(c)
+		self.applyTabLayouts()
 		
 	def setRectangles(self, facetype, r):
 		self.faces[facetype].setRectangles(r)
+		self.applyTabLayouts()
 
+	def getCircles(self, faceType):
+		return self.faces[faceType].renderCircles()
+	
+	def getRectangles(self, faceType):
+		return self.faces[faceType].renderRects()
+		
+	def cachedOutline(self, faceType, toolrad, blindDepth = False):
+		adj = self.adjacentBlind(faceType)
+		if adj is None:
+			return None
+		pts = rendercache.cache.get(self.faces[faceType].outlineKey(toolrad, blindDepth, self.isBlind(faceType), adj))
+		if pts is None:
+			return None
+		return pts[:]
+		
+	def isBlind(self, pid):
+		return pid in faceTypes and self.BlindTabs[pid]
+		
+	def adjacentBlind(self, faceType):
+		if faceType not in self.graph.panels:
+			return None
+		return [n is not None and self.isBlind(n) for n in self.graph.neighbors(faceType)]
+	
 	def render(self, faceType, toolrad, blindDepth = False):
 		if faceType is None:
 			return 
 		
-		if faceType == FACE_TOP:
-			adj = [self.BlindTabs[FACE_LEFT], self.BlindTabs[FACE_BACK], self.BlindTabs[FACE_RIGHT], self.BlindTabs[FACE_FRONT]]
-		elif faceType == FACE_BOTTOM:
-			adj = [self.BlindTabs[FACE_RIGHT], self.BlindTabs[FACE_BACK], self.BlindTabs[FACE_LEFT], self.BlindTabs[FACE_FRONT]]
-		elif faceType == FACE_LEFT:
-			adj = [self.BlindTabs[FACE_BOTTOM], self.BlindTabs[FACE_BACK], self.BlindTabs[FACE_TOP], self.BlindTabs[FACE_FRONT]]
-		elif faceType == FACE_RIGHT:
-			adj = [self.BlindTabs[FACE_TOP], self.BlindTabs[FACE_BACK], self.BlindTabs[FACE_BOTTOM], self.BlindTabs[FACE_FRONT]]
-		elif faceType == FACE_FRONT:
-			adj = [self.BlindTabs[FACE_LEFT], self.BlindTabs[FACE_TOP], self.BlindTabs[FACE_RIGHT], self.BlindTabs[FACE_BOTTOM]]
-		elif faceType == FACE_BACK:
-			adj = [self.BlindTabs[FACE_RIGHT], self.BlindTabs[FACE_TOP], self.BlindTabs[FACE_LEFT], self.BlindTabs[FACE_BOTTOM]]
-		else:
+		adj = self.adjacentBlind(faceType)
+		if adj is None:
 			return
 			
 		self.currentFace = faceType 
 		
-		print("rendering face %d blind = %s" % (faceType, blindDepth))
+		log.debug("rendering face %d blind = %s", faceType, blindDepth)
 		
-		return self.faces[faceType].render(toolrad, blindDepth, self.BlindTabs[faceType], adj)
-		
\ No newline at end of file
+		fc = self.faces[faceType]
+		blind = self.isBlind(faceType)
+		key = fc.outlineKey(toolrad, blindDepth, blind, adj)
+		pts = rendercache.cache.get(key)
+		if pts is None:
+			pts, c, r = fc.render(toolrad, blindDepth, blind, adj)
+			rendercache.cache.put(key, pts)
+			return pts[:], c, r + self.graph.slotsFor(faceType)
+		
+		return pts[:], fc.renderCircles(), fc.renderRects() + self.graph.slotsFor(faceType)
+		
+metrics.instrument(box, "render", "box.render")
+
+def fromState(state, toolrad):
+	bx = box(state["height"], state["width"], state["depth"], state["wall"])
+	bx.setState(state, toolrad)
+	return bx
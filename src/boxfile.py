@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import ast
+import configparser
+import logging
+
+log = logging.getLogger(__name__)
+
+BOXFORMAT = "cncbox"
+BOXVERSION = 1
+BOXEXT = ".box"
+
+NFACES = 6
+
+DEFAULTS = {
+	"width": 100.0,
+	"height": 100.0,
+	"depth": 100.0,
+	"wall": 6.0,
+	"tabcount": [0, 0, 0],
+	"tablength": [10, 10, 10],
+	"tabtype": [0, 0, 0],
+	"tabpitch": [0, 0, 0],
+	"minweb": 5.0,
+	"cornerclear": 10.0,
+	"openingclear": 2.0,
+	"relief": 0,
+	"dividertabcount": 2,
+	"dividertablength": 10,
+}
+
+class BoxFileError(Exception):
+	pass
+
+def defaultState():
+	return {
+		"width": DEFAULTS["width"],
+		"height": DEFAULTS["height"],
+		"depth": DEFAULTS["depth"],
+		"wall": DEFAULTS["wall"],
+		"tabcount": DEFAULTS["tabcount"][:],
+		"tablength": DEFAULTS["tablength"][:],
+		"tabtype": DEFAULTS["tabtype"][:],
+		"tabpitch": DEFAULTS["tabpitch"][:],
+		"minweb": DEFAULTS["minweb"],
+		"cornerclear": DEFAULTS["cornerclear"],
+		"openingclear": DEFAULTS["openingclear"],
+		"relief": DEFAULTS["relief"],
+		"blindtabs": [False] * NFACES,
+		"dividers": [],
+		"dividertabcount": DEFAULTS["dividertabcount"],
+		"dividertablength": DEFAULTS["dividertablength"],
+		"circles": [[] for i in range(NFACES)],
+		"rectangles": [[] for i in range(NFACES)],
+	}
+
+def isLegacy(fn):
+	with open(fn, "rb") as fp:
+		head = fp.read(64).lstrip()
+	return not head.startswith(b"{")
+
+def readBox(fn):
+	if isLegacy(fn):
+		return readLegacyBox(fn)
+
+	with open(fn, "r", encoding="utf-8") as fp:
+		try:
+			d = json.load(fp)
+		except ValueError as e:
+			raise BoxFileError("%s: %s" % (fn, str(e)))
+
+	if not isinstance(d, dict) or d.get("format") != BOXFORMAT:
+		raise BoxFileError("%s: not a box file" % fn)
+	version = d.get("version", 0)
+	if type(version) is not int:
+		raise BoxFileError("%s: invalid box file version %r" % (fn, version))
+	if version > BOXVERSION:
+		raise BoxFileError("%s: box file version %d is newer than supported version %d" % (fn, version, BOXVERSION))
+
+	return normalizeState(d)
+
+def writeBox(fn, state):
+	d = {"format": BOXFORMAT, "version": BOXVERSION}
+	d.update(normalizeState(state))
+
+	tfn = fn + ".tmp"
+	try:
+		with open(tfn, "w", encoding="utf-8") as fp:
+			json.dump(d, fp, separators=(",", ":"))
+		os.replace(tfn, fn)
+	finally:
+		if os.path.exists(tfn):
+			os.remove(tfn)
+
+def normalizeState(d):
+	s = defaultState()
+	for n in ["width", "height", "depth", "wall", "minweb", "cornerclear", "openingclear"]:
+		if n in d:
+			try:
+				s[n] = float(d[n])
+			except (TypeError, ValueError):
+				log.warning("invalid value in box file for %s", n)
+
+	for n in ["tabcount", "tablength", "tabtype", "tabpitch"]:
+		if n in d:
+			try:
+				if n == "tabpitch":
+					v = [float(x) for x in d[n]]
+				else:
+					v = [int(x) for x in d[n]]
+				if len(v) != 3:
+					raise ValueError
+				s[n] = v
+			except (TypeError, ValueError):
+				log.warning("invalid value in box file for %s", n)
+
+	for n in ["relief", "dividertabcount", "dividertablength"]:
+		if n in d:
+			try:
+				s[n] = int(d[n])
+			except (TypeError, ValueError):
+				log.warning("invalid value in box file for %s", n)
+
+	if "dividers" in d:
+		try:
+			s["dividers"] = [[int(dv[0]), float(dv[1])] for dv in d["dividers"]]
+		except (TypeError, ValueError, IndexError):
+			log.warning("invalid value in box file for dividers")
+
+	if "blindtabs" in d:
+		bt = d["blindtabs"]
+		if isinstance(bt, list) and len(bt) == NFACES:
+			s["blindtabs"] = [bool(x) for x in bt]
+		else:
+			log.warning("invalid value in box file for blindtabs")
+
+	for n, width in [["circles", 2], ["rectangles", 3]]:
+		if n not in d:
+			continue
+		fl = d[n]
+		if not isinstance(fl, list) or len(fl) != NFACES:
+			log.warning("invalid value in box file for %s", n)
+			continue
+		for f in range(NFACES):
+			try:
+				s[n][f] = [[[float(o[0][0]), float(o[0][1])]] + [float(x) for x in o[1:]] for o in fl[f] if len(o) == width]
+			except (TypeError, ValueError, IndexError):
+				log.warning("invalid value in box file for face %d %s", f, n)
+
+	return s
+
+def readLegacyBox(fn):
+	config = configparser.ConfigParser()
+	try:
+		if not config.read(fn):
+			raise BoxFileError("%s: unable to read file" % fn)
+	except (configparser.Error, UnicodeDecodeError) as e:
+		raise BoxFileError("%s: %s" % (fn, str(e)))
+
+	d = {}
+	section = 'box'
+	if config.has_section(section):
+		for n, v in config.items(section):
+			if n in ["width", "height", "depth", "wall", "relief"]:
+				d[n] = v
+			elif n in ["tabcount", "tablength", "tabtype"]:
+				d[n] = literal(v)
+			else:
+				log.warning("Unknown parameter: %s", n)
+
+	section = "blindtabs"
+	if config.has_section(section):
+		bt = []
+		for f in range(NFACES):
+			flg = config.get(section, "face_%d" % f, fallback="False")
+			bt.append(flg.startswith("T") or flg.startswith("t"))
+		d["blindtabs"] = bt
+
+	circles = [[] for i in range(NFACES)]
+	rects = [[] for i in range(NFACES)]
+	for f in range(NFACES):
+		section = "face_%d_circles" % f
+		if config.has_section(section):
+			v = [literal(config.get(section, k, fallback="")) for k in ["cx", "cy", "radii"]]
+			if not sameLength(v):
+				log.warning("Invalid data for section %s", section)
+			else:
+				circles[f] = [[[cx, cy], r] for cx, cy, r in zip(*v)]
+
+		section = "face_%d_rectangles" % f
+		if config.has_section(section):
+			v = [literal(config.get(section, k, fallback="")) for k in ["cx", "cy", "width", "height"]]
+			if not sameLength(v):
+				log.warning("Invalid data for section %s", section)
+			else:
+				rects[f] = [[[cx, cy], lx, ly] for cx, cy, lx, ly in zip(*v)]
+
+	d["circles"] = circles
+	d["rectangles"] = rects
+	return normalizeState(d)
+
+def literal(v):
+	try:
+		return ast.literal_eval(v)
+	except (ValueError, SyntaxError):
+		return None
+
+def sameLength(vl):
+	for v in vl:
+		if not isinstance(v, list) or len(v) != len(vl[0]):
+			return False
+	return True
+
+def listBoxFiles(directory):
+	with os.scandir(directory) as it:
+		for e in it:
+			if e.is_file() and e.name.lower().endswith(BOXEXT):
+				yield e.path
+
+def migrateBoxes(directory, backup=True):
+	migrated = 0
+	skipped = 0
+	failed = 0
+	for fn in listBoxFiles(directory):
+		try:
+			if not isLegacy(fn):
+				skipped += 1
+				continue
+
+			state = readLegacyBox(fn)
+			if backup:
+				with open(fn, "rb") as src, open(fn + ".bak", "wb") as dst:
+					dst.write(src.read())
+			writeBox(fn, state)
+			migrated += 1
+		except (OSError, BoxFileError) as e:
+			log.error("Unable to migrate box file %s: %s", fn, str(e))
+			failed += 1
+
+	return migrated, skipped, failed
+
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("usage: %s directory [--nobackup]" % sys.argv[0])
+		sys.exit(1)
+
+	m, s, f = migrateBoxes(sys.argv[1], "--nobackup" not in sys.argv[2:])
+	print("%d migrated, %d already current, %d failed" % (m, s, f))
@@ -0,0 +1,154 @@
+import os
+import sys
+import re
+import sqlite3
+import hashlib
+import logging
+
+import boxfile
+
+log = logging.getLogger(__name__)
+
+INDEXFILE = "boxindex.db"
+
+COLUMNS = [
+	["width", "REAL"], ["height", "REAL"], ["depth", "REAL"], ["wall", "REAL"],
+	["fstabct", "INTEGER"], ["ftbtabct", "INTEGER"], ["stbtabct", "INTEGER"],
+	["fstablen", "REAL"], ["ftbtablen", "REAL"], ["stbtablen", "REAL"],
+	["relief", "INTEGER"], ["blind", "INTEGER"], ["blindmask", "INTEGER"],
+	["circles", "INTEGER"], ["rectangles", "INTEGER"],
+]
+
+COLNAMES = [c[0] for c in COLUMNS]
+
+# aliases usable in queries in addition to the column names themselves
+ALIASES = {
+	"w": "width", "h": "height", "d": "depth", "thk": "wall", "thickness": "wall",
+	"holes": "circles", "rects": "rectangles",
+}
+
+QUERYTERM = re.compile(r"^\s*([A-Za-z_]+)\s*(<=|>=|!=|=|<|>)\s*([-+0-9.eE]+)\s*$")
+
+class QueryError(Exception):
+	pass
+
+def parseQuery(q):
+	where = []
+	args = []
+	q = re.sub(r"\band\b", " ", q, flags=re.IGNORECASE)
+	for term in re.split(r"[\s,]+(?=[A-Za-z_])", q.strip()):
+		if term.strip() == "":
+			continue
+		m = QUERYTERM.match(term)
+		if m is None:
+			raise QueryError("Unable to parse query term: %s" % term)
+		n, op, v = m.groups()
+		n = ALIASES.get(n.lower(), n.lower())
+		if n not in COLNAMES:
+			raise QueryError("Unknown field in query: %s" % n)
+		where.append("%s %s ?" % (n, op))
+		args.append(float(v))
+
+	return " AND ".join(where), args
+
+def fileHash(fn):
+	h = hashlib.sha1()
+	with open(fn, "rb") as fp:
+		for b in iter(lambda: fp.read(65536), b""):
+			h.update(b)
+	return h.hexdigest()
+
+def stateRow(state):
+	bt = state["blindtabs"]
+	return [
+		state["width"], state["height"], state["depth"], state["wall"],
+		state["tabcount"][0], state["tabcount"][1], state["tabcount"][2],
+		state["tablength"][0], state["tablength"][1], state["tablength"][2],
+		state["relief"], sum([1 for b in bt if b]), sum([1 << f for f in range(len(bt)) if bt[f]]),
+		sum([len(c) for c in state["circles"]]), sum([len(r) for r in state["rectangles"]]),
+	]
+
+class BoxIndex:
+	def __init__(self, fn):
+		self.fn = fn
+		self.db = sqlite3.connect(fn)
+		self.db.row_factory = sqlite3.Row
+		cols = ", ".join(["%s %s" % (n, t) for n, t in COLUMNS])
+		self.db.execute("CREATE TABLE IF NOT EXISTS boxes (path TEXT PRIMARY KEY, directory TEXT, mtime REAL, size INTEGER, hash TEXT, %s)" % cols)
+		for n in ["width", "height", "depth", "wall", "directory"]:
+			self.db.execute("CREATE INDEX IF NOT EXISTS idx_%s ON boxes (%s)" % (n, n))
+		self.db.commit()
+
+	def close(self):
+		self.db.close()
+
+	def scan(self, directory):
+		directory = os.path.abspath(directory)
+		known = {}
+		for row in self.db.execute("SELECT path, mtime, size, hash FROM boxes WHERE directory = ?", (directory,)):
+			known[row["path"]] = row
+
+		added = 0
+		updated = 0
+		seen = set()
+		for fn in boxfile.listBoxFiles(directory):
+			fn = os.path.abspath(fn)
+			seen.add(fn)
+			try:
+				st = os.stat(fn)
+				k = known.get(fn)
+				if k is not None and k["mtime"] == st.st_mtime and k["size"] == st.st_size:
+					continue
+
+				h = fileHash(fn)
+				if k is not None and k["hash"] == h:
+					self.db.execute("UPDATE boxes SET mtime = ?, size = ? WHERE path = ?", (st.st_mtime, st.st_size, fn))
+					continue
+
+				state = boxfile.readBox(fn)
+			except (OSError, boxfile.BoxFileError) as e:
+				log.warning("Unable to index box file %s: %s", fn, str(e))
+				continue
+
+			self.db.execute("INSERT OR REPLACE INTO boxes VALUES (%s)" % ", ".join(["?"] * (5 + len(COLUMNS))),
+						[fn, directory, st.st_mtime, st.st_size, h] + stateRow(state))
+			if k is None:
+				added += 1
+			else:
+				updated += 1
+
+		removed = [p for p in known.keys() if p not in seen]
+		self.db.executemany("DELETE FROM boxes WHERE path = ?", [(p,) for p in removed])
+		self.db.commit()
+
+		return added, updated, len(removed)
+
+	def query(self, q="", directory=None, order="path"):
+		where, args = parseQuery(q)
+		if directory is not None:
+			where = " AND ".join([w for w in [where, "directory = ?"] if w != ""])
+			args.append(os.path.abspath(directory))
+		if order != "path" and order not in COLNAMES:
+			raise QueryError("Unknown field for ordering: %s" % order)
+
+		sql = "SELECT * FROM boxes"
+		if where != "":
+			sql += " WHERE " + where
+		sql += " ORDER BY " + order
+		return [dict(r) for r in self.db.execute(sql, args)]
+
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("usage: %s directory [query]" % sys.argv[0])
+		sys.exit(1)
+
+	ix = BoxIndex(os.path.join(sys.argv[1], INDEXFILE))
+	a, u, r = ix.scan(sys.argv[1])
+	print("%d added, %d updated, %d removed" % (a, u, r))
+	if len(sys.argv) > 2:
+		try:
+			for row in ix.query(" ".join(sys.argv[2:])):
+				print("%s  %.2f x %.2f x %.2f  wall %.2f" % (row["path"], row["width"], row["height"], row["depth"], row["wall"]))
+		except QueryError as e:
+			print(str(e))
+	ix.close()
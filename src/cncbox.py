@@ -1,34 +1,70 @@
-import os, wx
-import sys, inspect
-import configparser
+import time
+START = time.perf_counter()
 
-cmd_folder = os.path.realpath(os.path.abspath(os.path.split(inspect.getfile( inspect.currentframe() ))[0]))
+import os, sys
+import logging
+
+cmd_folder = os.path.dirname(os.path.realpath(os.path.abspath(__file__)))
 if cmd_folder not in sys.path:
 	sys.path.insert(0, cmd_folder)
 	
-from gcframe import GcFrame
-import box
-from images import Images
-from circledlg import CircleDlg
-from rectangledlg import RectangleDlg
-from gcodedlg import GCodeDlg
+import startup
+import metrics
+
+log = logging.getLogger(__name__)
+profile = startup.fromArgs(START, sys.argv)
+
+# --log=debug|info|warning|error sets the log level; --metrics=file.json or
+# file.prom times rendering, generation, file writes and preview redraws and
+# writes the figures out on exit
+metricsFile = None
+for a in sys.argv[1:]:
+	if a.startswith("--log="):
+		metrics.setupLogging(a[6:])
+	elif a.startswith("--metrics="):
+		metricsFile = a[10:]
+		metrics.enable()
+
+with profile.stage("import wx"):
+	import wx
+
+with profile.stage("import application modules"):
+	from gcframe import GcFrame
+	import box
+	import undo
+	import previewer
+	import validate
+	import postproc
+	from images import Images
 
 weightSingle = 10;
 weightDouble = 16;
 
 DIMFORMAT = "%8.2f"
+MAXTABS = 500
+MAXTABLEN = 300
+MAXPITCH = 1000
 BUTTONDIM = (56, 56)
 BTNSPACING = 10
+DEBOUNCEMS = 120
+MAXPROBLEMLINES = 20
 SECTION = "cncbox"
 FNSETTINGS = "cncbox.ini"
 
 TITLE = "Tabbed Box G Code Generator"
 
+
 class Settings:
 	def __init__(self, rootDir):
 		self.boxDirectory = os.getcwd()
 		self.gcodeDirectory = os.getcwd()
+		self.gcodeCacheDirectory = os.path.join(rootDir, "gcodecache")
+		self.gcodeCacheSize = 256
+		self.serialPort = "/dev/ttyUSB0"
+		self.baudRate = 115200
+		self.postProcessor = postproc.DEFAULTPOST
 		
+		import configparser
 		config = configparser.ConfigParser()
 		config.read(FNSETTINGS)
 		if config.has_section(SECTION):
@@ -37,12 +73,37 @@ class Settings:
 					self.boxDirectory = v
 				elif n == "gcodedirectory":
 					self.gcodeDirectory = v
+				elif n == "gcodecachedirectory":
+					self.gcodeCacheDirectory = v
+				elif n == "gcodecachesize":
+					try:
+						self.gcodeCacheSize = int(v)
+					except:
+						log.warning("invalid value in settings file for gcodecachesize")
+				elif n == "serialport":
+					self.serialPort = v
+				elif n == "baudrate":
+					try:
+						self.baudRate = int(v)
+					except:
+						log.warning("invalid value in settings file for baudrate")
+				elif n == "postprocessor":
+					if v in postproc.postNames:
+						self.postProcessor = v
+					else:
+						log.warning("invalid value in settings file for postprocessor")
 		
 	def saveSettings(self):
+		import configparser
 		config = configparser.ConfigParser()
 		config.add_section(SECTION)
 		config.set(SECTION, 'boxdirectory', self.boxDirectory)
 		config.set(SECTION, 'gcodedirectory', self.gcodeDirectory)
+		config.set(SECTION, 'gcodecachedirectory', self.gcodeCacheDirectory)
+		config.set(SECTION, 'gcodecachesize', str(self.gcodeCacheSize))
+		config.set(SECTION, 'serialport', self.serialPort)
+		config.set(SECTION, 'baudrate', str(self.baudRate))
+		config.set(SECTION, 'postprocessor', self.postProcessor)
 		
 		with open(FNSETTINGS, 'w') as configfile:
 			config.write(configfile)
@@ -69,12 +130,21 @@ class MainFrame(wx.Frame):
 		self.fileName = None
 		
 		self.currentFace = box.FACE_TOP
-		self.hiLite = [ 0, 0, 0, 0, 0, 0 ]
+		self.hiLite = {}
 		self.toolrad = 1.5
 		self.circles = []
 		self.rects = []
 		
 		self.bx = box.box(100, 200, 200, 6)
+		self.history = undo.UndoHistory()
+		self.history.reset(self.bx)
+		self.gcodeDlg = None
+		
+		self.renderGeneration = 0
+		self.renderFaces = None
+		self.renderTimer = None
+		self.multiView = False
+		self.renderer = previewer.BackgroundRenderer(self.backgroundRenderDone)
 		
 		self.images = Images(os.path.join(cmd_folder, "images"))
 		
@@ -212,7 +282,7 @@ class MainFrame(wx.Frame):
 		
 		t = wx.StaticText(self, wx.ID_ANY, "Number of Tabs/Slots:")
 		sc = wx.SpinCtrl(self, wx.ID_ANY, "count", size=(50, -1))
-		sc.SetRange(0, 20)
+		sc.SetRange(0, MAXTABS)
 		sc.SetValue(0)
 		self.scFSCount = sc
 		sz = wx.BoxSizer(wx.HORIZONTAL)
@@ -226,7 +296,7 @@ class MainFrame(wx.Frame):
 		
 		t = wx.StaticText(self, wx.ID_ANY, "Tab/Slot length:")
 		sc = wx.SpinCtrl(self, wx.ID_ANY, "length", size=(50, -1))
-		sc.SetRange(1, 30)
+		sc.SetRange(1, MAXTABLEN)
 		sc.SetValue(10)
 		self.scFSLength = sc
 		sz = wx.BoxSizer(wx.HORIZONTAL)
@@ -238,6 +308,20 @@ class MainFrame(wx.Frame):
 		staticboxsizer.Add(sz)
 		self.Bind(wx.EVT_SPINCTRL, self.onSpinFSLength, sc)
 		
+		t = wx.StaticText(self, wx.ID_ANY, "Pitch (0 = even):")
+		sc = wx.SpinCtrl(self, wx.ID_ANY, "pitch", size=(50, -1))
+		sc.SetRange(0, MAXPITCH)
+		sc.SetValue(0)
+		self.scFSPitch = sc
+		sz = wx.BoxSizer(wx.HORIZONTAL)
+		sz.AddSpacer(20)
+		sz.Add(t, 1, wx.TOP, 3)
+		sz.AddSpacer(10)
+		sz.Add(sc)
+		staticboxsizer.AddSpacer(10)
+		staticboxsizer.Add(sz)
+		self.Bind(wx.EVT_SPINCTRL, self.onSpinFSPitch, sc)
+		
 		vsizer.Add(staticboxsizer)
 		vsizer.AddSpacer(10)
 		
@@ -254,7 +338,7 @@ class MainFrame(wx.Frame):
 		
 		t = wx.StaticText(self, wx.ID_ANY, "Number of Tabs/Slots:")
 		sc = wx.SpinCtrl(self, wx.ID_ANY, "count", size=(50, -1))
-		sc.SetRange(0, 20)
+		sc.SetRange(0, MAXTABS)
 		sc.SetValue(0)
 		self.scFTBCount = sc
 		sz = wx.BoxSizer(wx.HORIZONTAL)
@@ -268,7 +352,7 @@ class MainFrame(wx.Frame):
 		
 		t = wx.StaticText(self, wx.ID_ANY, "Tab/Slot length:")
 		sc = wx.SpinCtrl(self, wx.ID_ANY, "length", size=(50, -1))
-		sc.SetRange(1, 30)
+		sc.SetRange(1, MAXTABLEN)
 		sc.SetValue(10)
 		self.scFTBLength = sc
 		sz = wx.BoxSizer(wx.HORIZONTAL)
@@ -280,6 +364,20 @@ class MainFrame(wx.Frame):
 		staticboxsizer.Add(sz)
 		self.Bind(wx.EVT_SPINCTRL, self.onSpinFTBLength, sc)
 		
+		t = wx.StaticText(self, wx.ID_ANY, "Pitch (0 = even):")
+		sc = wx.SpinCtrl(self, wx.ID_ANY, "pitch", size=(50, -1))
+		sc.SetRange(0, MAXPITCH)
+		sc.SetValue(0)
+		self.scFTBPitch = sc
+		sz = wx.BoxSizer(wx.HORIZONTAL)
+		sz.AddSpacer(20)
+		sz.Add(t, 1, wx.TOP, 3)
+		sz.AddSpacer(10)
+		sz.Add(sc)
+		staticboxsizer.AddSpacer(10)
+		staticboxsizer.Add(sz)
+		self.Bind(wx.EVT_SPINCTRL, self.onSpinFTBPitch, sc)
+		
 		vsizer.Add(staticboxsizer)
 		vsizer.AddSpacer(10)
 		
@@ -296,7 +394,7 @@ class MainFrame(wx.Frame):
 		
 		t = wx.StaticText(self, wx.ID_ANY, "Number of Tabs/Slots:")
 		sc = wx.SpinCtrl(self, wx.ID_ANY, "count", size=(50, -1))
-		sc.SetRange(0, 20)
+		sc.SetRange(0, MAXTABS)
 		sc.SetValue(0)
 		self.scSTBCount = sc
 		sz = wx.BoxSizer(wx.HORIZONTAL)
@@ -310,7 +408,7 @@ class MainFrame(wx.Frame):
 		
 		t = wx.StaticText(self, wx.ID_ANY, "Tab/Slot length:")
 		sc = wx.SpinCtrl(self, wx.ID_ANY, "length", size=(50, -1))
-		sc.SetRange(1, 30)
+		sc.SetRange(1, MAXTABLEN)
 		sc.SetValue(10)
 		self.scSTBLength = sc
 		sz = wx.BoxSizer(wx.HORIZONTAL)
@@ -322,10 +420,56 @@ class MainFrame(wx.Frame):
 		staticboxsizer.Add(sz)
 		self.Bind(wx.EVT_SPINCTRL, self.onSpinSTBLength, sc)
 		
+		t = wx.StaticText(self, wx.ID_ANY, "Pitch (0 = even):")
+		sc = wx.SpinCtrl(self, wx.ID_ANY, "pitch", size=(50, -1))
+		sc.SetRange(0, MAXPITCH)
+		sc.SetValue(0)
+		self.scSTBPitch = sc
+		sz = wx.BoxSizer(wx.HORIZONTAL)
+		sz.AddSpacer(20)
+		sz.Add(t, 1, wx.TOP, 3)
+		sz.AddSpacer(10)
+		sz.Add(sc)
+		staticboxsizer.AddSpacer(10)
+		staticboxsizer.Add(sz)
+		self.Bind(wx.EVT_SPINCTRL, self.onSpinSTBPitch, sc)
+		
 		vsizer.Add(staticboxsizer)
 		vsizer.AddSpacer(10)
 		
+		sbox = wx.StaticBox(self, -1, "Pitched Tab Layout")
+		staticboxsizer = wx.StaticBoxSizer(sbox, wx.VERTICAL)
+		
+		t = wx.StaticText(self, wx.ID_ANY, "Min Web: ", size=(100, -1))
+		tc = wx.TextCtrl(self, wx.ID_ANY, DIMFORMAT % self.bx.MinWeb, size=(70, -1), style=wx.TE_RIGHT)
+		self.tcMinWeb = tc
+		tc.Bind(wx.EVT_KILL_FOCUS, self.onTextTabLayout)
+		hb = wx.BoxSizer(wx.HORIZONTAL)
+		hb.Add(t, 0, wx.TOP|wx.LEFT, 10)
+		hb.Add(tc, 0, wx.TOP|wx.LEFT, 10)
+		staticboxsizer.Add(hb)
+		
+		t = wx.StaticText(self, wx.ID_ANY, "Corner Clearance: ", size=(100, -1))
+		tc = wx.TextCtrl(self, wx.ID_ANY, DIMFORMAT % self.bx.CornerClear, size=(70, -1), style=wx.TE_RIGHT)
+		self.tcCornerClear = tc
+		tc.Bind(wx.EVT_KILL_FOCUS, self.onTextTabLayout)
+		hb = wx.BoxSizer(wx.HORIZONTAL)
+		hb.Add(t, 0, wx.TOP|wx.LEFT, 10)
+		hb.Add(tc, 0, wx.TOP|wx.LEFT, 10)
+		staticboxsizer.Add(hb)
 		
+		t = wx.StaticText(self, wx.ID_ANY, "Opening Clearance: ", size=(100, -1))
+		tc = wx.TextCtrl(self, wx.ID_ANY, DIMFORMAT % self.bx.OpeningClear, size=(70, -1), style=wx.TE_RIGHT)
+		self.tcOpeningClear = tc
+		tc.Bind(wx.EVT_KILL_FOCUS, self.onTextTabLayout)
+		hb = wx.BoxSizer(wx.HORIZONTAL)
+		hb.Add(t, 0, wx.TOP|wx.LEFT, 10)
+		hb.Add(tc, 0, wx.TOP|wx.LEFT, 10)
+		staticboxsizer.Add(hb)
+		staticboxsizer.AddSpacer(10)
+		
+		vsizer.Add(staticboxsizer)
+		vsizer.AddSpacer(10)
 		
 		sbox = wx.StaticBox(self, -1, "Blind Faces")
 		staticboxsizer = wx.StaticBoxSizer(sbox, wx.HORIZONTAL)
@@ -363,6 +507,61 @@ class MainFrame(wx.Frame):
 		vsizer.Add(staticboxsizer)
 		vsizer.AddSpacer(10)
 		
+		sbox = wx.StaticBox(self, -1, "Dividers")
+		staticboxsizer = wx.StaticBoxSizer(sbox, wx.VERTICAL)
+		
+		t = wx.StaticText(self, wx.ID_ANY, "Across (Y): ", size=(100, -1))
+		tc = wx.TextCtrl(self, wx.ID_ANY, "", size=(120, -1))
+		tc.SetToolTip("Comma separated positions of dividers parallel to the front, measured from the center")
+		self.tcDividersAcross = tc
+		tc.Bind(wx.EVT_KILL_FOCUS, self.onTextDividers)
+		hb = wx.BoxSizer(wx.HORIZONTAL)
+		hb.Add(t, 0, wx.TOP|wx.LEFT, 10)
+		hb.Add(tc, 0, wx.TOP|wx.LEFT, 10)
+		staticboxsizer.Add(hb)
+		
+		t = wx.StaticText(self, wx.ID_ANY, "Along (X): ", size=(100, -1))
+		tc = wx.TextCtrl(self, wx.ID_ANY, "", size=(120, -1))
+		tc.SetToolTip("Comma separated positions of dividers parallel to the sides, measured from the center")
+		self.tcDividersAlong = tc
+		tc.Bind(wx.EVT_KILL_FOCUS, self.onTextDividers)
+		hb = wx.BoxSizer(wx.HORIZONTAL)
+		hb.Add(t, 0, wx.TOP|wx.LEFT, 10)
+		hb.Add(tc, 0, wx.TOP|wx.LEFT, 10)
+		staticboxsizer.Add(hb)
+		
+		t = wx.StaticText(self, wx.ID_ANY, "Tab Count:")
+		sc = wx.SpinCtrl(self, wx.ID_ANY, "count", size=(50, -1))
+		sc.SetRange(1, MAXTABS)
+		sc.SetValue(self.bx.DividerTabCt)
+		self.scDividerCount = sc
+		sz = wx.BoxSizer(wx.HORIZONTAL)
+		sz.AddSpacer(10)
+		sz.Add(t, 1, wx.TOP, 3)
+		sz.AddSpacer(10)
+		sz.Add(sc)
+		staticboxsizer.AddSpacer(10)
+		staticboxsizer.Add(sz)
+		self.Bind(wx.EVT_SPINCTRL, self.onSpinDividerTabs, sc)
+		
+		t = wx.StaticText(self, wx.ID_ANY, "Tab Length:")
+		sc = wx.SpinCtrl(self, wx.ID_ANY, "length", size=(50, -1))
+		sc.SetRange(1, MAXTABLEN)
+		sc.SetValue(self.bx.DividerTabLen)
+		self.scDividerLength = sc
+		sz = wx.BoxSizer(wx.HORIZONTAL)
+		sz.AddSpacer(10)
+		sz.Add(t, 1, wx.TOP, 3)
+		sz.AddSpacer(10)
+		sz.Add(sc)
+		staticboxsizer.AddSpacer(10)
+		staticboxsizer.Add(sz)
+		staticboxsizer.AddSpacer(10)
+		self.Bind(wx.EVT_SPINCTRL, self.onSpinDividerTabs, sc)
+		
+		vsizer.Add(staticboxsizer)
+		vsizer.AddSpacer(10)
+		
 	
 		ohsizer.Add(vsizer)
 		ovsizer.Add(ohsizer)
@@ -379,6 +578,11 @@ class MainFrame(wx.Frame):
 		btnSizer.Add(self.bLoad, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
 		self.Bind(wx.EVT_BUTTON, self.bLoadPressed, self.bLoad)
 		
+		self.bSearch = wx.BitmapButton(self, wx.ID_ANY, self.images.pngSearch, size=BUTTONDIM)
+		self.bSearch.SetToolTip("Search the box library")
+		btnSizer.Add(self.bSearch, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
+		self.Bind(wx.EVT_BUTTON, self.bSearchPressed, self.bSearch)
+		
 		self.bSave = wx.BitmapButton(self, wx.ID_ANY, self.images.pngSave, size=BUTTONDIM)
 		self.bSave.SetToolTip("Save box parameters")
 		btnSizer.Add(self.bSave, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
@@ -391,6 +595,26 @@ class MainFrame(wx.Frame):
 		
 		btnSizer.AddSpacer(30)
 
+		self.bUndo = wx.BitmapButton(self, wx.ID_ANY, self.images.pngUndo, size=BUTTONDIM)
+		self.bUndo.SetToolTip("Undo (Ctrl+Z)")
+		btnSizer.Add(self.bUndo, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
+		self.Bind(wx.EVT_BUTTON, self.bUndoPressed, self.bUndo)
+		self.Bind(wx.EVT_MENU, self.bUndoPressed, self.bUndo)
+
+		self.bRedo = wx.BitmapButton(self, wx.ID_ANY, self.images.pngRedo, size=BUTTONDIM)
+		self.bRedo.SetToolTip("Redo (Ctrl+Y)")
+		btnSizer.Add(self.bRedo, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
+		self.Bind(wx.EVT_BUTTON, self.bRedoPressed, self.bRedo)
+		self.Bind(wx.EVT_MENU, self.bRedoPressed, self.bRedo)
+		
+		self.SetAcceleratorTable(wx.AcceleratorTable([
+			(wx.ACCEL_CTRL, ord('Z'), self.bUndo.GetId()),
+			(wx.ACCEL_CTRL, ord('Y'), self.bRedo.GetId()),
+			(wx.ACCEL_CTRL | wx.ACCEL_SHIFT, ord('Z'), self.bRedo.GetId())]))
+		self.updateUndoButtons()
+		
+		btnSizer.AddSpacer(30)
+
 		self.bCircle = wx.BitmapButton(self, wx.ID_ANY, self.images.pngCircles, size=BUTTONDIM)
 		self.bCircle.SetToolTip("Manage Circular Openings")
 		btnSizer.Add(self.bCircle, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
@@ -439,6 +663,14 @@ class MainFrame(wx.Frame):
 		self.Bind(wx.EVT_RADIOBUTTON, self.onFaceSelected, self.rbRight )
 		self.Bind(wx.EVT_RADIOBUTTON, self.onFaceSelected, self.rbFront )
 		self.Bind(wx.EVT_RADIOBUTTON, self.onFaceSelected, self.rbBack )
+		self.rbFaces = [self.rbTop, self.rbBottom, self.rbLeft, self.rbRight, self.rbFront, self.rbBack]
+		
+		vsizer.AddSpacer(30)
+		self.chDivider = wx.Choice(self, wx.ID_ANY, choices=[])
+		self.chDivider.SetToolTip("View a divider")
+		vsizer.Add(self.chDivider)
+		self.Bind(wx.EVT_CHOICE, self.onDividerSelected, self.chDivider)
+		self.updateDividerChoice()
 		
 		sizer.Add(vsizer)
 		
@@ -453,7 +685,11 @@ class MainFrame(wx.Frame):
 		self.gcf = GcFrame(self)
 		vsizer.Add(self.gcf)
 		
-		vsizer.AddSpacer(10)
+		vsizer.AddSpacer(5)
+		self.lblProblems = wx.StaticText(self, wx.ID_ANY, " "*80, style=wx.ALIGN_CENTRE_HORIZONTAL)
+		self.lblProblems.SetForegroundColour("red")
+		vsizer.Add(self.lblProblems, flag=wx.ALIGN_CENTER_HORIZONTAL)
+		vsizer.AddSpacer(5)
 		
 		optsizer = wx.BoxSizer(wx.HORIZONTAL)
 		optsizer.AddSpacer(50)
@@ -469,6 +705,13 @@ class MainFrame(wx.Frame):
 		self.cbPath.SetValue(False)
 		self.Bind(wx.EVT_CHECKBOX, self.onCbPath, self.cbPath)
 		optsizer.AddSpacer(10)
+
+		self.cbAllFaces = wx.CheckBox(self, wx.ID_ANY, "All Faces")
+		self.cbAllFaces.SetToolTip("Show every panel side by side; click one to make it current")
+		optsizer.Add(self.cbAllFaces)
+		self.cbAllFaces.SetValue(False)
+		self.Bind(wx.EVT_CHECKBOX, self.onCbAllFaces, self.cbAllFaces)
+		optsizer.AddSpacer(10)
 		
 		vsizer.Add(optsizer)
 		vsizer.AddSpacer(10)
@@ -522,23 +765,27 @@ class MainFrame(wx.Frame):
 		self.Layout()
 		self.Fit();
 		
-		self.render()
+		with profile.stage("  initial render"):
+			self.render(now=True)
 		
 	def keyDown(self, evt):
-		print("key down")
+		log.debug("key down")
 		evt.Skip()
 		
 	def keyUp(self, evt):
-		print("key up")
+		log.debug("key up")
 		
 	def keyChar(self, evt):
-		print("key char: (", evt.GetKeyCode(), ")")
+		log.debug("key char: (%d)", evt.GetKeyCode())
 		
 	def updateFileName(self, fn):
 		self.fileName = fn
 		self.displayTitle()
 		
 	def setModified(self, flag=True):
+		if flag and self.history.record(self.bx):
+			self.updateUndoButtons()
+			
 		if flag == self.modified:
 			return
 		
@@ -556,7 +803,7 @@ class MainFrame(wx.Frame):
 
 		self.SetLabel(txt)
 		
-	def render(self, fc=None):
+	def render(self, fc=None, now=False):
 		fx = None
 		if fc is None:
 			fx = self.currentFace
@@ -573,21 +820,140 @@ class MainFrame(wx.Frame):
 			fx = box.FACE_FRONT
 		elif fc == "Back":
 			fx = box.FACE_BACK
+		elif isinstance(fc, int):
+			fx = fc
 
-		if fx is not None:
-			p, c, r = self.bx.render(fx, self.toolrad)
+		if fx is None:
+			return
+		
+		if fx not in self.bx.panelTypes():
+			# the divider being shown has gone away
+			fx = box.FACE_TOP
+			self.rbFaces[fx].SetValue(True)
+		
+		self.currentFace = fx
+		self.circles = self.bx.getCircles(fx)
+		self.rects = self.bx.getRectangles(fx)
+		self.bCircle.Enable(fx in box.faceTypes)
+		self.bRects.Enable(fx in box.faceTypes)
+		
+		# any render still pending or running is now out of date
+		self.renderGeneration += 1
+		if self.renderTimer is not None:
+			self.renderTimer.Stop()
+		
+		if self.multiView:
+			faces = self.bx.panelTypes()
+		else:
+			faces = [fx]
+			
+		outlines = {}
+		for ft in faces:
+			p = self.bx.cachedOutline(ft, self.toolrad)
+			if p is None and now:
+				p = self.bx.render(ft, self.toolrad)[0]
 			if p is not None:
-				self.currentFace = fx
-				self.gcf.setData(p, c, r, self.toolrad, self.hiLite[fx])  
-				self.updateHiLite()
-				self.circles = c
-				self.rects = r
+				outlines[ft] = p
+		if len(outlines) == len(faces):
+			self.showFaces(outlines)
+			return
+		
+		# edits tend to come in bursts, e.g. while scrubbing a spinner, so wait
+		# for them to settle and then compute the outlines off the UI thread
+		self.renderFaces = faces
+		if self.renderTimer is None:
+			self.renderTimer = wx.CallLater(DEBOUNCEMS, self.startRender)
+		else:
+			self.renderTimer.Start(DEBOUNCEMS)
+			
+	def startRender(self):
+		if self.renderFaces is None:
+			return
+		snapshot = box.fromState(self.bx.getState(), self.toolrad)
+		self.renderer.submit(self.renderGeneration, snapshot, self.renderFaces, self.toolrad)
+		self.renderFaces = None
+		
+	def backgroundRenderDone(self, generation, outlines):
+		# called on the renderer thread
+		wx.CallAfter(self.applyRender, generation, outlines)
+		
+	def applyRender(self, generation, outlines):
+		if not self or generation != self.renderGeneration:
+			return
+		self.showFaces(outlines)
+		
+	def showFaces(self, outlines):
+		fx = self.currentFace
+		if self.multiView:
+			tiles = []
+			bad = []
+			for ft in self.bx.panelTypes():
+				label = self.bx.panelName(ft)
+				if len(validate.errors(self.checkPanel(ft, outlines[ft]))) > 0:
+					label += " (!)"
+					bad.append(self.bx.panelName(ft))
+				tiles.append([label, outlines[ft], self.bx.getCircles(ft), self.bx.getRectangles(ft) + self.bx.getSlots(ft)])
+			self.gcf.setTiles(tiles, fx)
+			if len(bad) == 0:
+				self.showProblems([])
+			else:
+				self.lblProblems.SetLabel("Problems found on: " + ", ".join(bad))
+				self.lblProblems.SetToolTip(None)
+				self.Layout()
+			return
+		
+		problems = self.checkPanel(fx, outlines[fx])
+		self.gcf.setData(outlines[fx], self.circles, self.rects + self.bx.getSlots(fx), self.toolrad, self.hiLite.get(fx, 0), [p.loc for p in problems])
+		self.showProblems(problems)
+		self.updateHiLite()
+		
+	def checkPanel(self, ft, pts):
+		notches = self.bx.getNotches(ft)
+		slots = [s for s in self.bx.getSlots(ft) if s not in notches]
+		return validate.validate(pts, self.bx.getCircles(ft), self.bx.getRectangles(ft) + slots, self.toolrad, notches)
+		
+	def showProblems(self, problems):
+		if len(problems) == 0:
+			self.lblProblems.SetLabel("")
+			self.lblProblems.SetToolTip(None)
+		else:
+			ne = len(validate.errors(problems))
+			self.lblProblems.SetLabel("%d error(s), %d warning(s): %s" % (ne, len(problems) - ne, str(problems[0])))
+			self.lblProblems.SetToolTip("\n".join([str(p) for p in problems[:MAXPROBLEMLINES]]))
+		self.Layout()
+		
+	def onTileSelected(self, ft):
+		if ft in box.faceTypes:
+			self.rbFaces[ft].SetValue(True)
+			self.chDivider.SetSelection(wx.NOT_FOUND)
+		else:
+			self.chDivider.SetSelection(ft - len(box.faceTypes))
+		self.render(ft)
+		
+	def onDividerSelected(self, e):
+		i = self.chDivider.GetSelection()
+		if i == wx.NOT_FOUND:
+			return
+		self.render(len(box.faceTypes) + i)
+		
+	def updateDividerChoice(self):
+		names = [self.bx.panelName(p) for p in self.bx.panelTypes() if p not in box.faceTypes]
+		self.chDivider.SetItems(names)
+		self.chDivider.Enable(len(names) > 0)
+		if self.currentFace not in box.faceTypes and self.currentFace - len(box.faceTypes) < len(names):
+			self.chDivider.SetSelection(self.currentFace - len(box.faceTypes))
+		if self.gcodeDlg is not None:
+			self.gcodeDlg.updateDividers()
 			
 	def onHiLiteForward(self, e):
+		if self.multiView:
+			return
 		self.hiLite[self.currentFace] = self.gcf.hiLiteForward()
 		self.updateHiLite()
 			
 	def onHiLiteBackward(self, e):
+		if self.multiView:
+			return
 		self.hiLite[self.currentFace] = self.gcf.hiLiteBackward()
 		self.updateHiLite()
 		
@@ -655,14 +1021,71 @@ class MainFrame(wx.Frame):
 		d = self.tcToolRad.GetValue()
 		try:
 			dv = float(d)
-			self.toolrad = dv
-			self.tcToolRad.SetValue(DIMFORMAT % self.toolrad)
-			self.render();
+			self.tcToolRad.SetValue(DIMFORMAT % dv)
+			if dv != self.toolrad:
+				self.toolrad = dv
+				self.render();
 		except:
 			self.illegalTcValue("Tool Radius")
 			self.tcToolRad.SetValue(DIMFORMAT % self.toolrad)
 			e.Skip()
 			
+	def onTextTabLayout(self, e):
+		try:
+			mw = float(self.tcMinWeb.GetValue())
+			cc = float(self.tcCornerClear.GetValue())
+			oc = float(self.tcOpeningClear.GetValue())
+			if [mw, cc, oc] != [self.bx.MinWeb, self.bx.CornerClear, self.bx.OpeningClear]:
+				self.bx.setTabLayoutLimits(mw, cc, oc)
+				self.render()
+				self.setModified()
+		except:
+			self.illegalTcValue("Tab Layout")
+		self.tcMinWeb.SetValue(DIMFORMAT % self.bx.MinWeb)
+		self.tcCornerClear.SetValue(DIMFORMAT % self.bx.CornerClear)
+		self.tcOpeningClear.SetValue(DIMFORMAT % self.bx.OpeningClear)
+		e.Skip()
+		
+	def onTextDividers(self, e):
+		controls = [[box.DIVIDER_ACROSS, self.tcDividersAcross], [box.DIVIDER_ALONG, self.tcDividersAlong]]
+		# the controls show rounded positions; unless their text was edited,
+		# reading it back would move the dividers
+		if [tc.GetValue() for dt, tc in controls] == [self.dividerText(dt) for dt, tc in controls]:
+			e.Skip()
+			return
+		
+		try:
+			dividers = []
+			for dt, tc in controls:
+				for v in tc.GetValue().split(","):
+					if v.strip() != "":
+						dividers.append([dt, float(v)])
+			if dividers != self.bx.Dividers:
+				self.bx.setDividers(dividers)
+				self.updateDividerChoice()
+				self.render()
+				self.setModified()
+		except:
+			self.illegalTcValue("Dividers")
+		self.showDividers()
+		e.Skip()
+		
+	def dividerText(self, dt):
+		return ", ".join([DIMFORMAT % pos for t, pos in self.bx.Dividers if t == dt])
+		
+	def showDividers(self):
+		for dt, tc in [[box.DIVIDER_ACROSS, self.tcDividersAcross], [box.DIVIDER_ALONG, self.tcDividersAlong]]:
+			tc.SetValue(self.dividerText(dt))
+		
+	def onSpinDividerTabs(self, e):
+		ct = self.scDividerCount.GetValue()
+		tl = self.scDividerLength.GetValue()
+		if [ct, tl] == [self.bx.DividerTabCt, self.bx.DividerTabLen]:
+			return
+		self.bx.setDividerTabs(ct, tl)
+		self.setModified()
+		self.render()
+			
 	def illegalTcValue(self, name):
 		dlg = wx.MessageDialog(self,
 			"Illegal value for %s.\nRetaining old value" % name,
@@ -688,6 +1111,7 @@ class MainFrame(wx.Frame):
 		self.render()
 		
 	def onFaceSelected(self, e):
+		self.chDivider.SetSelection(wx.NOT_FOUND)
 		rb = e.GetEventObject()
 		l = rb.GetLabel().strip()
 		self.render(l)
@@ -723,32 +1147,74 @@ class MainFrame(wx.Frame):
 		self.render()
 		
 	def onSpinFSCount(self, e):
-		self.bx.setTabCount(box.CORNER_FRONT_SIDE, self.scFSCount.GetValue())
+		v = self.scFSCount.GetValue()
+		if v == self.bx.TabCt[box.CORNER_FRONT_SIDE]:
+			return
+		self.bx.setTabCount(box.CORNER_FRONT_SIDE, v)
 		self.setModified()
 		self.render()
 		
 	def onSpinFSLength(self, e):
-		self.bx.setTabLen(box.CORNER_FRONT_SIDE, self.scFSLength.GetValue())
+		v = self.scFSLength.GetValue()
+		if v == self.bx.TabLen[box.CORNER_FRONT_SIDE]:
+			return
+		self.bx.setTabLen(box.CORNER_FRONT_SIDE, v)
+		self.setModified()
+		self.render()
+		
+	def onSpinFSPitch(self, e):
+		v = self.scFSPitch.GetValue()
+		if v == self.bx.TabPitch[box.CORNER_FRONT_SIDE]:
+			return
+		self.bx.setTabPitch(box.CORNER_FRONT_SIDE, v)
 		self.setModified()
 		self.render()
 		
 	def onSpinFTBCount(self, e):
-		self.bx.setTabCount(box.CORNER_FRONT_TOP, self.scFTBCount.GetValue())
+		v = self.scFTBCount.GetValue()
+		if v == self.bx.TabCt[box.CORNER_FRONT_TOP]:
+			return
+		self.bx.setTabCount(box.CORNER_FRONT_TOP, v)
 		self.setModified()
 		self.render()
 		
 	def onSpinFTBLength(self, e):
-		self.bx.setTabLen(box.CORNER_FRONT_TOP, self.scFTBLength.GetValue())
+		v = self.scFTBLength.GetValue()
+		if v == self.bx.TabLen[box.CORNER_FRONT_TOP]:
+			return
+		self.bx.setTabLen(box.CORNER_FRONT_TOP, v)
+		self.setModified()
+		self.render()
+		
+	def onSpinFTBPitch(self, e):
+		v = self.scFTBPitch.GetValue()
+		if v == self.bx.TabPitch[box.CORNER_FRONT_TOP]:
+			return
+		self.bx.setTabPitch(box.CORNER_FRONT_TOP, v)
 		self.setModified()
 		self.render()
 		
 	def onSpinSTBCount(self, e):
-		self.bx.setTabCount(box.CORNER_SIDE_TOP, self.scSTBCount.GetValue())
+		v = self.scSTBCount.GetValue()
+		if v == self.bx.TabCt[box.CORNER_SIDE_TOP]:
+			return
+		self.bx.setTabCount(box.CORNER_SIDE_TOP, v)
 		self.setModified()
 		self.render()
 		
 	def onSpinSTBLength(self, e):
-		self.bx.setTabLen(box.CORNER_SIDE_TOP, self.scSTBLength.GetValue())
+		v = self.scSTBLength.GetValue()
+		if v == self.bx.TabLen[box.CORNER_SIDE_TOP]:
+			return
+		self.bx.setTabLen(box.CORNER_SIDE_TOP, v)
+		self.setModified()
+		self.render()
+		
+	def onSpinSTBPitch(self, e):
+		v = self.scSTBPitch.GetValue()
+		if v == self.bx.TabPitch[box.CORNER_SIDE_TOP]:
+			return
+		self.bx.setTabPitch(box.CORNER_SIDE_TOP, v)
 		self.setModified()
 		self.render()
 		
@@ -766,13 +1232,20 @@ class MainFrame(wx.Frame):
 		self.gcf.zoomOut()
 		
 	def bResetPressed(self, e):
-		self.hiLite = [ 0, 0, 0, 0, 0, 0 ]
+		self.hiLite = {}
 		self.gcf.resetView()
 		
 	def bGCodePressed(self, e):
-		dlg = GCodeDlg(self, self.bx, self.toolrad, self.images, self.settings)
-		dlg.ShowModal()
-		dlg.Destroy()
+		if self.gcodeDlg is not None:
+			self.gcodeDlg.Raise()
+			return
+		
+		from gcodedlg import GCodeDlg
+		self.gcodeDlg = GCodeDlg(self, self.images, self.settings)
+		self.gcodeDlg.Show()
+		
+	def gcodeDlgClosed(self):
+		self.gcodeDlg = None
 		
 	def bNewPressed(self, e):
 		if self.modified:
@@ -786,11 +1259,13 @@ class MainFrame(wx.Frame):
 				return
 			
 		self.currentFace = box.FACE_TOP
-		self.hiLite = [ 0, 0, 0, 0, 0, 0 ]
+		self.hiLite = {}
 		self.circles = []
 		self.rects = []
 		
 		self.bx = box.box(100, 200, 200, 6)
+		self.history.reset(self.bx)
+		self.updateUndoButtons()
 		
 		self.updateWidgets()
 		
@@ -821,22 +1296,84 @@ class MainFrame(wx.Frame):
 		if dlg.ShowModal() == wx.ID_OK:
 			path = dlg.GetPath()
 			self.settings.boxDirectory = os.path.dirname(path)
-			self.updateFileName(path)
 
 		dlg.Destroy()
 		
 		if path is None:
 			return
 		
-		self.bx.loadBox(path, self.toolrad)
+		self.loadFile(path)
+		
+	def bSearchPressed(self, e):
+		if self.modified:
+			dlg = wx.MessageDialog(self, "Are you sure you want to\nload a new file?\nyou will lose unsaved changes",
+				'Unsaved Changes', wx.YES_NO | wx.NO_DEFAULT | wx.ICON_INFORMATION)
+	
+			rc = dlg.ShowModal()
+			dlg.Destroy()
+
+			if rc != wx.ID_YES:
+				return
+			
+		from searchdlg import SearchDlg
+		dlg = SearchDlg(self, self.settings.boxDirectory, self.images)
+		if not dlg.isOpen():
+			dlg.Destroy()
+			return
+
+		rc = dlg.ShowModal()
+		path = dlg.getPath()
+		dlg.Destroy()
+		
+		if rc != wx.ID_OK or path is None:
+			return
+		
+		self.loadFile(path)
+		
+	def loadFile(self, path):
+		if not self.bx.loadBox(path, self.toolrad):
+			dlg = wx.MessageDialog(self,
+				"Unable to load file: " + path,
+				'Error',
+				wx.OK | wx.ICON_ERROR
+				)
+			dlg.ShowModal()
+			dlg.Destroy()
+			# keep the current box and its file name, so a save cannot
+			# overwrite the file that failed to load
+			return
+
+		self.updateFileName(path)
 		self.currentFace = box.FACE_TOP
-		self.hiLite = [ 0, 0, 0, 0, 0, 0 ]
+		self.hiLite = {}
+		self.history.reset(self.bx)
+		self.updateUndoButtons()
 
 		self.updateWidgets()	
 		
 		self.setModified(False)
 		self.render()
 
+	def bUndoPressed(self, e):
+		if self.history.undo(self.bx, self.toolrad):
+			self.afterUndoRedo()
+		
+	def bRedoPressed(self, e):
+		if self.history.redo(self.bx, self.toolrad):
+			self.afterUndoRedo()
+			
+	def afterUndoRedo(self):
+		# the restored state has usually been rendered before, so this comes
+		# straight out of the render cache
+		self.updateUndoButtons()
+		self.updateWidgets()
+		self.setModified()
+		self.render()
+		
+	def updateUndoButtons(self):
+		self.bUndo.Enable(self.history.canUndo())
+		self.bRedo.Enable(self.history.canRedo())
+
 	def updateWidgets(self):	
 		self.tcDepth.SetValue(DIMFORMAT % self.bx.Depth)
 		self.tcWidth.SetValue(DIMFORMAT % self.bx.Width)
@@ -857,6 +1394,14 @@ class MainFrame(wx.Frame):
 		self.scFTBLength.SetValue(self.bx.TabLen[box.CORNER_FRONT_TOP])
 		self.scSTBLength.SetValue(self.bx.TabLen[box.CORNER_SIDE_TOP])
 		
+		self.scFSPitch.SetValue(int(self.bx.TabPitch[box.CORNER_FRONT_SIDE]))
+		self.scFTBPitch.SetValue(int(self.bx.TabPitch[box.CORNER_FRONT_TOP]))
+		self.scSTBPitch.SetValue(int(self.bx.TabPitch[box.CORNER_SIDE_TOP]))
+		
+		self.tcMinWeb.SetValue(DIMFORMAT % self.bx.MinWeb)
+		self.tcCornerClear.SetValue(DIMFORMAT % self.bx.CornerClear)
+		self.tcOpeningClear.SetValue(DIMFORMAT % self.bx.OpeningClear)
+		
 		if self.bx.TabType[box.CORNER_FRONT_SIDE] == box.TABS:
 			self.rbFSTabs.SetValue(1)
 		else:
@@ -879,6 +1424,11 @@ class MainFrame(wx.Frame):
 		self.cbFrontBlind.SetValue(self.bx.BlindTabs[box.FACE_FRONT])
 		self.cbBackBlind.SetValue(self.bx.BlindTabs[box.FACE_BACK])
 		
+		self.showDividers()
+		self.scDividerCount.SetValue(self.bx.DividerTabCt)
+		self.scDividerLength.SetValue(self.bx.DividerTabLen)
+		self.updateDividerChoice()
+		
 	def bSavePressed(self, e):
 		if self.fileName is None:
 			self.bSaveAsPressed(e)
@@ -918,26 +1468,36 @@ class MainFrame(wx.Frame):
 		self.setModified(False)
 		
 	def bCirclePressed(self, e):
+		from circledlg import CircleDlg
 		dlg = CircleDlg(self, self.circles, self.images)
 		rc = dlg.ShowModal()
 		if rc == wx.ID_OK:
 			self.circles = dlg.circles[:]
 			self.bx.setCircles(self.currentFace, self.circles)
+			self.setModified()
 			self.render()
 		dlg.Destroy()
 		
 	def bRectanglePressed(self, e):
+		from rectangledlg import RectangleDlg
 		dlg = RectangleDlg(self, self.rects, self.images)
 		rc = dlg.ShowModal()
 		if rc == wx.ID_OK:
 			self.rects = dlg.rects[:]
 			self.bx.setRectangles(self.currentFace, self.rects)
+			self.setModified()
 			self.render()
 		dlg.Destroy()
 		
 	def onCbGrid(self, e):
 		self.gcf.setGrid(self.cbGrid.IsChecked())
 		
+	def onCbAllFaces(self, e):
+		self.multiView = self.cbAllFaces.GetValue()
+		if not self.multiView:
+			self.gcf.clearTiles()
+		self.render()
+		
 	def onCbPath(self, e):
 		self.gcf.setPathOnly(self.cbPath.IsChecked())
 
@@ -952,14 +1512,29 @@ class MainFrame(wx.Frame):
 			if rc != wx.ID_YES:
 				return
 			
+		if self.gcodeDlg is not None:
+			self.gcodeDlg.doExit(None)
+		if self.renderTimer is not None:
+			self.renderTimer.Stop()
+		self.renderer.stop()
+		
+		if metricsFile is not None:
+			try:
+				metrics.export(metricsFile)
+			except OSError as e:
+				log.warning("Unable to write metrics to %s: %s", metricsFile, str(e))
+			
 		self.settings.saveSettings()
 		self.Destroy()
 				
 class App(wx.App):
 	def OnInit(self):
-		self.frame = MainFrame()
+		with profile.stage("frame construction"):
+			self.frame = MainFrame()
+		profile.add("  image decoding", self.frame.images.decodeTime, self.frame.images.decodeCount)
 		self.frame.Show()
 		self.SetTopWindow(self.frame)
+		profile.finish()
 		return True
 
 app = App(False)
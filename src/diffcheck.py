@@ -0,0 +1,399 @@
+import os
+import sys
+import copy
+import json
+import random
+
+import box
+import boxfile
+import gcodegen
+import grblsim
+import jobdaemon
+import rendercache
+import metrics
+
+CONFIGS = 1000
+TOLERANCE = 1e-6		# mm, for outlines; programs allow one unit in the last printed digit
+TOOLRADS = [0.5, 1.5, 3.175]
+
+# sizes come from a short list so that configurations often share dimensions
+# and differ elsewhere, which is where a cached outline could wrongly be reused
+SIZES = [60.0, 100.0, 152.5, 240.0, 400.0]
+WALLS = [3.0, 6.0, 9.5]
+
+# An engine produces, for one panel, its outlines (at full and at blind depth)
+# and its program.  Every engine is checked against the reference, which is
+# the plain face.render and generator path with no caching at all.  Anything
+# that is meant to produce the same geometry faster belongs in engines.
+
+def generator(settings):
+	gen = gcodegen.GCodeGenerator()
+	gen.setSettings(settings)
+	return gen
+
+def renderPanel(bx, pid, toolrad, settings):
+	outlines = [bx.render(pid, toolrad, blind)[0] for blind in [False, True]]
+	return [outlines, generator(settings).generate(bx, pid, toolrad)]
+
+class Engine:
+	name = None
+
+	def reset(self):
+		pass
+
+	def run(self, state, pid, toolrad, settings):
+		return reference(state, pid, toolrad, settings)
+
+class CachedEngine(Engine):
+	# one long-lived box taken from state to state the way the editor does it,
+	# over a render cache that every earlier configuration has warmed
+	name = "cached"
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.bx = None
+		self.cache = rendercache.RenderCache()
+
+	def run(self, state, pid, toolrad, settings):
+		saved = rendercache.cache
+		rendercache.cache = self.cache
+		try:
+			if self.bx is None:
+				self.bx = box.fromState(state, toolrad)
+			else:
+				self.bx.setState(state, toolrad)
+			return renderPanel(self.bx, pid, toolrad, settings)
+		finally:
+			rendercache.cache = saved
+
+class PostEngine(Engine):
+	# another controller dialect must describe the same moves
+	def __init__(self, post):
+		self.post = post
+		self.name = post.lower()
+
+	def run(self, state, pid, toolrad, settings):
+		s = dict(settings)
+		s["post"] = self.post
+		return reference(state, pid, toolrad, s)
+
+engines = [CachedEngine(), PostEngine("LinuxCNC"), PostEngine("Mach3")]
+
+def reference(state, pid, toolrad, settings):
+	saved = rendercache.cache
+	rendercache.cache = rendercache.RenderCache(0)
+	try:
+		return renderPanel(box.fromState(state, toolrad), pid, toolrad, settings)
+	finally:
+		rendercache.cache = saved
+
+def randomState(rnd):
+	st = boxfile.defaultState()
+	for n in ["width", "height", "depth"]:
+		st[n] = rnd.choice(SIZES)
+	st["wall"] = rnd.choice(WALLS)
+	for c in box.cornerTypes:
+		st["tabcount"][c] = rnd.choice([0, 0, 1, 2, 3, 5, 8])
+		st["tablength"][c] = rnd.choice([5, 10, 15])
+		st["tabtype"][c] = rnd.choice([box.TABS, box.SLOTS])
+		st["tabpitch"][c] = rnd.choice([0, 0, 20.0, 35.0])
+	st["relief"] = rnd.choice([box.NRELIEF, box.HRELIEF, box.WRELIEF])
+	st["blindtabs"] = [rnd.random() < 0.2 for f in box.faceTypes]
+
+	for f in box.faceTypes:
+		for i in range(rnd.choice([0, 0, 1, 3])):
+			st["circles"][f].append([[round(rnd.uniform(-20, 20), 2), round(rnd.uniform(-20, 20), 2)], round(rnd.uniform(2, 8), 2)])
+		for i in range(rnd.choice([0, 0, 1, 2])):
+			st["rectangles"][f].append([[round(rnd.uniform(-15, 15), 2), round(rnd.uniform(-15, 15), 2)], round(rnd.uniform(4, 12), 2), round(rnd.uniform(4, 12), 2)])
+
+	for i in range(rnd.choice([0, 0, 1, 2])):
+		dt = rnd.choice(box.dividerTypes)
+		span = st["depth"] if dt == box.DIVIDER_ACROSS else st["width"]
+		limit = span / 2.0 - 1.5 * st["wall"]
+		if limit > 0:
+			st["dividers"].append([dt, round(rnd.uniform(-limit, limit), 1)])
+	return boxfile.normalizeState(st)
+
+def randomSettings(rnd):
+	return {
+		"origin": rnd.choice(gcodegen.originTypes),
+		"insideCW": rnd.random() < 0.5,
+		"outsideCW": rnd.random() < 0.5,
+		"metric": rnd.random() < 0.8,
+		"addSpeed": rnd.random() < 0.8,
+		"sigDigits": rnd.choice([2, 3, 4, 5]),
+		"depthPerCut": rnd.choice([0.5, 1.0, 2.5]),
+		"extraDepth": rnd.choice([0.0, 0.5]),
+	}
+
+def motions(gcode):
+	# the program as the machine sees it: the units, and every move as
+	# [motion, x, y, z, i, j, feed] with modal words filled in.  Comments and
+	# setup codes, which differ between dialects, drop out.
+	p = grblsim.Parser()
+	units = None
+	motion = 0
+	feed = 0.0
+	pos = [0.0, 0.0, 0.0]
+	moves = []
+	for l in gcode:
+		ij = [0.0, 0.0]
+		axes = False
+		for w, v in p.words(l):
+			if w == "G":
+				g = int(round(v * 10))
+				if g in [0, 10, 20, 30]:
+					motion = g // 10
+				elif g in [200, 210]:
+					units = g // 10
+			elif w == "F":
+				feed = v
+			elif w in "XYZ":
+				pos["XYZ".index(w)] = v
+				axes = True
+			elif w in "IJ":
+				ij["IJ".index(w)] = v
+		if axes:
+			moves.append([motion] + pos + ij + [feed if motion != 0 else 0.0])
+	return units, moves
+
+def firstDifference(a, b, tol, names):
+	# where two lists of coordinate tuples first differ by more than tol
+	for i in range(min(len(a), len(b))):
+		for k in range(len(names) - 1):
+			if abs(a[i][k] - b[i][k]) > tol:
+				return "%s %d: %s is %r, expected %r" % (names[0], i, names[k + 1], b[i][k], a[i][k])
+	if len(a) != len(b):
+		return "%d %ss, expected %d" % (len(b), names[0], len(a))
+	return None
+
+def compare(ref, out, tol, sigDigits):
+	# None when out matches ref within tolerance, otherwise what differs first
+	for n, a, b in zip(["outline", "blind outline"], ref[0], out[0]):
+		d = firstDifference(a, b, tol, ["point", "x", "y"])
+		if d is not None:
+			return "%s %s" % (n, d)
+
+	ua, ma = motions(ref[1])
+	ub, mb = motions(out[1])
+	if ua != ub:
+		return "program units G%s, expected G%s" % (ub, ua)
+	d = firstDifference(ma, mb, max(tol, 10.0 ** -sigDigits), ["move", "motion", "x", "y", "z", "i", "j", "feed"])
+	if d is not None:
+		return "program %s" % d
+	return None
+
+def check(engine, state, pid, toolrad, settings, tol, ref=None):
+	# the difference between engine and reference for one panel, if any.
+	# Configurations the reference itself cannot do are not differences.
+	if ref is None:
+		try:
+			ref = reference(state, pid, toolrad, settings)
+		except Exception:
+			return None
+	try:
+		out = engine.run(state, pid, toolrad, settings)
+	except Exception as e:
+		return "raised %s: %s" % (type(e).__name__, str(e))
+	return compare(ref, out, tol, settings.get("sigDigits", 4))
+
+def simplifications(state, settings):
+	# variants of a failing case with one thing taken away or set back to its
+	# default, roughly biggest first
+	out = []
+	def variant(key, value, index=None):
+		st = copy.deepcopy(state)
+		if index is None:
+			st[key] = value
+		else:
+			st[key][index] = value
+		if st != state:
+			out.append([st, settings])
+
+	variant("dividers", [])
+	for i in range(len(state["dividers"])):
+		variant("dividers", state["dividers"][:i] + state["dividers"][i+1:])
+	for f in box.faceTypes:
+		variant("circles", [], f)
+		variant("rectangles", [], f)
+	variant("blindtabs", [False] * boxfile.NFACES)
+	for f in box.faceTypes:
+		variant("blindtabs", False, f)
+	for n, v in boxfile.DEFAULTS.items():
+		variant(n, copy.deepcopy(v))
+	for c in box.cornerTypes:
+		for n in ["tabcount", "tabpitch", "tabtype"]:
+			variant(n, 0, c)
+
+	defaults = gcodegen.GCodeGenerator().getSettings()
+	for n in settings:
+		if settings[n] != defaults[n]:
+			s = dict(settings)
+			s[n] = defaults[n]
+			out.append([state, s])
+	return out
+
+def shrink(engine, state, pid, toolrad, settings, tol, prior=None):
+	# greedily take any simpler case that still shows a difference, until none
+	# does.  Engines that carry state between runs are replayed the way the
+	# editor would get there: the prior [state, toolrad] if given, then every
+	# panel of the box itself.
+	def fails(st, s):
+		if pid not in box.fromState(st, toolrad).panelTypes():
+			return None
+		replayHistory(engine, st, toolrad, s, prior)
+		return check(engine, st, pid, toolrad, s, tol)
+
+	diff = fails(state, settings)
+	if diff is None:
+		return None
+	changed = True
+	while changed:
+		changed = False
+		for st, s in simplifications(state, settings):
+			d = fails(st, s)
+			if d is not None:
+				state, settings, diff = st, s, d
+				changed = True
+				break
+	return state, settings, diff
+
+def replayHistory(engine, state, toolrad, settings, prior):
+	engine.reset()
+	for st, tr in ([prior] if prior is not None else []) + [[state, toolrad]]:
+		for pid in box.fromState(st, tr).panelTypes():
+			try:
+				engine.run(st, pid, tr, settings)
+			except Exception:
+				pass
+
+def writeReproducer(outDir, n, engine, state, pid, toolrad, settings, diff, prior):
+	os.makedirs(outDir, exist_ok=True)
+	base = os.path.join(outDir, "%s-%d" % (engine.name, n))
+	boxfile.writeBox(base + boxfile.BOXEXT, state)
+	rep = {
+		"engine": engine.name,
+		"box": os.path.basename(base + boxfile.BOXEXT),
+		"panel": jobdaemon.panelFileName(box.fromState(state, toolrad), pid),
+		"toolrad": toolrad,
+		"settings": settings,
+		"prior": None,
+		"difference": diff,
+	}
+	if prior is not None:
+		boxfile.writeBox(base + "-prior" + boxfile.BOXEXT, prior[0])
+		rep["prior"] = {"box": os.path.basename(base + "-prior" + boxfile.BOXEXT), "toolrad": prior[1]}
+	with open(base + ".json", "w") as fp:
+		json.dump(rep, fp, indent=1)
+	return base + ".json"
+
+def replay(path, tol=TOLERANCE):
+	# runs a reproducer again; the difference, or None if it is fixed
+	with open(path, "r") as fp:
+		rep = json.load(fp)
+	d = os.path.dirname(path)
+	engine = [e for e in engines if e.name == rep["engine"]][0]
+	state = boxfile.readBox(os.path.join(d, rep["box"]))
+	prior = None
+	if rep["prior"] is not None:
+		prior = [boxfile.readBox(os.path.join(d, rep["prior"]["box"])), rep["prior"]["toolrad"]]
+	pid = jobdaemon.selectPanels(box.fromState(state, rep["toolrad"]), [rep["panel"]])[0]
+	replayHistory(engine, state, rep["toolrad"], rep["settings"], prior)
+	return check(engine, state, pid, rep["toolrad"], rep["settings"], tol)
+
+def run(configs=CONFIGS, seed=0, names=None, outDir=None, tol=TOLERANCE):
+	# [configurations checked, panels checked, skipped panels, mismatches], where
+	# each distinct mismatch is [engine, state, pid, toolrad, settings, difference, prior]
+	# and prior is the [state, toolrad] it needs to be preceded by, if any
+	rnd = random.Random(seed)
+	active = [e for e in engines if names is None or e.name in names]
+	for e in active:
+		e.reset()
+	panels = 0
+	skipped = 0
+	mismatches = []
+	seen = set()
+	prior = None
+	for n in range(configs):
+		state = randomState(rnd)
+		settings = randomSettings(rnd)
+		toolrad = rnd.choice(TOOLRADS)
+		for pid in box.fromState(state, toolrad).panelTypes():
+			try:
+				ref = reference(state, pid, toolrad, settings)
+			except Exception:
+				skipped += 1
+				continue
+			panels += 1
+			for e in active:
+				diff = check(e, state, pid, toolrad, settings, tol, ref)
+				if diff is None:
+					continue
+				small = shrink(e, state, pid, toolrad, settings, tol)
+				p = None
+				if small is None:
+					# only shows after what came before; keep that with it
+					p = prior
+					small = shrink(e, state, pid, toolrad, settings, tol, p) or [state, settings, diff]
+				# the engines with history have to pick up from here again
+				e.reset()
+				key = json.dumps([e.name, small[0], pid, toolrad, small[1], p], sort_keys=True)
+				if key in seen:
+					continue
+				seen.add(key)
+				mismatches.append([e, small[0], pid, toolrad, small[1], small[2], p])
+				if outDir is not None:
+					writeReproducer(outDir, len(mismatches), e, small[0], pid, toolrad, small[1], small[2], p)
+		prior = [state, toolrad]
+		if (n + 1) % 100 == 0:
+			print("%d configurations, %d panels, %d mismatches" % (n + 1, panels, len(mismatches)))
+	return configs, panels, skipped, mismatches
+
+if __name__ == "__main__":
+	configs = CONFIGS
+	seed = 0
+	names = None
+	outDir = None
+	tol = TOLERANCE
+	replays = []
+	logLevel = "error"
+	for a in sys.argv[1:]:
+		if a.startswith("--configs="):
+			configs = int(a[10:])
+		elif a.startswith("--seed="):
+			seed = int(a[7:])
+		elif a.startswith("--engines="):
+			names = a[10:].split(",")
+		elif a.startswith("--out="):
+			outDir = a[6:]
+		elif a.startswith("--tolerance="):
+			tol = float(a[12:])
+		elif a.startswith("--replay="):
+			replays.append(a[9:])
+		elif a.startswith("--log="):
+			logLevel = a[6:]
+		else:
+			print("usage: %s [--configs=n] [--seed=n] [--engines=%s] [--out=dir] [--tolerance=mm] [--replay=reproducer.json] [--log=level]" % (sys.argv[0], ",".join([e.name for e in engines])))
+			sys.exit(1)
+
+	# the generator warns about every divider it drops, and random boxes have
+	# plenty of those
+	metrics.setupLogging(logLevel)
+	if len(replays) > 0:
+		failed = 0
+		for r in replays:
+			diff = replay(r, tol)
+			print("%s: %s" % (r, "fixed" if diff is None else diff))
+			failed += diff is not None
+		sys.exit(1 if failed else 0)
+
+	checked, panels, skipped, mismatches = run(configs, seed, names, outDir, tol)
+	print("%d configurations, %d panels checked, %d the reference could not do" % (checked, panels, skipped))
+	for e, state, pid, toolrad, settings, diff, prior in mismatches:
+		print("%s: %s, toolrad %s, settings %s: %s" % (e.name, box.fromState(state, toolrad).panelName(pid), toolrad, json.dumps(settings, sort_keys=True), diff))
+	if len(mismatches) > 0:
+		if outDir is not None:
+			print("reproducers written to %s" % outDir)
+		sys.exit(1)
@@ -0,0 +1,259 @@
+import sys
+
+import box
+import gcodefile
+
+try:
+	import ezdxf
+except ImportError:
+	ezdxf = None
+
+FORMAT_DXF = "dxf"
+FORMAT_SVG = "svg"
+
+FACEGAP = 10.0
+COORDFORMAT = "%.4f"
+CHECKTOLERANCE = 0.0001
+
+faceNames = ["TOP", "BOTTOM", "LEFT", "RIGHT", "FRONT", "BACK"]
+
+def formatFor(path):
+	if path.lower().endswith(".svg"):
+		return FORMAT_SVG
+	return FORMAT_DXF
+
+def openPath(points):
+	# a closed polyline lists its first point once
+	if len(points) > 1 and points[0] == points[-1]:
+		return points[:-1]
+	return points
+
+def rectPoints(center, dx, dy):
+	cx, cy = center
+	return [[cx-dx, cy-dy], [cx+dx, cy-dy], [cx+dx, cy+dy], [cx-dx, cy+dy]]
+
+class DXFWriter:
+	# R12 DXF: the oldest and most widely read version, which needs no entity
+	# handles, subclass markers or tables.  Each entity goes straight to the
+	# output as it is added.
+	def __init__(self, out, metric=True):
+		self.out = out
+		self.metric = metric
+
+	def begin(self, width, height):
+		w = self.out.write
+		w("0\nSECTION\n2\nHEADER\n")
+		w("9\n$ACADVER\n1\nAC1009\n")
+		w("9\n$INSUNITS\n70\n%d\n" % (4 if self.metric else 1))
+		w("9\n$EXTMIN\n10\n0.0\n20\n0.0\n")
+		w(("9\n$EXTMAX\n10\n" + COORDFORMAT + "\n20\n" + COORDFORMAT + "\n") % (width, height))
+		w("0\nENDSEC\n")
+		w("0\nSECTION\n2\nENTITIES\n")
+
+	def outline(self, points, layer):
+		w = self.out.write
+		w("0\nPOLYLINE\n8\n%s\n66\n1\n10\n0.0\n20\n0.0\n30\n0.0\n70\n1\n" % layer)
+		fmt = "0\nVERTEX\n8\n" + layer + "\n10\n" + COORDFORMAT + "\n20\n" + COORDFORMAT + "\n30\n0.0\n"
+		for p in openPath(points):
+			w(fmt % (p[0], p[1]))
+		w("0\nSEQEND\n8\n%s\n" % layer)
+
+	def circle(self, center, r, layer):
+		self.out.write(("0\nCIRCLE\n8\n%s\n10\n" + COORDFORMAT + "\n20\n" + COORDFORMAT + "\n30\n0.0\n40\n" + COORDFORMAT + "\n")
+					% (layer, center[0], center[1], r))
+
+	def rect(self, center, dx, dy, layer):
+		self.outline(rectPoints(center, dx, dy), layer)
+
+	def end(self):
+		self.out.write("0\nENDSEC\n0\nEOF\n")
+
+class EntityRecorder:
+	# the entities a DXFWriter would write, in order, for checking a file
+	# once it is read back
+	def __init__(self):
+		self.entities = []
+
+	def outline(self, points, layer):
+		self.entities.append(["outline", layer, openPath(points)])
+
+	def circle(self, center, r, layer):
+		self.entities.append(["circle", layer, [center[0], center[1]], r])
+
+	def rect(self, center, dx, dy, layer):
+		self.outline(rectPoints(center, dx, dy), layer)
+
+class SVGWriter:
+	def __init__(self, out, metric=True):
+		self.out = out
+		self.units = "mm" if metric else "in"
+
+	def begin(self, width, height):
+		w = self.out.write
+		w('<?xml version="1.0" encoding="UTF-8"?>\n')
+		w(('<svg xmlns="http://www.w3.org/2000/svg" width="' + COORDFORMAT + '%s" height="' + COORDFORMAT + '%s" viewBox="0 0 ' + COORDFORMAT + ' ' + COORDFORMAT + '">\n')
+			% (width, self.units, height, self.units, width, height))
+		# flip y so that the face coordinates read the same as in the G Code
+		w(('<g transform="translate(0,' + COORDFORMAT + ') scale(1,-1)" fill="none" stroke="black" stroke-width="0.1">\n') % height)
+
+	def outline(self, points, layer):
+		w = self.out.write
+		w('<path id="%s" d="M' % layer)
+		fmt = " " + COORDFORMAT + "," + COORDFORMAT
+		for p in points:
+			w(fmt % (p[0], p[1]))
+		w(' Z"/>\n')
+
+	def circle(self, center, r, layer):
+		self.out.write(('<circle class="%s" cx="' + COORDFORMAT + '" cy="' + COORDFORMAT + '" r="' + COORDFORMAT + '"/>\n')
+					% (layer, center[0], center[1], r))
+
+	def rect(self, center, dx, dy, layer):
+		self.out.write(('<rect class="%s" x="' + COORDFORMAT + '" y="' + COORDFORMAT + '" width="' + COORDFORMAT + '" height="' + COORDFORMAT + '"/>\n')
+					% (layer, center[0]-dx, center[1]-dy, 2*dx, 2*dy))
+
+	def end(self):
+		self.out.write('</g>\n</svg>\n')
+
+class OffsetWriter:
+	def __init__(self, writer, ox, oy):
+		self.writer = writer
+		self.ox = ox
+		self.oy = oy
+
+	def outline(self, points, layer):
+		self.writer.outline([[p[0]+self.ox, p[1]+self.oy] for p in points], layer)
+
+	def circle(self, center, r, layer):
+		self.writer.circle([center[0]+self.ox, center[1]+self.oy], r, layer)
+
+	def rect(self, center, dx, dy, layer):
+		self.writer.rect([center[0]+self.ox, center[1]+self.oy], dx, dy, layer)
+
+def writeFace(writer, bx, ft, kerf):
+	pts, crc, rct = bx.render(ft, kerf)
+	if ft in box.faceTypes:
+		layer = "FACE_" + faceNames[ft]
+	else:
+		layer = "DIVIDER_%d" % (ft - len(box.faceTypes) + 1)
+	writer.outline(pts, layer)
+	for c in crc:
+		writer.circle(c[0], c[1] - kerf, layer + "_HOLES")
+	for r in rct:
+		writer.rect(r[0], r[1]/2.0 - kerf, r[2]/2.0 - kerf, layer + "_HOLES")
+
+def exportFaces(bx, path, faces=None, kerf=0.0, fmt=None, metric=True):
+	if faces is None:
+		faces = bx.panelTypes()
+	if fmt is None:
+		fmt = formatFor(path)
+
+	dims = [bx.getFaceDim(ft) for ft in faces]
+	width = sum([w + 2*kerf for w, h in dims]) + FACEGAP * (len(faces) + 1)
+	height = max([h + 2*kerf for w, h in dims]) + 2 * FACEGAP
+
+	with gcodefile.GCodeWriter(path) as gw:
+		out = TextStream(gw)
+		if fmt == FORMAT_SVG:
+			writer = SVGWriter(out, metric)
+		else:
+			writer = DXFWriter(out, metric)
+
+		writer.begin(width, height)
+		placeFaces(writer, bx, faces, kerf)
+		writer.end()
+
+def placeFaces(writer, bx, faces, kerf):
+	# faces side by side along x, in the given order
+	x = FACEGAP
+	for ft in faces:
+		fw, fh = bx.getFaceDim(ft)
+		ox = x + fw/2.0 + kerf
+		oy = FACEGAP + fh/2.0 + kerf
+		writeFace(OffsetWriter(writer, ox, oy), bx, ft, kerf)
+		x += fw + 2*kerf + FACEGAP
+
+def expectedEntities(bx, faces, kerf):
+	rec = EntityRecorder()
+	placeFaces(rec, bx, faces, kerf)
+	return rec.entities
+
+def entityNumbers(e):
+	if e[0] == "outline":
+		return sum([[p[0], p[1]] for p in e[2]], [])
+	return [e[2][0], e[2][1], e[3]]
+
+def checkDXF(path, expected):
+	# reads an exported file back with ezdxf; the differences from the
+	# entities written, if any
+	if ezdxf is None:
+		raise RuntimeError("checking DXF files needs ezdxf")
+	found = []
+	for e in ezdxf.readfile(path).modelspace():
+		if e.dxftype() == "POLYLINE":
+			found.append(["outline", e.dxf.layer, [[v[0], v[1]] for v in e.points()]])
+		elif e.dxftype() == "CIRCLE":
+			found.append(["circle", e.dxf.layer, [e.dxf.center[0], e.dxf.center[1]], e.dxf.radius])
+		else:
+			found.append([e.dxftype(), e.dxf.layer])
+
+	if len(found) != len(expected):
+		return ["%d entities read, %d written" % (len(found), len(expected))]
+	problems = []
+	for i in range(len(expected)):
+		a, b = expected[i], found[i]
+		if a[:2] != b[:2]:
+			problems.append("entity %d: %s on %s read as %s on %s" % (i, a[0], a[1], b[0], b[1]))
+			continue
+		wrote, read = entityNumbers(a), entityNumbers(b)
+		if len(wrote) != len(read) or max([abs(x - y) for x, y in zip(wrote, read)] + [0.0]) > CHECKTOLERANCE:
+			problems.append("entity %d: %s on %s does not read back as written" % (i, a[0], a[1]))
+	return problems
+
+class TextStream:
+	# adapts the line oriented GCodeWriter to the write() calls of the vector writers
+	def __init__(self, gw):
+		self.stream = gw.stream
+
+	def write(self, s):
+		self.stream.write(s.encode("utf-8"))
+
+if __name__ == "__main__":
+	if len(sys.argv) < 3:
+		print("usage: %s boxfile outfile.dxf|outfile.svg [face ...] [--kerf=radius] [--imperial] [--check]" % sys.argv[0])
+		sys.exit(1)
+
+	bx = box.box(100, 200, 200, 6)
+	kerf = 0.0
+	metric = True
+	check = False
+	faces = []
+	for a in sys.argv[3:]:
+		if a.startswith("--kerf="):
+			kerf = float(a[7:])
+		elif a == "--imperial":
+			metric = False
+		elif a == "--check":
+			check = True
+		elif a.upper() in faceNames:
+			faces.append(faceNames.index(a.upper()))
+		else:
+			print("Unknown argument: %s" % a)
+			sys.exit(1)
+
+	if not bx.loadBox(sys.argv[1], kerf):
+		sys.exit(1)
+	if len(faces) == 0:
+		faces = bx.panelTypes()
+	exportFaces(bx, sys.argv[2], faces, kerf, metric=metric)
+	print("exported %s" % sys.argv[2])
+	if check and formatFor(sys.argv[2]) == FORMAT_DXF:
+		# the entities are made again rather than kept from the export, so a
+		# large export never holds them all in memory
+		expected = expectedEntities(bx, faces, kerf)
+		problems = checkDXF(sys.argv[2], expected)
+		for p in problems:
+			print(p)
+		print("%d entities read back, %d problems" % (len(expected), len(problems)))
+		if len(problems) > 0:
+			sys.exit(1)
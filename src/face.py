@@ -1,4 +1,9 @@
 from math import fabs
+import logging
+
+import metrics
+
+log = logging.getLogger(__name__)
 
 FWIDTH = 0
 FHEIGHT = 1
@@ -19,10 +24,13 @@ class face:
 		self.wtablen = 10
 		self.htabs = []
 		self.wtabs = []
+		self.hfixed = False
+		self.wfixed = False
 		self.hrelief = False
 		self.wrelief = False
 		self.rects = []
 		self.circles = []
+		self.plainSides = [False, False, False, False]
 		
 	def getDim(self):
 		return self.width, self.height
@@ -41,6 +49,8 @@ class face:
 		self.calcHTabs()
 		
 	def calcHTabs(self):
+		if self.hfixed:
+			return
 		if self.htabct > 0:
 			self.htabs = []
 			step = self.height/float(self.htabct+1.0)
@@ -54,6 +64,8 @@ class face:
 		self.calcWTabs()
 		
 	def calcWTabs(self):
+		if self.wfixed:
+			return
 		if self.wtabct > 0:
 			self.wtabs = []
 			step = self.width/float(self.wtabct+1.0)
@@ -88,6 +100,49 @@ class face:
 			self.htablen = l 
 			self.calcHTabs()
 		
+	def setTabs(self, horw, tabs):
+		if horw == FWIDTH:
+			if tabs is None:
+				self.wfixed = False
+				self.calcWTabs()
+			else:
+				self.wfixed = True
+				self.wtabs = tabs[:]
+				self.wtabct = len(tabs)
+		else:
+			if tabs is None:
+				self.hfixed = False
+				self.calcHTabs()
+			else:
+				self.hfixed = True
+				self.htabs = tabs[:]
+				self.htabct = len(tabs)
+		
+	def tabsFixed(self, horw):
+		if horw == FWIDTH:
+			return self.wfixed
+		return self.hfixed
+		
+	def edgeKeepOut(self, horw, clearance):
+		# intervals along the edge, measured from its start, where openings come
+		# too close to the edge for a tab or slot
+		keepOut = []
+		limit = self.thickness + clearance
+		ext = [[c[0], c[1], c[1]] for c in self.circles] + [[r[0], r[1]/2.0, r[2]/2.0] for r in self.rects]
+		for ctr, hx, hy in ext:
+			if horw == FWIDTH:
+				if self.height/2.0 - (abs(ctr[1]) + hy) < limit:
+					keepOut.append([ctr[0] - hx + self.width/2.0, ctr[0] + hx + self.width/2.0])
+			else:
+				if self.width/2.0 - (abs(ctr[0]) + hx) < limit:
+					keepOut.append([ctr[1] - hy + self.height/2.0, ctr[1] + hy + self.height/2.0])
+		return keepOut
+		
+	def setPlainSides(self, ps):
+		# sides drawn as a straight edge at the inner surface, ignoring tabs; used
+		# for the open edge of a divider
+		self.plainSides = ps[:]
+		
 	def setTabCount(self, horw, n):
 		if horw == FWIDTH:
 			self.wtabct = n 
@@ -96,21 +151,27 @@ class face:
 			self.htabct = n 
 			self.calcHTabs()
 		
+	def outlineKey(self, toolrad, blindDepth, faceBlind, adjacentBlind):
+		# everything the outline depends on; openings do not change the outline
+		return (self.width, self.height, self.thickness, self.htabtype, self.wtabtype,
+				self.htabct, self.wtabct, tuple(self.htabs), tuple(self.wtabs),
+				self.hrelief, self.wrelief, toolrad, blindDepth, faceBlind, tuple(adjacentBlind), tuple(self.plainSides))
+		
 	def render(self, toolrad, blindDepth, faceBlind, adjacentBlind):
 		
 		if faceBlind and not blindDepth:
-			print("Dig out entire slot area")
+			log.debug("Dig out entire slot area")
 		elif faceBlind:
-			print("outline outside of slots")
+			log.debug("outline outside of slots")
 		else:
-			print("normal slots - outline only")
+			log.debug("normal slots - outline only")
 			
-		print("adjacency matrix: ", adjacentBlind)
+		log.debug("adjacency matrix: %s", adjacentBlind)
 		sides = []
-		sides.append(self.renderHSide([-self.width/2.0, -self.height/2.0], [-self.width/2.0, self.height/2.0], -1, toolrad, blindDepth, faceBlind, adjacentBlind[0]))
-		sides.append(self.renderWSide([-self.width/2.0, self.height/2.0], [self.width/2.0, self.height/2.0], 1, toolrad, blindDepth, faceBlind, adjacentBlind[1]))
-		sides.append(self.renderHSide([self.width/2.0, self.height/2.0], [self.width/2.0, -self.height/2.0], 1, toolrad, blindDepth, faceBlind, adjacentBlind[2]))
-		sides.append(self.renderWSide([self.width/2.0, -self.height/2.0], [-self.width/2.0, -self.height/2.0], -1, toolrad, blindDepth, faceBlind, adjacentBlind[3]))
+		sides.append(self.renderHSide([-self.width/2.0, -self.height/2.0], [-self.width/2.0, self.height/2.0], -1, toolrad, blindDepth, faceBlind, adjacentBlind[0], self.plainSides[0]))
+		sides.append(self.renderWSide([-self.width/2.0, self.height/2.0], [self.width/2.0, self.height/2.0], 1, toolrad, blindDepth, faceBlind, adjacentBlind[1], self.plainSides[1]))
+		sides.append(self.renderHSide([self.width/2.0, self.height/2.0], [self.width/2.0, -self.height/2.0], 1, toolrad, blindDepth, faceBlind, adjacentBlind[2], self.plainSides[2]))
+		sides.append(self.renderWSide([self.width/2.0, -self.height/2.0], [-self.width/2.0, -self.height/2.0], -1, toolrad, blindDepth, faceBlind, adjacentBlind[3], self.plainSides[3]))
 		
 		sxMod = len(sides)
 		for sx in range(sxMod):
@@ -150,10 +211,10 @@ class face:
 	def renderRects(self):
 		return [[x[0], x[1], x[2]] for x in self.rects]
 	
-	def renderHSide(self, start, end, outDir, toolrad, renderBl, faceBl, adjBl):
+	def renderHSide(self, start, end, outDir, toolrad, renderBl, faceBl, adjBl, plain=False):
 		points = []
 		td = outDir*toolrad
-		if self.htabct == 0:
+		if self.htabct == 0 or plain:
 			if self.htabtype == TABS:
 				points.append([start[0]+td-outDir*self.thickness, start[1]+td])
 				points.append([end[0]+td-outDir*self.thickness, end[1]-td])
@@ -208,10 +269,10 @@ class face:
 			
 		return points
 		
-	def renderWSide(self, start, end, outDir, toolrad, renderBl, faceBl, adjBl):
+	def renderWSide(self, start, end, outDir, toolrad, renderBl, faceBl, adjBl, plain=False):
 		points = []
 		td = outDir*toolrad
-		if self.wtabct == 0:
+		if self.wtabct == 0 or plain:
 			if self.wtabtype == TABS:
 				points.append([start[0]-td, start[1]+td-outDir*self.thickness])
 				points.append([end[0]+td, end[1]+td-outDir*self.thickness])
@@ -267,3 +328,5 @@ class face:
 				points.append([end[0]+td, y])
 			
 		return points
+
+metrics.instrument(face, "render", "face.render")
@@ -1,9 +1,20 @@
 import wx, math
+import logging
+
+import metrics
+
+log = logging.getLogger(__name__)
 
 MAXZOOM = 10
 MINZOOM = 0.5
 ZOOMDELTA = 0.1
 
+TILECOLUMNS = 3
+TILEROWS = 2
+TILEMARGIN = 8
+TILELABEL = 16
+PROBLEMMARK = 8
+
 def triangulate(p1, p2):
 	dx = p2[0] - p1[0]
 	dy = p2[1] - p1[1]
@@ -30,9 +41,13 @@ class GcFrame (wx.Window):
 		self.data = None
 		self.circles = []
 		self.rects = []
+		self.problems = []
 		self.toolRad = 1;
 		self.hiLite = 0
 		self.pathOnly = False;
+		self.tiles = None
+		self.tileGeometry = []
+		self.selectedTile = None
 		
 		self.sz = [x * self.scale + 2*self.shiftX for x in self.buildarea]
 		
@@ -53,6 +68,12 @@ class GcFrame (wx.Window):
 		dc = wx.BufferedPaintDC(self, self.buffer)
 		
 	def onLeftDown(self, evt):
+		if self.tiles is not None:
+			t = self.tileAt(evt.GetPosition())
+			if t is not None:
+				self.parent.onTileSelected(t)
+			return
+		
 		self.startPos = evt.GetPosition()
 		self.startOffset = (self.offsetx, self.offsety)
 		self.CaptureMouse()
@@ -63,7 +84,7 @@ class GcFrame (wx.Window):
 			self.ReleaseMouse()
 			
 	def onMotion(self, evt):
-		if evt.Dragging() and evt.LeftIsDown():
+		if self.tiles is None and evt.Dragging() and evt.LeftIsDown():
 			x, y = evt.GetPosition()
 			dx = x - self.startPos[0]
 			dy = y - self.startPos[1]
@@ -74,6 +95,9 @@ class GcFrame (wx.Window):
 		evt.Skip()
 		
 	def onMouseWheel(self, evt):
+		if self.tiles is not None:
+			return
+		
 		if evt.ShiftDown(): 
 			if self.model is not None:
 				if evt.GetWheelRotation() < 0:
@@ -113,18 +137,89 @@ class GcFrame (wx.Window):
 		
 	def initBuffer(self):
 		w, h = self.GetClientSize()
-		print(w, h)
+		log.debug("preview buffer %d x %d", w, h)
 		self.buffer = wx.Bitmap(self.sz[0], self.sz[1])
 		self.redrawGraph()
 		
-	def setData(self, p, c, r, trad, hlseg):
+	def setData(self, p, c, r, trad, hlseg, problems=[]):
 		self.data = p[:]
 		self.circles = c
 		self.rects = r 
+		self.problems = problems
 		self.toolRad = trad
 		self.hiLite = hlseg
 		self.redrawGraph()
 		
+	def setTiles(self, tiles, selected):
+		# tiles is a list of [label, points, circles, rects], one per face.  The
+		# screen geometry is computed once here so that redraws only replay it.
+		self.tiles = tiles
+		self.selectedTile = selected
+		self.buildTileGeometry()
+		self.redrawGraph()
+		
+	def clearTiles(self):
+		self.tiles = None
+		self.tileGeometry = []
+		self.selectedTile = None
+		
+	def tileAt(self, pos):
+		for i in range(len(self.tileGeometry)):
+			x0, y0, tw, th = self.tileGeometry[i][0]
+			if x0 <= pos[0] < x0+tw and y0 <= pos[1] < y0+th:
+				return i
+		return None
+		
+	def buildTileGeometry(self):
+		self.tileGeometry = []
+		tw = self.sz[0] / TILECOLUMNS
+		rows = max(TILEROWS, int((len(self.tiles) + TILECOLUMNS - 1) / TILECOLUMNS))
+		th = self.sz[1] / rows
+		for i in range(len(self.tiles)):
+			label, pts, circles, rects = self.tiles[i]
+			x0 = (i % TILECOLUMNS) * tw
+			y0 = int(i / TILECOLUMNS) * th
+			frame = [int(x0), int(y0), int(tw), int(th)]
+			if pts is None or len(pts) == 0:
+				self.tileGeometry.append([frame, label, [], [], []])
+				continue
+			
+			xs = [p[0] for p in pts]
+			ys = [p[1] for p in pts]
+			minx, maxx, miny, maxy = min(xs), max(xs), min(ys), max(ys)
+			bw = max(maxx - minx, 1.0)
+			bh = max(maxy - miny, 1.0)
+			sc = min((tw - 2*TILEMARGIN) / bw, (th - 2*TILEMARGIN - TILELABEL) / bh)
+			cx = x0 + tw/2.0
+			cy = y0 + TILELABEL + (th - TILELABEL)/2.0
+			mx = (minx + maxx)/2.0
+			my = (miny + maxy)/2.0
+			
+			outline = [wx.Point(int(cx + (p[0]-mx)*sc), int(cy - (p[1]-my)*sc)) for p in pts]
+			holes = [[int(cx + (c[0][0]-mx)*sc), int(cy - (c[0][1]-my)*sc), max(int(c[1]*sc), 1)] for c in circles]
+			boxes = [[int(cx + (r[0][0]-r[1]/2.0-mx)*sc), int(cy - (r[0][1]+r[2]/2.0-my)*sc), max(int(r[1]*sc), 1), max(int(r[2]*sc), 1)] for r in rects]
+			self.tileGeometry.append([frame, label, outline, holes, boxes])
+			
+	def drawTiles(self, dc):
+		dc.SetBrush(wx.TRANSPARENT_BRUSH)
+		dc.SetTextForeground(wx.Colour(200, 200, 200))
+		for i in range(len(self.tileGeometry)):
+			frame, label, outline, holes, boxes = self.tileGeometry[i]
+			if i == self.selectedTile:
+				dc.SetPen(wx.Pen("yellow", 2))
+			else:
+				dc.SetPen(wx.Pen(dk_Gray, 1))
+			dc.DrawRectangle(frame[0]+1, frame[1]+1, frame[2]-2, frame[3]-2)
+			dc.DrawText(label, frame[0]+TILEMARGIN, frame[1]+2)
+			
+			dc.SetPen(wx.Pen("green", 1))
+			if len(outline) > 1:
+				dc.DrawLines(outline)
+			for x, y, r in holes:
+				dc.DrawCircle(x, y, r)
+			for x, y, w, h in boxes:
+				dc.DrawRectangle(x, y, w, h)
+		
 	def hiLiteForward(self):
 		if self.hiLite < (len(self.data)-1):
 			self.hiLite += 1
@@ -168,10 +263,15 @@ class GcFrame (wx.Window):
 		dc.SetBackground(wx.Brush("black"))
 		dc.Clear()
 		
+		if self.tiles is not None:
+			self.drawTiles(dc)
+			return
+		
 		self.drawGrid(dc)
 		self.drawCircles(dc)
 		self.drawRects(dc)
 		self.drawPoints(dc)
+		self.drawProblems(dc)
 			
 	def setGrid(self, gf):
 		self.showGrid = gf
@@ -256,6 +356,13 @@ class GcFrame (wx.Window):
 			self.drawLine(dc, [xb, yb], [xb, ya])
 			self.drawLine(dc, [xb, ya], [xa, ya])
 
+	def drawProblems(self, dc):
+		dc.SetPen(wx.Pen("yellow", 2))
+		dc.SetBrush(wx.TRANSPARENT_BRUSH)
+		for loc in self.problems:
+			(x, y) = self.transform(loc[0], loc[1])
+			dc.DrawCircle(int(x), int(y), PROBLEMMARK)
+
 	def drawLine(self, dc, start, end, hlFlag=False):
 		if hlFlag:
 			c = "red"
@@ -300,3 +407,5 @@ class GcFrame (wx.Window):
 		x = (ptx - self.offsetx)*self.zoom*self.scale
 		y = (pty + self.offsety)*self.zoom*self.scale
 		return (x+self.shiftX, self.buildarea[1]-(y+self.shiftY))
+
+metrics.instrument(GcFrame, "drawGraph", "preview.redraw")
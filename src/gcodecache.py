@@ -0,0 +1,86 @@
+import os
+import json
+import hashlib
+import logging
+
+import gcodefile
+
+log = logging.getLogger(__name__)
+
+CACHEEXT = ".nc"
+CACHEVERSION = 2
+
+def generationKey(state, ft, toolrad, settings):
+	d = {"version": CACHEVERSION, "box": state, "face": ft, "toolrad": toolrad, "settings": settings}
+	s = json.dumps(d, sort_keys=True, separators=(",", ":"))
+	return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+class GCodeCache:
+	def __init__(self, directory, maxBytes):
+		self.directory = directory
+		self.maxBytes = maxBytes
+		try:
+			os.makedirs(directory, exist_ok=True)
+		except OSError as e:
+			log.warning("Unable to create G Code cache directory %s: %s", directory, str(e))
+
+	def entryPath(self, key):
+		return os.path.join(self.directory, key + CACHEEXT)
+
+	def get(self, key):
+		fn = self.entryPath(key)
+		try:
+			os.utime(fn)
+		except OSError:
+			return None
+		return fn
+
+	def put(self, key, gcode):
+		fn = self.entryPath(key)
+		try:
+			gcodefile.writeGCode(fn, gcode)
+		except OSError as e:
+			log.warning("Unable to write G Code cache entry %s: %s", fn, str(e))
+			return None
+
+		self.evict(fn)
+		return fn
+
+	def read(self, key):
+		fn = self.get(key)
+		if fn is None:
+			return None
+		return gcodefile.readGCode(fn)
+
+	def copyTo(self, key, path, compression=gcodefile.COMPRESS_NONE):
+		fn = self.get(key)
+		if fn is None:
+			return False
+
+		gcodefile.copyGCode(fn, path, compression)
+		return True
+
+	def evict(self, keep=None):
+		entries = []
+		total = 0
+		try:
+			with os.scandir(self.directory) as it:
+				for e in it:
+					if e.is_file() and e.name.endswith(CACHEEXT):
+						st = e.stat()
+						entries.append([st.st_mtime, st.st_size, e.path])
+						total += st.st_size
+		except OSError:
+			return
+
+		entries.sort()
+		for mtime, size, fn in entries:
+			if total <= self.maxBytes:
+				break
+			if fn == keep:
+				continue
+			try:
+				os.remove(fn)
+				total -= size
+			except OSError:
+				pass
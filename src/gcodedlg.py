@@ -1,6 +1,17 @@
 import os
+import threading
+import logging
 import wx
 import box
+import gcodegen
+import gcodecache
+import gcodefile
+import exporter
+import validate
+import sender
+import postproc
+
+log = logging.getLogger(__name__)
 
 DEPTHFORMAT = "%8.2f"
 RATEFORMAT = "%8.2f"
@@ -9,15 +20,23 @@ BUTTONDIM = (56, 56)
 BTNSPACING = 10
 
 VISIBLEQUEUESIZE = 21
+GAUGERANGE = 1000
 
 class GCodeDlg(wx.Dialog):
-	def __init__(self, parent, bx, toolrad, images, settings):
+	def __init__(self, parent, images, settings):
+		# the dialog is modeless so the preview stays usable while a program is
+		# generated; the box and tool radius are always read from the parent
 		self.parent = parent
-		self.bx = bx
-		self.toolrad = toolrad
 		self.settings = settings
+		self.cache = gcodecache.GCodeCache(settings.gcodeCacheDirectory, settings.gcodeCacheSize * 1024 * 1024)
+		self.worker = None
+		self.cancelEvent = threading.Event()
+		self.sendAfter = False
+		self.sender = None
+		self.lastProgress = -1
 		wx.Dialog.__init__(self, parent, wx.ID_ANY, "Generate G Code")
 		self.SetBackgroundColour("white")
+		self.Bind(wx.EVT_CLOSE, self.doExit)
 		
 		self.depthPerCut = 1.0
 		self.feedG1XY = 50.0
@@ -27,8 +46,6 @@ class GCodeDlg(wx.Dialog):
 		self.safeZ = 1.0
 		self.extraDepth = 0.5
 		self.sigDigits = 4
-		self.offsetX = 0
-		self.offsetY = 0
 		
 		self.images = images
 		
@@ -62,7 +79,16 @@ class GCodeDlg(wx.Dialog):
 		staticboxsizer.AddSpacer(10)
 		staticboxsizer.Add(self.rbBack, 1, wx.LEFT, 10)
 		staticboxsizer.AddSpacer(10)
+		self.rbDivider = wx.RadioButton(self, wx.ID_ANY, " Divider " )
+		self.chDivider = wx.Choice(self, wx.ID_ANY, choices=[])
+		hb = wx.BoxSizer(wx.HORIZONTAL)
+		hb.Add(self.rbDivider, 0, wx.TOP, 3)
+		hb.AddSpacer(5)
+		hb.Add(self.chDivider)
+		staticboxsizer.Add(hb, 1, wx.LEFT, 10)
+		staticboxsizer.AddSpacer(10)
 		self.rbTop.SetValue(True)
+		self.updateDividers()
 		
 		vsizer.Add(staticboxsizer)
 		vsizer.AddSpacer(20)
@@ -255,6 +281,42 @@ class GCodeDlg(wx.Dialog):
 		vsizer.Add(staticboxsizer)
 		vsizer.AddSpacer(20)
 		
+		self.cbKerf = wx.CheckBox(self, wx.ID_ANY, "Offset DXF/SVG by Tool Radius")
+		self.cbKerf.SetValue(False)
+		vsizer.Add(self.cbKerf)
+		vsizer.AddSpacer(20)
+		
+		sbox = wx.StaticBox(self, -1, "Controller")
+		staticboxsizer = wx.StaticBoxSizer(sbox, wx.VERTICAL)
+		
+		t = wx.StaticText(self, wx.ID_ANY, "Type: ", size=(80, -1))
+		self.chPost = wx.Choice(self, wx.ID_ANY, size=(120, -1), choices=postproc.postNames)
+		if self.settings.postProcessor in postproc.postNames:
+			self.chPost.SetSelection(postproc.postNames.index(self.settings.postProcessor))
+		else:
+			self.chPost.SetSelection(0)
+		hb = wx.BoxSizer(wx.HORIZONTAL)
+		hb.Add(t, 1, wx.TOP, 5)
+		hb.Add(self.chPost)
+		staticboxsizer.Add(hb, 1, wx.LEFT|wx.RIGHT|wx.TOP, 10)
+		
+		t = wx.StaticText(self, wx.ID_ANY, "Port: ", size=(80, -1))
+		self.tcPort = wx.TextCtrl(self, wx.ID_ANY, self.settings.serialPort, size=(120, -1))
+		hb = wx.BoxSizer(wx.HORIZONTAL)
+		hb.Add(t, 1, wx.TOP, 5)
+		hb.Add(self.tcPort)
+		staticboxsizer.Add(hb, 1, wx.LEFT|wx.RIGHT|wx.TOP, 10)
+		
+		t = wx.StaticText(self, wx.ID_ANY, "Baud Rate: ", size=(80, -1))
+		self.tcBaud = wx.TextCtrl(self, wx.ID_ANY, "%d" % self.settings.baudRate, size=(120, -1), style=wx.TE_RIGHT)
+		hb = wx.BoxSizer(wx.HORIZONTAL)
+		hb.Add(t, 1, wx.TOP, 5)
+		hb.Add(self.tcBaud)
+		staticboxsizer.Add(hb, 1, wx.ALL, 10)
+		
+		vsizer.Add(staticboxsizer)
+		vsizer.AddSpacer(20)
+		
 		hsizer.Add(vsizer)
 		hsizer.AddSpacer(20)
 		
@@ -268,6 +330,28 @@ class GCodeDlg(wx.Dialog):
 		btnsizer.Add(self.bGCode, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
 		self.Bind(wx.EVT_BUTTON, self.doGCode, self.bGCode)
 
+		self.bSend = wx.BitmapButton(self, wx.ID_ANY, self.images.pngSend, size=BUTTONDIM)
+		self.bSend.SetToolTip("Generate G Code and stream it to the controller")
+		btnsizer.Add(self.bSend, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
+		self.Bind(wx.EVT_BUTTON, self.doSend, self.bSend)
+
+		self.bPause = wx.BitmapButton(self, wx.ID_ANY, self.images.pngPause, size=BUTTONDIM)
+		self.bPause.SetToolTip("Pause/resume streaming (feed hold)")
+		btnsizer.Add(self.bPause, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
+		self.Bind(wx.EVT_BUTTON, self.doPause, self.bPause)
+		self.bPause.Enable(False)
+
+		self.bVector = wx.BitmapButton(self, wx.ID_ANY, self.images.pngVector, size=BUTTONDIM)
+		self.bVector.SetToolTip("Export face outline as DXF or SVG")
+		btnsizer.Add(self.bVector, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
+		self.Bind(wx.EVT_BUTTON, self.doVector, self.bVector)
+
+		self.bCancel = wx.BitmapButton(self, wx.ID_ANY, self.images.pngCancel, size=BUTTONDIM)
+		self.bCancel.SetToolTip("Cancel G Code generation or streaming")
+		btnsizer.Add(self.bCancel, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
+		self.Bind(wx.EVT_BUTTON, self.doCancel, self.bCancel)
+		self.bCancel.Enable(False)
+
 		self.bExit = wx.BitmapButton(self, wx.ID_ANY, self.images.pngExit, size=BUTTONDIM)
 		self.bExit.SetToolTip("Dismiss dialog")
 		btnsizer.Add(self.bExit, 1, wx.LEFT + wx.RIGHT, BTNSPACING)
@@ -277,11 +361,29 @@ class GCodeDlg(wx.Dialog):
 		
 		dsizer.AddSpacer(10)
 		
+		self.gauge = wx.Gauge(self, wx.ID_ANY, GAUGERANGE, size=(400, 16))
+		dsizer.Add(self.gauge, 0, wx.ALIGN_CENTER_HORIZONTAL)
+		dsizer.AddSpacer(5)
+		self.stStatus = wx.StaticText(self, wx.ID_ANY, "", size=(400, -1), style=wx.ALIGN_CENTRE_HORIZONTAL)
+		dsizer.Add(self.stStatus, 0, wx.ALIGN_CENTER_HORIZONTAL)
+		
+		dsizer.AddSpacer(10)
+		
 		self.SetSizer(dsizer)  
 		dsizer.Fit(self)
 		
 	def doExit(self, e):
-		self.EndModal(wx.ID_OK)
+		if self.worker is not None:
+			self.cancelEvent.set()
+			self.worker.join()
+			self.worker = None
+		self.parent.gcodeDlgClosed()
+		self.Destroy()
+		
+	def doCancel(self, e):
+		if self.worker is not None:
+			self.cancelEvent.set()
+			self.stStatus.SetLabel("Cancelling...")
 		
 	def onTextG0XY(self, e):
 		d = self.tcG0XY.GetValue()
@@ -399,147 +501,327 @@ class GCodeDlg(wx.Dialog):
 		self.tcG1XY.Enable(f)
 		self.tcG1Z.Enable(f)
 		
-	def doGCode(self, e):
-		gcode = []
-		ft = box.FACE_TOP
-		if self.rbTop.GetValue():
-			ft = box.FACE_TOP
+	def getGenerator(self):
+		gen = gcodegen.GCodeGenerator()
+		gen.depthPerCut = self.depthPerCut
+		gen.feedG1XY = self.feedG1XY
+		gen.feedG1Z = self.feedG1Z
+		gen.feedG0XY = self.feedG0XY
+		gen.feedG0Z = self.feedG0Z
+		gen.safeZ = self.safeZ
+		gen.extraDepth = self.extraDepth
+		gen.sigDigits = self.sigDigits
+
+		if self.rbUL.GetValue():
+			gen.origin = gcodegen.ORIGIN_UL
+		elif self.rbUR.GetValue():
+			gen.origin = gcodegen.ORIGIN_UR
+		elif self.rbLL.GetValue():
+			gen.origin = gcodegen.ORIGIN_LL
+		elif self.rbLR.GetValue():
+			gen.origin = gcodegen.ORIGIN_LR
+		else:
+			gen.origin = gcodegen.ORIGIN_CENTER
+
+		gen.insideCW = not self.rbICCW.GetValue()
+		gen.outsideCW = not self.rbOCCW.GetValue()
+		gen.metric = not self.rbImperial.GetValue()
+		gen.addSpeed = self.cbFeed.GetValue()
+		gen.post = self.chPost.GetStringSelection()
+		self.settings.postProcessor = gen.post
+		return gen
+		
+	def updateDividers(self):
+		dividers = [self.parent.bx.panelName(p) for p in self.parent.bx.panelTypes() if p not in box.faceTypes]
+		self.chDivider.SetItems(dividers)
+		if len(dividers) > 0:
+			self.chDivider.SetSelection(0)
+		elif self.rbDivider.GetValue():
+			self.rbTop.SetValue(True)
+		self.rbDivider.Enable(len(dividers) > 0)
+		self.chDivider.Enable(len(dividers) > 0)
+		
+	def getFace(self):
+		if self.rbDivider.GetValue() and self.chDivider.GetSelection() != wx.NOT_FOUND:
+			return len(box.faceTypes) + self.chDivider.GetSelection()
 		elif self.rbBottom.GetValue():
-			ft = box.FACE_BOTTOM
+			return box.FACE_BOTTOM
 		elif self.rbLeft.GetValue():
-			ft = box.FACE_LEFT
+			return box.FACE_LEFT
 		elif self.rbRight.GetValue():
-			ft = box.FACE_RIGHT
+			return box.FACE_RIGHT
 		elif self.rbFront.GetValue():
-			ft = box.FACE_FRONT
+			return box.FACE_FRONT
 		elif self.rbBack.GetValue():
-			ft = box.FACE_BACK
-			
-		self.offsetX = 0
-		self.offsetY = 0
+			return box.FACE_BACK
+		return box.FACE_TOP
 		
-		fw, fh = self.bx.getFaceDim(ft)
-		dx = fw / 2.0
-		dy = fh / 2.0
+	def doGCode(self, e):
+		if self.worker is not None:
+			return
+		self.sendAfter = False
+		self.startGeneration()
 		
-		if self.rbUL.GetValue():
-			self.offsetX = dx
-			self.offsetY = -dy
+	def doSend(self, e):
+		if self.worker is not None:
+			return
+		self.sendAfter = True
+		self.startGeneration()
 		
-		elif self.rbUR.GetValue():
-			self.offsetX = -dx
-			self.offsetY = -dy
+	def startGeneration(self):
+		ft = self.getFace()
+		gen = self.getGenerator()
+		toolrad = self.parent.toolrad
+		state = self.parent.bx.getState()
 		
-		elif self.rbLL.GetValue():
-			self.offsetX = dx
-			self.offsetY = dy
-			
-		elif self.rbLR.GetValue():
-			self.offsetX = -dx
-			self.offsetY = dy
+		problems = validate.errors(validate.validatePanel(self.parent.bx, ft, toolrad))
+		if len(problems) > 0:
+			dlg = wx.MessageDialog(self,
+				"%s has %d problem(s), e.g.\n%s\n\nGenerate G Code anyway?" % (self.parent.bx.panelName(ft), len(problems), str(problems[0])),
+				'Panel Problems', wx.YES_NO | wx.NO_DEFAULT | wx.ICON_WARNING)
+			rc = dlg.ShowModal()
+			dlg.Destroy()
+			if rc != wx.ID_YES:
+				return
+		
+		key = gcodecache.generationKey(state, ft, toolrad, gen.getSettings())
+		if self.cache.get(key) is not None:
+			log.info("using cached G Code %s", key)
+			self.programReady(None, key)
+			return
+		
+		# generate from a private copy of the box so that edits made in the main
+		# window while this runs do not affect the program
+		snapshot = box.fromState(state, toolrad)
+		self.cancelEvent.clear()
+		self.lastProgress = -1
+		self.gauge.SetValue(0)
+		self.stStatus.SetLabel("Generating G Code...")
+		self.bGCode.Enable(False)
+		self.bSend.Enable(False)
+		self.bCancel.Enable(True)
+		self.worker = threading.Thread(target=self.generateWorker, args=(gen, snapshot, ft, toolrad, key))
+		self.worker.daemon = True
+		self.worker.start()
+		
+	def generateWorker(self, gen, bx, ft, toolrad, key):
+		try:
+			gcode = gen.generate(bx, ft, toolrad, self.reportProgress, self.cancelEvent)
+			cached = self.cache.put(key, gcode)
+		except gcodegen.GenerationCancelled:
+			wx.CallAfter(self.generationDone, None, None)
+			return
+		except Exception as e:
+			log.exception("G Code generation failed")
+			wx.CallAfter(self.generationDone, None, None, str(e))
+			return
+		
+		if cached is not None:
+			wx.CallAfter(self.generationDone, None, key)
+		else:
+			wx.CallAfter(self.generationDone, gcode, None)
 			
-		icw = True
-		if self.rbICCW.GetValue():
-			icw = False
+	def reportProgress(self, stage, done, total):
+		# called on the worker thread; only pass on changes the gauge can show
+		v = int(GAUGERANGE * done / total)
+		if v != self.lastProgress:
+			self.lastProgress = v
+			wx.CallAfter(self.showProgress, stage, done, total, v)
 			
-		ocw = True
-		if self.rbOCCW.GetValue():
-			ocw = False
+	def showProgress(self, stage, done, total, v):
+		if not self:
+			return
+		self.gauge.SetValue(v)
+		if not self.cancelEvent.is_set():
+			self.stStatus.SetLabel("Generating %s (%d of %d)" % (stage, done, total))
+		
+	def generationDone(self, gcode, key, msg=None):
+		if not self:
+			return
+		
+		if self.worker is not None:
+			self.worker.join()
+		self.worker = None
+		self.bGCode.Enable(True)
+		self.bSend.Enable(True)
+		self.bCancel.Enable(False)
+		if msg is not None:
+			self.gauge.SetValue(0)
+			self.stStatus.SetLabel("G Code generation failed")
+			dlg = wx.MessageDialog(self, msg, 'G Code Error', wx.OK | wx.ICON_ERROR)
+			dlg.ShowModal()
+			dlg.Destroy()
+			return
+		if gcode is None and key is None:
+			self.gauge.SetValue(0)
+			self.stStatus.SetLabel("G Code generation cancelled")
+			return
+		
+		self.gauge.SetValue(GAUGERANGE)
+		self.stStatus.SetLabel("G Code generation complete")
+		self.programReady(gcode, key)
+		
+	def programReady(self, gcode, key):
+		if not self.sendAfter:
+			self.saveGCodeFile(gcode, key)
+			return
+		
+		if key is not None:
+			# the entry can be evicted, or be unreadable, by the time it is wanted
+			try:
+				lines = self.cache.read(key)
+				gcode = None if lines is None else list(lines)
+			except (OSError, EOFError, gcodefile.GCodeFileError) as e:
+				log.warning("Unable to read G Code cache entry %s: %s", key, str(e))
+				gcode = None
+			if gcode is None:
+				self.stStatus.SetLabel("Cached G Code is gone")
+				dlg = wx.MessageDialog(self,
+					"The generated G Code is no longer in the cache.\nPlease generate it again.",
+					'Error',
+					wx.OK | wx.ICON_ERROR
+					)
+				dlg.ShowModal()
+				dlg.Destroy()
+				return
+		self.startStream(gcode)
+		
+	def startStream(self, gcode):
+		try:
+			baud = int(self.tcBaud.GetValue())
+			port = sender.openPort(self.tcPort.GetValue().strip(), baud)
+		except (ValueError, sender.SenderError) as e:
+			dlg = wx.MessageDialog(self,
+				"Unable to open controller port:\n%s" % str(e),
+				'Error',
+				wx.OK | wx.ICON_ERROR
+				)
+			dlg.ShowModal()
+			dlg.Destroy()
+			return
+		
+		self.settings.serialPort = self.tcPort.GetValue().strip()
+		self.settings.baudRate = baud
+		self.sender = sender.Sender(port)
+		self.cancelEvent.clear()
+		self.lastProgress = -1
+		self.gauge.SetValue(0)
+		self.stStatus.SetLabel("Connecting to controller...")
+		self.bGCode.Enable(False)
+		self.bSend.Enable(False)
+		self.bPause.Enable(True)
+		self.bCancel.Enable(True)
+		self.worker = threading.Thread(target=self.streamWorker, args=(port, gcode))
+		self.worker.daemon = True
+		self.worker.start()
+		
+	def streamWorker(self, port, gcode):
+		msg = None
+		try:
+			if self.sender.wakeUp() is None:
+				log.warning("no banner from controller; streaming anyway")
+			self.sender.stream(gcode, self.reportStream, self.cancelEvent)
+		except (OSError, sender.SenderError) as e:
+			msg = str(e)
+		finally:
+			port.close()
+		wx.CallAfter(self.streamDone, msg)
+		
+	def reportStream(self, sent, acked, total):
+		# called on the worker thread
+		v = int(GAUGERANGE * acked / total)
+		if v != self.lastProgress:
+			self.lastProgress = v
+			wx.CallAfter(self.showStream, sent, acked, total, v)
 			
-		if self.rbImperial.GetValue():
-			gcode.append("G20")
+	def showStream(self, sent, acked, total, v):
+		if not self or self.sender is None:
+			return
+		self.gauge.SetValue(v)
+		if not self.cancelEvent.is_set():
+			self.stStatus.SetLabel("%s line %d of %d (%d in controller buffer)" % ("Paused at" if self.sender.isPaused() else "Sent", acked, total, sent - acked))
+		
+	def doPause(self, e):
+		if self.sender is None:
+			return
+		if self.sender.isPaused():
+			self.sender.resume()
+			self.stStatus.SetLabel("Resuming...")
 		else:
-			gcode.append("G21")
-	
-		self.fmt = "%0." + str(self.sigDigits) + "f"
-		self.addSpeed = self.cbFeed.GetValue()
-				
-		pts, crc, rct = self.bx.render(ft, self.toolrad)
-		totalDepth = self.bx.Wall
-		
-		gcode.append(("G0 Z" + self.fmt + self.addSpeedTerm("G0Z")) % self.safeZ)
-			
-		steps = []
-		d = self.depthPerCut
-		while totalDepth - d > 0.0001: 
-			print("appending for depth %f" % -d)
-			steps.append(-d)
-			d += self.depthPerCut
-		steps.append(-(totalDepth + self.extraDepth))
-		print("append final depth %f" % -(totalDepth + self.extraDepth))
-		
-		if icw:
-			cmd = "G2"
+			self.sender.pause()
+			self.stStatus.SetLabel("Feed hold")
+		
+	def streamDone(self, msg):
+		if not self:
+			return
+		
+		if self.worker is not None:
+			self.worker.join()
+		self.worker = None
+		self.bGCode.Enable(True)
+		self.bSend.Enable(True)
+		self.bPause.Enable(False)
+		self.bCancel.Enable(False)
+		if msg is not None:
+			self.stStatus.SetLabel("Streaming failed")
+			dlg = wx.MessageDialog(self, msg, 'Controller Error', wx.OK | wx.ICON_ERROR)
+			dlg.ShowModal()
+			dlg.Destroy()
+		elif self.cancelEvent.is_set():
+			self.stStatus.SetLabel("Streaming cancelled - controller reset")
 		else:
-			cmd = "G3"
-
-		if len(crc) > 0:
-			gcode.append("; circles")		
-		for c in crc:
-			crad = c[1] - self.toolrad
-			gcode.append(("; New circle - center (" + self.fmt + "," + self.fmt + ") radius " + self.fmt + "(" + self.fmt +")")
-						 % (self.normalX(c[0][0]), self.normalY(c[0][1]), c[1], crad))
-			gcode.append(("G0 X" + self.fmt + " Y" + self.fmt + self.addSpeedTerm("G0XY")) 
-						% (self.normalX(c[0][0]), self.normalY(c[0][1] - crad)))
-			for p in steps:
-				gcode.append(("G1 Z" + self.fmt + self.addSpeedTerm("G1Z")) % p)
-				gcode.append((cmd+" J" + self.fmt + " X" + self.fmt + " Y" + self.fmt + self.addSpeedTerm("G1XY"))
-						% (crad, self.normalX(c[0][0]), self.normalY(c[0][1]) - crad))
-			
-			gcode.append(("G0 Z" + self.fmt + self.addSpeedTerm("G0Z")) % self.safeZ)
-			
-		if len(rct) > 0:
-			gcode.append("; rectangles")
-		for r in rct:
-			dx = r[1]/2.0 - self.toolrad
-			dy = r[2]/2.0 - self.toolrad
-			cx = r[0][0]
-			cy = r[0][1]
-			gcode.append(("; New rectangle - center (" + self.fmt + "," + self.fmt + ") width " + self.fmt + "(" + self.fmt +") height " + self.fmt + "(" + self.fmt +")")
-						% (self.normalX(cx), self.normalY(cy), r[1], r[1]-2*self.toolrad, r[2], r[2]-2*self.toolrad))	
-			if icw:
-				rpts = [ [-dx, dy], [dx, dy], [dx, -dy], [-dx, -dy] ]
-			else:
-				rpts = [ [dx, -dy], [dx, dy], [-dx, dy], [-dx, -dy] ]
+			self.gauge.SetValue(GAUGERANGE)
+			self.stStatus.SetLabel(self.sender.summary())
+			for n, err in self.sender.errors:
+				log.warning("line %d: %s", n+1, err)
+		self.sender = None
+		
+	def doVector(self, e):
+		ft = self.getFace()
+		wildcardSave = "DXF file(*.dxf)|*.dxf|SVG file(*.svg)|*.svg"
 
-			gcode.append(("G0 X" + self.fmt + " Y" + self.fmt + self.addSpeedTerm("G0XY")) 
-						% (self.normalX(cx-dx), self.normalY(cy-dy)))
-			for p in steps:
-				gcode.append(("G1 Z" + self.fmt + self.addSpeedTerm("G1Z")) % p)
-				for rp in rpts:
-					gcode.append(("G1 X" + self.fmt + " Y" + self.fmt + self.addSpeedTerm("G1XY")) 
-								% (self.normalX(cx+rp[0]), self.normalY(cy+rp[1])))
+		dlg = wx.FileDialog(
+			self, message="Export face as ...", defaultDir=self.settings.gcodeDirectory, 
+			defaultFile="", wildcard=wildcardSave, style=wx.FD_SAVE + wx.FD_OVERWRITE_PROMPT
+			)
+		path = None
+		if dlg.ShowModal() == wx.ID_OK:
+			path = dlg.GetPath()
+			self.settings.gcodeDirectory = os.path.dirname(path)
 
-			gcode.append(("G0 Z" + self.fmt + self.addSpeedTerm("G0Z")) % self.safeZ)
-			
-		gcode.append("; perimeter")
-		if ocw:
-			data = pts
-		else:
-			data = pts[::-1]
-			
-		gcode.append(("G0 X" + self.fmt + " Y" + self.fmt + self.addSpeedTerm("G0XY")) 
-					% (self.normalX(data[0][0]), self.normalY(data[0][1])))
-		
-		for i in range(len(steps)):
-			p = steps[i]
-			gcode.append(("; layer at depth "+DEPTHFORMAT) % p)
-			pts = self.bx.render(ft, self.toolrad, i >= (len(steps)-2))[0]
-			if ocw:
-				data = pts
-			else:
-				data = pts[::-1]
+		dlg.Destroy()
+		
+		if path is None:
+			return
+		
+		kerf = 0.0
+		if self.cbKerf.GetValue():
+			kerf = self.parent.toolrad
 
-			gcode.append(("G1 Z" + self.fmt + self.addSpeedTerm("G1Z")) % p)
-			for d in range(1, len(data)):
-				gcode.append(("G1 X" + self.fmt + " Y" + self.fmt + self.addSpeedTerm("G1XY")) 
-						% (self.normalX(data[d][0]), self.normalY(data[d][1])))
+		try:
+			exporter.exportFaces(self.parent.bx, path, [ft], kerf, metric=not self.rbImperial.GetValue())
+		except (OSError, gcodefile.GCodeFileError) as e:
+			dlg = wx.MessageDialog(self,
+				"Unable to write file: %s\n%s" % (path, str(e)),
+				'Error',
+				wx.OK | wx.ICON_ERROR
+				)
+			dlg.ShowModal()
+			dlg.Destroy()
+			return
 
-		gcode.append(("G0 Z" + self.fmt + self.addSpeedTerm("G0Z")) % self.safeZ)
-		self.saveGCodeFile(gcode)
+		dlg = wx.MessageDialog(self,
+			"File: %s" % path,
+			'Face Exported',
+			wx.OK | wx.ICON_INFORMATION
+			)
+		dlg.ShowModal()
+		dlg.Destroy()
 		
-	def saveGCodeFile(self, gcode):
-		wildcardSave = "G Code file(*.nc)|*.nc" 
+	def saveGCodeFile(self, gcode, cacheKey=None):
+		wildcardSave = "G Code file(*.nc)|*.nc|Compressed G Code file(*.nc.gz)|*.nc.gz"
+		if gcodefile.zstandard is not None:
+			wildcardSave += "|Zstd compressed G Code file(*.nc.zst)|*.nc.zst"
 
 		dlg = wx.FileDialog(
 			self, message="Save file as ...", defaultDir=self.settings.gcodeDirectory, 
@@ -555,22 +837,23 @@ class GCodeDlg(wx.Dialog):
 		if path is None:
 			return
 
+		compression = gcodefile.compressionFor(path)
 		try:
-			fp = open(path, "w")
-		except:
+			if cacheKey is not None:
+				if not self.cache.copyTo(cacheKey, path, compression):
+					raise gcodefile.GCodeFileError("cache entry %s is missing" % cacheKey)
+			else:
+				gcodefile.writeGCode(path, gcode, compression)
+		except (OSError, gcodefile.GCodeFileError) as e:
 			dlg = wx.MessageDialog(self,
-				"Unable to open file: " + path,
+				"Unable to write file: %s\n%s" % (path, str(e)),
 				'Error',
 				wx.OK | wx.ICON_ERROR
 				)
 			dlg.ShowModal()
 			dlg.Destroy()
 			return
-		
-		for g in gcode:
-			fp.write("%s\n" % g)
-		
-		fp.close()
+
 		dlg = wx.MessageDialog(self,
 			"File: %s" % path,
 			'G-Code Saved',
@@ -578,24 +861,3 @@ class GCodeDlg(wx.Dialog):
 			)
 		dlg.ShowModal()
 		dlg.Destroy()
-			
-	def normalX(self, x):
-		return x+self.offsetX
-	
-	def normalY(self, y):
-		return y+self.offsetY
-			
-	def addSpeedTerm(self, stype):
-		if not self.addSpeed:
-			return ""
-		
-		if stype == "G0XY":
-			return " F"+self.fmt % self.feedG0XY
-		if stype == "G0Z":
-			return " F"+self.fmt % self.feedG0Z
-		if stype == "G1XY":
-			return " F"+self.fmt % self.feedG1XY
-		if stype == "G1Z":
-			return " F"+self.fmt % self.feedG1Z
-		
-		return ""
@@ -0,0 +1,144 @@
+import os
+import sys
+import gzip
+import shutil
+
+import metrics
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+BUFSIZE = 1024 * 1024
+CHUNKLINES = 8192
+
+COMPRESS_NONE = None
+COMPRESS_GZIP = "gzip"
+COMPRESS_ZSTD = "zstd"
+
+GZIPMAGIC = b"\x1f\x8b"
+ZSTDMAGIC = b"\x28\xb5\x2f\xfd"
+
+class GCodeFileError(Exception):
+	pass
+
+def compressionFor(path):
+	p = path.lower()
+	if p.endswith(".gz"):
+		return COMPRESS_GZIP
+	if p.endswith(".zst") or p.endswith(".zstd"):
+		return COMPRESS_ZSTD
+	return COMPRESS_NONE
+
+class GCodeWriter:
+	def __init__(self, path, compression=COMPRESS_NONE):
+		if compression == COMPRESS_ZSTD and zstandard is None:
+			raise GCodeFileError("zstd compression requires the zstandard package")
+		if compression not in [COMPRESS_NONE, COMPRESS_GZIP, COMPRESS_ZSTD]:
+			raise GCodeFileError("unknown compression: %s" % compression)
+
+		self.path = path
+		self.tmpPath = "%s.%d.tmp" % (path, os.getpid())
+		self.raw = open(self.tmpPath, "wb", buffering=BUFSIZE)
+		if compression == COMPRESS_GZIP:
+			self.stream = gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=6, mtime=0)
+		elif compression == COMPRESS_ZSTD:
+			self.stream = zstandard.ZstdCompressor().stream_writer(self.raw, closefd=False)
+		else:
+			self.stream = self.raw
+		self.lines = 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc, val, tb):
+		if exc is None:
+			self.close()
+		else:
+			self.abort()
+		return False
+
+	def write(self, line):
+		self.stream.write(line.encode("utf-8") + b"\n")
+		self.lines += 1
+
+	def writeLines(self, lines):
+		for i in range(0, len(lines), CHUNKLINES):
+			chunk = lines[i:i+CHUNKLINES]
+			self.stream.write(("\n".join(chunk) + "\n").encode("utf-8"))
+			self.lines += len(chunk)
+
+	def close(self):
+		try:
+			if self.stream is not self.raw:
+				self.stream.close()
+			self.raw.flush()
+			os.fsync(self.raw.fileno())
+			self.raw.close()
+			os.replace(self.tmpPath, self.path)
+		except:
+			self.abort()
+			raise
+
+	def abort(self):
+		try:
+			self.raw.close()
+		except OSError:
+			pass
+		try:
+			os.remove(self.tmpPath)
+		except OSError:
+			pass
+
+def writeGCode(path, gcode, compression=COMPRESS_NONE):
+	with GCodeWriter(path, compression) as w:
+		w.writeLines(gcode)
+	return w.lines
+
+def fileCompression(path):
+	with open(path, "rb") as fp:
+		magic = fp.read(4)
+	if magic.startswith(GZIPMAGIC):
+		return COMPRESS_GZIP
+	if magic == ZSTDMAGIC:
+		return COMPRESS_ZSTD
+	return COMPRESS_NONE
+
+def openGCode(path):
+	compression = fileCompression(path)
+	if compression == COMPRESS_GZIP:
+		return gzip.open(path, "rt", encoding="utf-8")
+	if compression == COMPRESS_ZSTD:
+		if zstandard is None:
+			raise GCodeFileError("%s: zstd compressed file requires the zstandard package" % path)
+		return zstandard.open(path, "rt", encoding="utf-8")
+	return open(path, "r", encoding="utf-8", buffering=BUFSIZE)
+
+def readGCode(path):
+	with openGCode(path) as fp:
+		for l in fp:
+			yield l.rstrip("\r\n")
+
+def copyGCode(src, dest, compression=COMPRESS_NONE):
+	if compression == COMPRESS_NONE and fileCompression(src) == COMPRESS_NONE:
+		tmpPath = "%s.%d.tmp" % (dest, os.getpid())
+		try:
+			shutil.copyfile(src, tmpPath)
+			os.replace(tmpPath, dest)
+		except:
+			try:
+				os.remove(tmpPath)
+			except OSError:
+				pass
+			raise
+		return dest
+
+	with GCodeWriter(dest, compression) as w:
+		with openGCode(src) as fp:
+			for b in iter(lambda: fp.read(BUFSIZE), ""):
+				w.stream.write(b.encode("utf-8"))
+	return dest
+
+metrics.instrument(sys.modules[__name__], "writeGCode", "file.write")
+metrics.instrument(sys.modules[__name__], "copyGCode", "file.copy")
@@ -0,0 +1,271 @@
+import math
+import logging
+
+import toolpath
+import postproc
+import metrics
+
+log = logging.getLogger(__name__)
+
+ORIGIN_UL = 0
+ORIGIN_UR = 1
+ORIGIN_CENTER = 2
+ORIGIN_LL = 3
+ORIGIN_LR = 4
+
+originTypes = [ORIGIN_UL, ORIGIN_UR, ORIGIN_CENTER, ORIGIN_LL, ORIGIN_LR]
+
+class GenerationCancelled(Exception):
+	pass
+
+SETTINGS = ["depthPerCut", "feedG1XY", "feedG1Z", "feedG0XY", "feedG0Z", "safeZ", "extraDepth",
+		"sigDigits", "origin", "insideCW", "outsideCW", "metric", "addSpeed", "post"]
+
+# settings that must be numbers greater than zero, any number, or true/false
+POSITIVESETTINGS = ["depthPerCut", "feedG1XY", "feedG1Z", "feedG0XY", "feedG0Z"]
+NUMBERSETTINGS = ["safeZ", "extraDepth"]
+FLAGSETTINGS = ["insideCW", "outsideCW", "metric", "addSpeed"]
+
+# more cutting layers than this means the depth per cut is far too small
+MAXLAYERS = 10000
+
+def isNumber(v):
+	return type(v) in [int, float] and math.isfinite(v)
+
+def checkSettings(s):
+	# raises ValueError for the first setting that generation cannot use
+	for n in POSITIVESETTINGS:
+		if n in s and (not isNumber(s[n]) or s[n] <= 0):
+			raise ValueError("%s must be a number greater than 0: %r" % (n, s[n]))
+	for n in NUMBERSETTINGS:
+		if n in s and not isNumber(s[n]):
+			raise ValueError("%s must be a number: %r" % (n, s[n]))
+	for n in FLAGSETTINGS:
+		if n in s and type(s[n]) is not bool:
+			raise ValueError("%s must be true or false: %r" % (n, s[n]))
+	if "sigDigits" in s and (type(s["sigDigits"]) is not int or s["sigDigits"] < 1):
+		raise ValueError("sigDigits must be a whole number of at least 1: %r" % (s["sigDigits"],))
+	if "origin" in s and s["origin"] not in originTypes:
+		raise ValueError("Unknown origin: %r" % (s["origin"],))
+	if "post" in s and s["post"] not in postproc.postNames:
+		raise ValueError("Unknown post processor: %r" % (s["post"],))
+
+class GCodeGenerator:
+	def __init__(self):
+		self.depthPerCut = 1.0
+		self.feedG1XY = 50.0
+		self.feedG1Z = 50.0
+		self.feedG0XY = 70.0
+		self.feedG0Z = 70.0
+		self.safeZ = 1.0
+		self.extraDepth = 0.5
+		self.sigDigits = 4
+		self.origin = ORIGIN_CENTER
+		self.insideCW = True
+		self.outsideCW = False
+		self.metric = True
+		self.addSpeed = True
+		self.post = postproc.DEFAULTPOST
+		self.offsetX = 0
+		self.offsetY = 0
+
+	def getSettings(self):
+		return dict([[n, getattr(self, n)] for n in SETTINGS])
+
+	def setSettings(self, s):
+		checkSettings(s)
+		for n in SETTINGS:
+			if n in s:
+				setattr(self, n, s[n])
+
+	def generate(self, bx, ft, toolrad, progress=None, cancel=None):
+		# progress, if given, is called as progress(stage, done, total) after each
+		# circle, rectangle and perimeter layer.  Setting the cancel event stops
+		# generation at the next of those points with GenerationCancelled.
+		tp = self.toolpath(bx, ft, toolrad, progress, cancel)
+		gcode = self.getPost().emit(tp)
+		if metrics.enabled:
+			metrics.count("gcode.programs")
+			metrics.count("gcode.lines", len(gcode))
+		return gcode
+
+	def getPost(self):
+		feeds = {"G0XY": self.feedG0XY, "G0Z": self.feedG0Z, "G1XY": self.feedG1XY, "G1Z": self.feedG1Z}
+		return postproc.makePost(self.post, self.sigDigits, feeds, self.addSpeed)
+
+	def toolpath(self, bx, ft, toolrad, progress=None, cancel=None):
+		tp = toolpath.Toolpath(self.metric)
+
+		self.offsetX = 0
+		self.offsetY = 0
+
+		fw, fh = bx.getFaceDim(ft)
+		dx = fw / 2.0
+		dy = fh / 2.0
+
+		if self.origin == ORIGIN_UL:
+			self.offsetX = dx
+			self.offsetY = -dy
+
+		elif self.origin == ORIGIN_UR:
+			self.offsetX = -dx
+			self.offsetY = -dy
+
+		elif self.origin == ORIGIN_LL:
+			self.offsetX = dx
+			self.offsetY = dy
+
+		elif self.origin == ORIGIN_LR:
+			self.offsetX = -dx
+			self.offsetY = dy
+
+		icw = self.insideCW
+		ocw = self.outsideCW
+
+		pts, crc, rct = bx.render(ft, toolrad)
+		totalDepth = bx.Wall
+
+		tp.rapidZ(self.safeZ)
+
+		if (totalDepth - 0.0001) / self.depthPerCut > MAXLAYERS:
+			raise ValueError("depth per cut %g needs more than %d layers" % (self.depthPerCut, MAXLAYERS))
+		steps = []
+		d = self.depthPerCut
+		while totalDepth - d > 0.0001:
+			log.debug("appending for depth %f", -d)
+			steps.append(-d)
+			d += self.depthPerCut
+		steps.append(-(totalDepth + self.extraDepth))
+		log.debug("append final depth %f", -(totalDepth + self.extraDepth))
+
+		total = len(crc) + len(rct) + len(steps)
+		done = 0
+
+		if len(crc) > 0:
+			tp.comment(toolpath.NOTE_SECTION, "circles")
+		for c in crc:
+			crad = c[1] - toolrad
+			tp.comment(toolpath.NOTE_CIRCLE, self.normalX(c[0][0]), self.normalY(c[0][1]), c[1], crad)
+			tp.rapidXY(self.normalX(c[0][0]), self.normalY(c[0][1] - crad))
+			for p in steps:
+				tp.feedZ(p)
+				tp.arc(icw, self.normalX(c[0][0]), self.normalY(c[0][1]) - crad, 0, crad)
+
+			tp.rapidZ(self.safeZ)
+			done += 1
+			self.checkpoint(progress, cancel, "circles", done, total)
+
+		if len(rct) > 0:
+			tp.comment(toolpath.NOTE_SECTION, "rectangles")
+		for r in rct:
+			dx = r[1]/2.0 - toolrad
+			dy = r[2]/2.0 - toolrad
+			cx = r[0][0]
+			cy = r[0][1]
+			tp.comment(toolpath.NOTE_RECTANGLE, self.normalX(cx), self.normalY(cy), r[1], r[1]-2*toolrad, r[2], r[2]-2*toolrad)
+			if icw:
+				rpts = [ [-dx, dy], [dx, dy], [dx, -dy], [-dx, -dy] ]
+			else:
+				rpts = [ [dx, -dy], [dx, dy], [-dx, dy], [-dx, -dy] ]
+			rpts = [[cx+rp[0], cy+rp[1]] for rp in rpts]
+
+			tp.rapidXY(self.normalX(cx-dx), self.normalY(cy-dy))
+			for p in steps:
+				tp.feedZ(p)
+				tp.path(rpts, self.offsetX, self.offsetY)
+
+			tp.rapidZ(self.safeZ)
+			done += 1
+			self.checkpoint(progress, cancel, "rectangles", done, total)
+
+		tp.comment(toolpath.NOTE_SECTION, "perimeter")
+		if ocw:
+			data = pts
+		else:
+			data = pts[::-1]
+
+		tp.rapidXY(self.normalX(data[0][0]), self.normalY(data[0][1]))
+
+		for i in range(len(steps)):
+			p = steps[i]
+			tp.comment(toolpath.NOTE_LAYER, p)
+			pts = bx.render(ft, toolrad, i >= (len(steps)-2))[0]
+			if ocw:
+				data = pts
+			else:
+				data = pts[::-1]
+
+			tp.feedZ(p)
+			tp.path(data[1:], self.offsetX, self.offsetY)
+			done += 1
+			self.checkpoint(progress, cancel, "perimeter", done, total)
+
+		tp.rapidZ(self.safeZ)
+		return tp
+
+	def checkpoint(self, progress, cancel, stage, done, total):
+		if cancel is not None and cancel.is_set():
+			raise GenerationCancelled(stage)
+		if progress is not None:
+			progress(stage, done, total)
+
+	def normalX(self, x):
+		return x+self.offsetX
+
+	def normalY(self, y):
+		return y+self.offsetY
+
+	def estimateTime(self, gcode):
+		# seconds to run the program, assuming every move reaches its programmed feed rate
+		x = y = z = 0.0
+		t = 0.0
+		modalFeed = None
+		for l in gcode:
+			if l.startswith(";") or l.startswith("(") or l == "":
+				continue
+			words = l.split()
+			cmd = words[0]
+			if cmd not in ["G0", "G1", "G2", "G3"]:
+				continue
+			nx, ny, nz = x, y, z
+			i = j = 0.0
+			feed = None
+			for w in words[1:]:
+				v = float(w[1:])
+				if w[0] == "X":
+					nx = v
+				elif w[0] == "Y":
+					ny = v
+				elif w[0] == "Z":
+					nz = v
+				elif w[0] == "I":
+					i = v
+				elif w[0] == "J":
+					j = v
+				elif w[0] == "F":
+					feed = v
+
+			if cmd in ["G2", "G3"] and nx == x and ny == y:
+				dist = 2 * math.pi * math.hypot(i, j)
+			else:
+				dist = math.sqrt((nx-x)**2 + (ny-y)**2 + (nz-z)**2)
+
+			if feed is not None and cmd != "G0":
+				modalFeed = feed
+			elif feed is None and cmd != "G0" and modalFeed is not None:
+				feed = modalFeed
+			if feed is None:
+				xy = nx != x or ny != y
+				if cmd == "G0":
+					feed = self.feedG0XY if xy else self.feedG0Z
+				else:
+					feed = self.feedG1XY if xy else self.feedG1Z
+
+			if feed > 0:
+				t += dist / feed * 60.0
+			x, y, z = nx, ny, nz
+
+		return t
+
+metrics.instrument(GCodeGenerator, "generate", "gcode.generate")
+metrics.instrument(GCodeGenerator, "toolpath", "gcode.toolpath")
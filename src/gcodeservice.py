@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import box
+import boxfile
+import gcodegen
+import gcodecache
+import validate
+import jobdaemon
+import metrics
+
+log = logging.getLogger(__name__)
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAXREQUEST = 4 * 1024 * 1024
+CHUNKLINES = 8192
+STATSCACHESIZE = 1024
+DEFAULTTOOLRAD = 1.5
+WORKERS = 2
+
+# requests are JSON objects:
+#	{"box": <box file contents>, "toolrad": 1.5, "settings": {<generator settings>},
+#	 "panels": ["top", ...]}				for POST /stats; all panels if omitted
+#	 "panel": "top"}						for POST /program
+# /stats answers with line count, size in bytes, estimated seconds and the
+# first validation problem for every panel.  /program streams the G Code for
+# one panel, with the same figures in X-CNCBox- headers.  GET /metrics returns
+# the service's timers and counters in the Prometheus text format when it was
+# started with --metrics.
+
+class RequestError(Exception):
+	pass
+
+def panelStats(bx, gen, pid, toolrad, gcode):
+	problems = validate.errors(validate.validatePanel(bx, pid, toolrad))
+	return {
+		"lines": len(gcode),
+		"bytes": sum([len(l) for l in gcode]) + len(gcode),
+		"seconds": round(gen.estimateTime(gcode), 1),
+		"problem": str(problems[0]) if len(problems) > 0 else None,
+	}
+
+def makeJob(state, toolrad, settings):
+	bx = box.fromState(boxfile.normalizeState(state), toolrad)
+	gen = gcodegen.GCodeGenerator()
+	gen.setSettings(settings)
+	return bx, gen
+
+def statsFor(state, panels, toolrad, settings):
+	# runs in a pool worker
+	bx, gen = makeJob(state, toolrad, settings)
+	result = {}
+	for pid in jobdaemon.selectPanels(bx, panels):
+		gcode = gen.generate(bx, pid, toolrad)
+		result[jobdaemon.panelFileName(bx, pid)] = panelStats(bx, gen, pid, toolrad, gcode)
+	return result
+
+def programFor(state, panel, toolrad, settings):
+	# runs in a pool worker
+	bx, gen = makeJob(state, toolrad, settings)
+	pid = jobdaemon.selectPanels(bx, [panel])[0]
+	gcode = gen.generate(bx, pid, toolrad)
+	return gcode, panelStats(bx, gen, pid, toolrad, gcode)
+
+def inWorker(fn, *args):
+	# the result, and what the worker measured while producing it
+	return fn(*args), metrics.snapshot(True) if metrics.enabled else None
+
+class GCodeService:
+	def __init__(self, workers=None):
+		self.workers = workers if workers is not None else WORKERS
+		self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=jobdaemon.warmUp)
+		self.statsCache = OrderedDict()
+		self.lock = threading.Lock()
+		# start every worker now rather than on the first requests
+		for f in [self.pool.submit(os.getpid) for i in range(self.workers)]:
+			f.result()
+
+	def parse(self, body):
+		try:
+			req = json.loads(body.decode("utf-8"))
+		except ValueError as e:
+			raise RequestError("request is not valid JSON: %s" % str(e))
+		if not isinstance(req, dict) or not isinstance(req.get("box"), dict):
+			raise RequestError("request must be an object with a box")
+		try:
+			toolrad = float(req.get("toolrad", DEFAULTTOOLRAD))
+		except (TypeError, ValueError):
+			raise RequestError("invalid toolrad")
+		settings = req.get("settings", {})
+		if not isinstance(settings, dict):
+			raise RequestError("settings must be an object")
+		panels = req.get("panels")
+		if panels is not None and (not isinstance(panels, list) or not all([isinstance(p, str) for p in panels])):
+			raise RequestError("panels must be a list of panel names")
+		if not isinstance(req.get("panel", "top"), str):
+			raise RequestError("panel must be a panel name")
+		return req, toolrad, settings
+
+	def run(self, fn, *args):
+		try:
+			result, m = self.pool.submit(inWorker, fn, *args).result()
+		except (ValueError, TypeError, jobdaemon.JobError) as e:
+			raise RequestError(str(e))
+		if m is not None:
+			metrics.merge(m)
+		return result
+
+	def stats(self, body):
+		req, toolrad, settings = self.parse(body)
+		panels = req.get("panels")
+		key = gcodecache.generationKey(req["box"], panels, toolrad, settings)
+		with self.lock:
+			if key in self.statsCache:
+				self.statsCache.move_to_end(key)
+				return self.statsCache[key]
+
+		result = self.run(statsFor, req["box"], panels, toolrad, settings)
+		with self.lock:
+			self.statsCache[key] = result
+			while len(self.statsCache) > STATSCACHESIZE:
+				self.statsCache.popitem(last=False)
+		return result
+
+	def program(self, body):
+		req, toolrad, settings = self.parse(body)
+		return self.run(programFor, req["box"], req.get("panel", "top"), toolrad, settings)
+
+	def shutdown(self):
+		self.pool.shutdown()
+
+class Handler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+
+	def log_message(self, fmt, *args):
+		if self.server.verbose:
+			BaseHTTPRequestHandler.log_message(self, fmt, *args)
+
+	def sendJSON(self, code, d):
+		data = json.dumps(d).encode("utf-8")
+		self.send_response(code)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+	def readBody(self):
+		try:
+			n = int(self.headers.get("Content-Length", "0"))
+		except ValueError:
+			n = -1
+		if n < 0 or n > MAXREQUEST:
+			raise RequestError("missing or invalid Content-Length")
+		return self.rfile.read(n)
+
+	def do_GET(self):
+		if self.path == "/health":
+			self.sendJSON(200, {"status": "ok", "workers": self.server.service.workers})
+		elif self.path == "/metrics" and metrics.enabled:
+			data = metrics.toPrometheus().encode("utf-8")
+			self.send_response(200)
+			self.send_header("Content-Type", "text/plain; version=0.0.4")
+			self.send_header("Content-Length", str(len(data)))
+			self.end_headers()
+			self.wfile.write(data)
+		else:
+			self.sendJSON(404, {"error": "unknown path %s" % self.path})
+
+	def do_POST(self):
+		start = time.time()
+		try:
+			if self.path == "/stats":
+				result = self.server.service.stats(self.readBody())
+				self.sendJSON(200, {"panels": result, "elapsed": round(time.time() - start, 4)})
+			elif self.path == "/program":
+				gcode, stats = self.server.service.program(self.readBody())
+				self.streamProgram(gcode, stats)
+			else:
+				self.readBody()
+				self.sendJSON(404, {"error": "unknown path %s" % self.path})
+		except RequestError as e:
+			self.sendJSON(400, {"error": str(e)})
+		except Exception as e:
+			log.error("Unable to handle %s: %s", self.path, str(e))
+			self.sendJSON(500, {"error": str(e)})
+
+	def streamProgram(self, gcode, stats):
+		self.send_response(200)
+		self.send_header("Content-Type", "text/plain; charset=utf-8")
+		self.send_header("Transfer-Encoding", "chunked")
+		self.send_header("X-CNCBox-Lines", str(stats["lines"]))
+		self.send_header("X-CNCBox-Bytes", str(stats["bytes"]))
+		self.send_header("X-CNCBox-Seconds", str(stats["seconds"]))
+		if stats["problem"] is not None:
+			self.send_header("X-CNCBox-Problem", stats["problem"])
+		self.end_headers()
+		for i in range(0, len(gcode), CHUNKLINES):
+			data = ("\n".join(gcode[i:i+CHUNKLINES]) + "\n").encode("utf-8")
+			self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+		self.wfile.write(b"0\r\n\r\n")
+
+def serve(host=HOST, port=PORT, workers=None, verbose=False):
+	service = GCodeService(workers)
+	server = ThreadingHTTPServer((host, port), Handler)
+	server.daemon_threads = True
+	server.service = service
+	server.verbose = verbose
+	return server
+
+if __name__ == "__main__":
+	host = HOST
+	port = PORT
+	workers = None
+	verbose = False
+	logLevel = "warning"
+	for a in sys.argv[1:]:
+		if a.startswith("--host="):
+			host = a[7:]
+		elif a.startswith("--port="):
+			port = int(a[7:])
+		elif a.startswith("--workers="):
+			workers = int(a[10:])
+		elif a == "--verbose":
+			verbose = True
+		elif a.startswith("--log="):
+			logLevel = a[6:]
+		elif a == "--metrics":
+			metrics.enable()
+		else:
+			print("usage: %s [--host=h] [--port=n] [--workers=n] [--verbose] [--log=level] [--metrics]" % sys.argv[0])
+			sys.exit(1)
+
+	metrics.setupLogging(logLevel)
+	server = serve(host, port, workers, verbose)
+	print("serving on http://%s:%d" % server.server_address)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		server.service.shutdown()
@@ -0,0 +1,555 @@
+import os
+import sys
+import time
+import math
+import select
+import socket
+import threading
+from collections import deque
+
+RXBUFFERSIZE = 128
+PLANNERSIZE = 15		# blocks in the GRBL 1.1 planner buffer
+BANNER = "Grbl 1.1h ['$' for help]"
+LINEDELAY = 0.0005		# seconds the controller takes to parse one line
+LATENCY = 0.0			# seconds before a response reaches the sender
+
+# machine defaults, roughly those of a small hobby router
+MAXRATE = 5000.0		# mm/min
+ACCEL = 500.0			# mm/s^2
+JUNCTIONDEV = 0.01		# mm
+ARCTOLERANCE = 0.002	# mm
+MINSPEED = 0.01			# mm/s
+
+class Block:
+	def __init__(self, length, unit, speed):
+		self.length = length
+		self.unit = unit
+		self.speed = speed			# nominal, mm/s
+		self.maxJunction = 0.0		# highest entry speed the corner allows
+
+class Parser:
+	# modal state and just enough of the G Code grammar for the programs this
+	# application writes: G0/G1/G2/G3, G20/G21, G90/G91, F, and XYZ/IJ words
+	def __init__(self, maxRate=MAXRATE):
+		self.maxRate = maxRate
+		self.pos = [0.0, 0.0, 0.0]
+		self.scale = 1.0
+		self.absolute = True
+		self.motion = 0
+		self.feed = 0.0
+
+	def words(self, l):
+		l = l.upper()
+		p = l.find(";")
+		if p >= 0:
+			l = l[:p]
+		out = []
+		i = 0
+		while i < len(l):
+			c = l[i]
+			if c == "(":
+				e = l.find(")", i)
+				i = len(l) if e < 0 else e + 1
+				continue
+			if c.isalpha():
+				j = i + 1
+				while j < len(l) and (l[j].isdigit() or l[j] in ".-+ "):
+					j += 1
+				try:
+					out.append([c, float(l[i+1:j].replace(" ", ""))])
+				except ValueError:
+					raise ValueError("bad number after %s" % c)
+				i = j
+				continue
+			i += 1
+		return out
+
+	def moves(self, l):
+		# the straight moves [target, rate in mm/min] a line turns into; arcs
+		# are broken into chords the way the controller does it
+		target = self.pos[:]
+		offset = [0.0, 0.0]
+		axes = False
+		for w, v in self.words(l):
+			if w == "G":
+				g = int(round(v * 10))
+				if g in [0, 10, 20, 30]:
+					self.motion = g // 10
+				elif g == 200:
+					self.scale = 25.4
+				elif g == 210:
+					self.scale = 1.0
+				elif g == 900:
+					self.absolute = True
+				elif g == 910:
+					self.absolute = False
+			elif w == "F":
+				self.feed = v * self.scale
+			elif w in "XYZ":
+				k = "XYZ".index(w)
+				target[k] = v * self.scale if self.absolute else target[k] + v * self.scale
+				axes = True
+			elif w in "IJ":
+				offset["IJ".index(w)] = v * self.scale
+
+		if not axes:
+			return []
+
+		start = self.pos
+		self.pos = target
+		if self.motion == 0:
+			return [[target, self.maxRate]]
+		rate = min(self.feed, self.maxRate)
+		if rate <= 0:
+			raise ValueError("feed rate not set")
+		if self.motion == 1:
+			return [[target, rate]]
+		return [[p, rate] for p in arcPoints(start, target, offset, self.motion == 2)]
+
+def arcPoints(start, end, offset, cw):
+	cx = start[0] + offset[0]
+	cy = start[1] + offset[1]
+	r = math.hypot(offset[0], offset[1])
+	a0 = math.atan2(start[1] - cy, start[0] - cx)
+	a1 = math.atan2(end[1] - cy, end[0] - cx)
+	sweep = a1 - a0
+	if cw and sweep >= -1e-9:
+		sweep -= 2 * math.pi
+	elif not cw and sweep <= 1e-9:
+		sweep += 2 * math.pi
+	if r <= ARCTOLERANCE:
+		return [end]
+	n = int(math.floor(abs(0.5 * sweep * r) / math.sqrt(ARCTOLERANCE * (2 * r - ARCTOLERANCE))))
+	pts = []
+	for i in range(1, max(n, 1)):
+		a = a0 + sweep * i / n
+		f = float(i) / n
+		pts.append([cx + r * math.cos(a), cy + r * math.sin(a), start[2] + (end[2] - start[2]) * f])
+	pts.append(end)
+	return pts
+
+def blockTime(length, v0, v1, vmax, accel):
+	# duration of a trapezoidal (or triangular) velocity profile
+	vpeak = math.sqrt((2 * accel * length + v0 * v0 + v1 * v1) / 2.0)
+	if vpeak <= vmax:
+		return max(vpeak - v0, 0.0) / accel + max(vpeak - v1, 0.0) / accel
+	da = (vmax * vmax - v0 * v0) / (2 * accel)
+	dd = (vmax * vmax - v1 * v1) / (2 * accel)
+	return (vmax - v0) / accel + (vmax - v1) / accel + (length - da - dd) / vmax
+
+class Planner:
+	# the planner queue with acceleration.  When a block starts, the queue
+	# behind it is planned backwards from a stop after its last block; a short
+	# queue therefore forces the machine to slow down, which is exactly what a
+	# starved planner does on a real controller.
+	def __init__(self, size=PLANNERSIZE, accel=ACCEL, junctionDev=JUNCTIONDEV):
+		self.size = size
+		self.accel = accel
+		self.junctionDev = junctionDev
+		self.blocks = deque()
+		self.lastUnit = None
+		self.lastPos = [0.0, 0.0, 0.0]
+		self.speed = 0.0
+		self.current = None
+		self.remaining = 0.0
+		self.motionTime = 0.0
+		self.distance = 0.0
+		self.blockCount = 0
+
+	def full(self):
+		return len(self.blocks) >= self.size
+
+	def idle(self):
+		return self.current is None and len(self.blocks) == 0
+
+	def add(self, target, rate):
+		d = [target[i] - self.lastPos[i] for i in range(3)]
+		length = math.sqrt(d[0]*d[0] + d[1]*d[1] + d[2]*d[2])
+		self.lastPos = target
+		if length < 1e-6:
+			return
+		unit = [x / length for x in d]
+		b = Block(length, unit, rate / 60.0)
+		if self.lastUnit is None:
+			b.maxJunction = 0.0
+		else:
+			cosTheta = -sum([self.lastUnit[i] * unit[i] for i in range(3)])
+			if cosTheta > 0.999999:
+				b.maxJunction = MINSPEED
+			elif cosTheta < -0.999999:
+				b.maxJunction = b.speed
+			else:
+				sinHalf = math.sqrt(0.5 * (1.0 - cosTheta))
+				b.maxJunction = math.sqrt(self.accel * self.junctionDev * sinHalf / (1.0 - sinHalf))
+		self.lastUnit = unit
+		self.blocks.append(b)
+		self.blockCount += 1
+
+	def startNext(self):
+		vexit = 0.0
+		for b in reversed(self.blocks):
+			entry = min(b.maxJunction, b.speed, math.sqrt(vexit * vexit + 2 * self.accel * b.length))
+			b.plannedExit = vexit
+			vexit = entry
+		b = self.blocks.popleft()
+		v1 = min(b.plannedExit, math.sqrt(self.speed * self.speed + 2 * self.accel * b.length))
+		v0 = min(self.speed, b.speed)
+		self.current = b
+		self.remaining = blockTime(b.length, v0, v1, b.speed, self.accel)
+		self.speed = v1
+		self.distance += b.length
+
+	def advance(self, dt):
+		# run the machine for dt seconds; returns the part of dt spent moving
+		moving = 0.0
+		while dt > 0:
+			if self.current is None:
+				if len(self.blocks) == 0:
+					self.speed = 0.0
+					self.lastUnit = None
+					break
+				self.startNext()
+			step = min(dt, self.remaining)
+			self.remaining -= step
+			dt -= step
+			moving += step
+			if self.remaining <= 1e-12:
+				self.current = None
+		self.motionTime += moving
+		return moving
+
+	def makeRoom(self):
+		while self.full():
+			if self.current is None:
+				self.startNext()
+			self.advance(self.remaining)
+
+	def drain(self):
+		while not self.idle():
+			self.advance(3600.0)
+
+def estimate(gcode, maxRate=MAXRATE, accel=ACCEL):
+	# machine time for a program when the planner never runs dry
+	parser = Parser(maxRate)
+	planner = Planner(accel=accel)
+	for l in gcode:
+		for target, rate in parser.moves(l):
+			planner.makeRoom()
+			planner.add(target, rate)
+	planner.drain()
+	return planner.motionTime
+
+class PtyTransport:
+	def __init__(self):
+		import pty
+		import tty
+
+		self.master, self.slave = pty.openpty()
+		tty.setraw(self.master)
+		tty.setraw(self.slave)
+		self.address = os.ttyname(self.slave)
+
+	def read(self, timeout):
+		r, w, x = select.select([self.master], [], [], timeout)
+		if len(r) == 0:
+			return b""
+		return os.read(self.master, 4096)
+
+	def write(self, data):
+		os.write(self.master, data)
+
+	def close(self):
+		os.close(self.master)
+		os.close(self.slave)
+
+class TcpTransport:
+	# one client at a time on a local TCP port, as with a serial to network bridge
+	def __init__(self, port=0):
+		self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.listener.bind(("127.0.0.1", port))
+		self.listener.listen(1)
+		self.address = "tcp://127.0.0.1:%d" % self.listener.getsockname()[1]
+		self.conn = None
+		self.pendingBanner = None
+
+	def read(self, timeout):
+		if self.conn is None:
+			r, w, x = select.select([self.listener], [], [], timeout)
+			if len(r) == 0:
+				return b""
+			self.conn, addr = self.listener.accept()
+			self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+			if self.pendingBanner is not None:
+				self.conn.sendall(self.pendingBanner)
+			return b""
+		r, w, x = select.select([self.conn], [], [], timeout)
+		if len(r) == 0:
+			return b""
+		data = self.conn.recv(4096)
+		if len(data) == 0:
+			self.conn.close()
+			self.conn = None
+		return data
+
+	def write(self, data):
+		if self.conn is None:
+			# a banner written before anyone connected is shown on connect
+			self.pendingBanner = data
+			return
+		self.conn.sendall(data)
+
+	def close(self):
+		if self.conn is not None:
+			self.conn.close()
+		self.listener.close()
+
+class SimController:
+	# a GRBL-like controller for testing senders and timing programs.  Lines
+	# land in a receive buffer of the real size, are parsed into a planner
+	# queue with acceleration, and are only acknowledged once all of their
+	# moves are in the planner.  Motion runs against the wall clock, sped up by
+	# speedup, so a sender that lets the planner run dry costs simulated time.
+	def __init__(self, transport=None, rxSize=RXBUFFERSIZE, lineDelay=LINEDELAY, latency=LATENCY,
+				speedup=1.0, maxRate=MAXRATE, accel=ACCEL, plannerSize=PLANNERSIZE):
+		if transport is None:
+			transport = PtyTransport()
+		self.transport = transport
+		self.path = transport.address
+		self.rxSize = rxSize
+		self.lineDelay = lineDelay
+		self.latency = latency
+		self.speedup = speedup
+		self.maxRate = maxRate
+		self.accel = accel
+		self.plannerSize = plannerSize
+		self.outgoing = deque()
+		self.clock = 0.0
+
+		self.reset()
+		self.overflows = 0
+		self.maxRx = 0
+		self.lines = []
+		self.errors = []
+		self.stopped = False
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+
+	def reset(self):
+		self.rx = b""
+		self.held = False
+		self.parser = Parser(self.maxRate)
+		self.planner = Planner(self.plannerSize, self.accel)
+		self.pendingMoves = deque()
+		self.pendingAck = None
+		self.jobStart = None
+		self.lastMotion = None
+
+	def start(self):
+		self.thread.start()
+		return self.path
+
+	def stop(self):
+		self.stopped = True
+		self.thread.join()
+		self.transport.close()
+
+	def send(self, text):
+		if self.latency > 0:
+			self.outgoing.append([time.time() + self.latency, text])
+		else:
+			self.transport.write((text + "\r\n").encode("ascii"))
+
+	def flushOutgoing(self):
+		now = time.time()
+		while len(self.outgoing) > 0 and self.outgoing[0][0] <= now:
+			self.transport.write((self.outgoing.popleft()[1] + "\r\n").encode("ascii"))
+
+	def status(self):
+		if self.held:
+			state = "Hold:0"
+		elif self.planner.idle():
+			state = "Idle"
+		else:
+			state = "Run"
+		p = self.parser.pos
+		return "<%s|MPos:%.3f,%.3f,%.3f|Bf:%d,%d>" % (state, p[0], p[1], p[2], self.planner.size - len(self.planner.blocks), self.rxSize - len(self.rx))
+
+	def receive(self, data):
+		for b in data:
+			c = bytes([b])
+			if c == b"!":
+				self.held = True
+			elif c == b"~":
+				self.held = False
+			elif c == b"?":
+				self.send(self.status())
+			elif c == b"\x18":
+				self.reset()
+				self.send(BANNER)
+			elif c == b"\r":
+				continue
+			else:
+				if len(self.rx) >= self.rxSize:
+					self.overflows += 1
+					continue
+				self.rx += c
+				self.maxRx = max(self.maxRx, len(self.rx))
+
+	def nextLine(self):
+		p = self.rx.find(b"\n")
+		if p < 0:
+			return None
+		l = self.rx[:p].decode("ascii", "replace")
+		self.rx = self.rx[p+1:]
+		return l
+
+	def execute(self, l):
+		# parse one line into moves waiting for the planner
+		self.lines.append(l)
+		try:
+			self.pendingMoves.extend(self.parser.moves(l))
+		except ValueError as e:
+			self.errors.append([len(self.lines), str(e)])
+			return "error:2"
+		return "ok"
+
+	def feed(self):
+		# move parsed lines into the planner.  Like the real thing, the
+		# controller stops reading its receive buffer while the planner is
+		# full, which is what holds back the acknowledgements.
+		while True:
+			while len(self.pendingMoves) > 0 and not self.planner.full():
+				if self.jobStart is None:
+					self.jobStart = self.clock
+				self.planner.add(*self.pendingMoves.popleft())
+			if len(self.pendingMoves) > 0:
+				return
+			if self.pendingAck is not None:
+				self.send(self.pendingAck)
+				self.pendingAck = None
+
+			l = self.nextLine()
+			if l is None:
+				return
+			if len(l.strip()) == 0:
+				continue
+			if self.lineDelay > 0:
+				time.sleep(self.lineDelay)
+			self.pendingAck = self.execute(l.strip())
+
+	def tick(self, dt):
+		# advance simulated time by dt seconds
+		start = self.clock
+		self.clock += dt
+		if self.held:
+			return
+		moving = self.planner.advance(dt)
+		if moving > 0:
+			self.lastMotion = start + moving
+
+	def run(self):
+		self.clock = 0.0
+		self.send(BANNER)
+		last = time.time()
+		while not self.stopped:
+			data = self.transport.read(0.001)
+			if len(data) > 0:
+				self.receive(data)
+
+			now = time.time()
+			self.tick((now - last) * self.speedup)
+			last = now
+
+			self.feed()
+			self.flushOutgoing()
+
+	def waitIdle(self, timeout=None):
+		end = None if timeout is None else time.time() + timeout
+		while len(self.rx) > 0 or len(self.pendingMoves) > 0 or not self.planner.idle():
+			if end is not None and time.time() > end:
+				return False
+			time.sleep(0.005)
+		return True
+
+	def report(self):
+		# the job runs from the first planned move to the end of the last one;
+		# any part of that the machine spent standing still it was starved
+		jobTime = 0.0
+		if self.jobStart is not None and self.lastMotion is not None:
+			jobTime = self.lastMotion - self.jobStart
+		return {
+			"lines": len(self.lines),
+			"blocks": self.planner.blockCount,
+			"distance": self.planner.distance,
+			"jobTime": jobTime,
+			"motionTime": self.planner.motionTime,
+			"starvedTime": max(jobTime - self.planner.motionTime, 0.0),
+			"rxHighWater": self.maxRx,
+			"overflows": self.overflows,
+			"errors": len(self.errors),
+		}
+
+def benchmark(gcode, mode, speedup=1.0, latency=LATENCY, tcp=False):
+	# stream a program into a fresh simulated controller and time it
+	import sender
+
+	sim = SimController(TcpTransport() if tcp else None, latency=latency, speedup=speedup)
+	sim.start()
+	port = sender.openPort(sim.path)
+	try:
+		s = sender.Sender(port, mode=mode)
+		s.wakeUp()
+		s.stream(gcode)
+		sim.waitIdle()
+	finally:
+		port.close()
+		sim.stop()
+	r = sim.report()
+	r["streamTime"] = s.elapsed
+	return r
+
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("usage: %s [file.nc ...] [--speedup=n] [--latency=seconds] [--tcp] [--serve]" % sys.argv[0])
+		sys.exit(1)
+
+	speedup = 1.0
+	latency = LATENCY
+	tcp = False
+	serve = False
+	files = []
+	for a in sys.argv[1:]:
+		if a.startswith("--speedup="):
+			speedup = float(a[10:])
+		elif a.startswith("--latency="):
+			latency = float(a[10:])
+		elif a == "--tcp":
+			tcp = True
+		elif a == "--serve":
+			serve = True
+		else:
+			files.append(a)
+
+	if serve:
+		sim = SimController(TcpTransport() if tcp else None, latency=latency, speedup=speedup)
+		print("simulated controller on %s" % sim.start())
+		try:
+			while True:
+				time.sleep(1)
+		except KeyboardInterrupt:
+			pass
+		sim.stop()
+		print(sim.report())
+		sys.exit(0)
+
+	import gcodefile
+	import sender
+
+	for fn in files:
+		gcode = list(gcodefile.readGCode(fn))
+		print("%s: %.1f seconds with a full planner" % (fn, estimate(gcode)))
+		for mode, name in [[sender.CHARCOUNT, "character counting"], [sender.PINGPONG, "ping-pong"]]:
+			r = benchmark(gcode, mode, speedup, latency, tcp)
+			print("  %-18s %.1f seconds simulated (%.1f starved), %d lines, %d blocks, rx high water %d" % (name,
+				r["jobTime"], r["starvedTime"], r["lines"], r["blocks"], r["rxHighWater"]))
@@ -1,22 +1,117 @@
 import wx
 import os
+import io
+import sys
+import time
+import json
+import struct
+import logging
+
+log = logging.getLogger(__name__)
+
+BUNDLE = "images.bundle"
+BUNDLEMAGIC = b"CNCBOXIMG1\n"
+
+def attrName(fn):
+	b = os.path.splitext(os.path.basename(fn))[0]
+	return 'png'+b.capitalize()
+
+def buildBundle(idir, fn=None):
+	pdir = os.path.expandvars(idir)
+	if fn is None:
+		fn = os.path.join(pdir, BUNDLE)
+
+	index = {}
+	data = []
+	offset = 0
+	for f in sorted(os.listdir(pdir)):
+		fp = os.path.join(pdir, f)
+		if not os.path.isdir(fp) and f.lower().endswith(".png"):
+			with open(fp, "rb") as png:
+				d = png.read()
+			index[attrName(f)] = [offset, len(d)]
+			data.append(d)
+			offset += len(d)
+
+	hdr = json.dumps(index, sort_keys=True).encode("utf-8")
+	with open(fn + ".tmp", "wb") as bf:
+		bf.write(BUNDLEMAGIC)
+		bf.write(struct.pack("<I", len(hdr)))
+		bf.write(hdr)
+		for d in data:
+			bf.write(d)
+	os.replace(fn + ".tmp", fn)
+	return len(index)
 
 class Images:
 	def __init__(self, idir):
+		self.pdir = os.path.expandvars(idir)
+		self.bundle = None
+		self.index = {}
+		self.decodeTime = 0.0
+		self.decodeCount = 0
+		self.loadBundle(os.path.join(self.pdir, BUNDLE))
+		if self.bundle is not None:
+			return
+
 		try:
-			pdir = os.path.expandvars(idir)
-			l = os.listdir(pdir)
+			l = os.listdir(self.pdir)
 		except:
-			print("Unable to get listing from directory: %s" % idir)
+			log.warning("Unable to get listing from directory: %s", idir)
 			return
 
 		for f in l:
 			if not os.path.isdir(f) and f.lower().endswith(".png"):
-				b = os.path.splitext(os.path.basename(f))[0]
-
-				fp =  os.path.join(pdir, f)	
-				png = wx.Image(fp, wx.BITMAP_TYPE_PNG).ConvertToBitmap()
-				mask = wx.Mask(png, wx.BLUE)
-				png.SetMask(mask)
-	
-				setattr(self, 'png'+b.capitalize(), png)
+				self.index[attrName(f)] = os.path.join(self.pdir, f)
+
+	def loadBundle(self, fn):
+		try:
+			with open(fn, "rb") as bf:
+				data = bf.read()
+		except OSError:
+			return
+
+		n = len(BUNDLEMAGIC)
+		if not data.startswith(BUNDLEMAGIC):
+			log.warning("Ignoring invalid image bundle: %s", fn)
+			return
+
+		hlen = struct.unpack("<I", data[n:n+4])[0]
+		try:
+			index = json.loads(data[n+4:n+4+hlen].decode("utf-8"))
+		except ValueError:
+			log.warning("Ignoring invalid image bundle: %s", fn)
+			return
+
+		self.bundle = memoryview(data)[n+4+hlen:]
+		self.index = index
+
+	def __getattr__(self, name):
+		index = self.__dict__.get("index", {})
+		if name in index:
+			src = index[name]
+		elif name.startswith("png") and os.path.isfile(os.path.join(self.pdir, name[3:].lower() + ".png")):
+			src = os.path.join(self.pdir, name[3:].lower() + ".png")
+		else:
+			raise AttributeError(name)
+
+		start = time.perf_counter()
+		if isinstance(src, str):
+			img = wx.Image(src, wx.BITMAP_TYPE_PNG)
+		else:
+			img = wx.Image(io.BytesIO(self.bundle[src[0]:src[0]+src[1]]), wx.BITMAP_TYPE_PNG)
+
+		png = img.ConvertToBitmap()
+		mask = wx.Mask(png, wx.BLUE)
+		png.SetMask(mask)
+		self.decodeTime += time.perf_counter() - start
+		self.decodeCount += 1
+
+		setattr(self, name, png)
+		return png
+
+if __name__ == "__main__":
+	idir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+	if len(sys.argv) > 1:
+		idir = sys.argv[1]
+	print("%d images bundled into %s" % (buildBundle(idir), os.path.join(idir, BUNDLE)))
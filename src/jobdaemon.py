@@ -0,0 +1,334 @@
+import os
+import sys
+import json
+import time
+import signal
+import shutil
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import box
+import boxfile
+import gcodegen
+import gcodefile
+import validate
+import metrics
+
+log = logging.getLogger(__name__)
+
+JOBEXT = ".job"
+RESULTFILE = "job.json"
+# a job is built in a hidden sibling of its output directory and swapped in
+BUILDSUFFIX = ".building"
+OLDSUFFIX = ".old"
+POLLINTERVAL = 2.0
+WARMUPTOOLRAD = 1.5
+
+# a job sidecar sits next to its box file with the same name.  Every key is
+# optional; a box file without a sidecar gets all panels with these defaults.
+JOBDEFAULTS = {
+	"panels": None,			# panel names such as "top" or "divider1"; None for all
+	"toolrad": 1.5,
+	"settings": {},			# generator settings, see gcodegen.SETTINGS
+	"compression": None,	# None, "gzip" or "zstd"
+	"force": False,			# generate panels that fail validation
+	"memorybudget": None,	# MB; fail the job if it needs more.  Needs --memory.
+}
+
+COMPRESSEXT = {
+	gcodefile.COMPRESS_NONE: "",
+	gcodefile.COMPRESS_GZIP: ".gz",
+	gcodefile.COMPRESS_ZSTD: ".zst",
+}
+
+class JobError(Exception):
+	pass
+
+def panelFileName(bx, pid):
+	return bx.panelName(pid).lower().replace(" ", "")
+
+def readJob(jobPath):
+	job = dict(JOBDEFAULTS)
+	if jobPath is None:
+		return job
+
+	with open(jobPath, "r") as fp:
+		try:
+			d = json.load(fp)
+		except ValueError as e:
+			raise JobError("%s: %s" % (jobPath, str(e)))
+	if not isinstance(d, dict):
+		raise JobError("%s: not a job description" % jobPath)
+
+	for n, v in d.items():
+		if n in job:
+			job[n] = v
+		else:
+			log.warning("unknown key in job file %s: %s", jobPath, n)
+	if job["compression"] not in COMPRESSEXT:
+		raise JobError("%s: unknown compression %s" % (jobPath, job["compression"]))
+	if not isinstance(job["settings"], dict):
+		raise JobError("%s: settings must be an object" % jobPath)
+	try:
+		gcodegen.checkSettings(job["settings"])
+	except ValueError as e:
+		raise JobError("%s: %s" % (jobPath, str(e)))
+	return job
+
+def selectPanels(bx, names):
+	byName = dict([[panelFileName(bx, pid), pid] for pid in bx.panelTypes()])
+	if names is None:
+		return bx.panelTypes()
+
+	panels = []
+	for n in names:
+		k = str(n).lower().replace(" ", "")
+		if k not in byName:
+			raise JobError("box has no panel named %s" % n)
+		panels.append(byName[k])
+	return panels
+
+def writeResult(dest, result):
+	fn = os.path.join(dest, RESULTFILE)
+	tfn = fn + ".tmp"
+	with open(tfn, "w") as fp:
+		json.dump(result, fp, indent=1)
+	os.replace(tfn, fn)
+
+def swapIn(build, dest):
+	# two renames, so between them a reader finds no directory at all, but
+	# never a mix of old and new files
+	old = os.path.join(os.path.dirname(dest), "." + os.path.basename(dest) + OLDSUFFIX)
+	shutil.rmtree(old, ignore_errors=True)
+	if os.path.exists(dest):
+		os.rename(dest, old)
+	os.rename(build, dest)
+	shutil.rmtree(old, ignore_errors=True)
+
+def runJob(name, boxPath, jobPath, outDir, signature):
+	# runs in a pool worker.  The whole job, result file included, is written
+	# into a hidden build directory that then replaces the output directory, so
+	# readers never see a mix of old and new files and panels dropped from the
+	# job do not linger.
+	start = time.time()
+	dest = os.path.join(outDir, name)
+	build = os.path.join(outDir, "." + name + BUILDSUFFIX)
+	shutil.rmtree(build, ignore_errors=True)
+	result = {"box": boxPath, "job": jobPath, "signature": signature, "panels": {}, "error": None}
+	mem = metrics.MemoryJob()
+	try:
+		job = readJob(jobPath)
+		if job["memorybudget"] is not None:
+			mem.budget = float(job["memorybudget"]) * 1e6
+		with mem:
+			toolrad = float(job["toolrad"])
+			bx = box.fromState(boxfile.readBox(boxPath), toolrad)
+			gen = gcodegen.GCodeGenerator()
+			gen.setSettings(job["settings"])
+			panels = selectPanels(bx, job["panels"])
+
+			os.makedirs(build)
+			for pid in panels:
+				pn = panelFileName(bx, pid)
+				problems = validate.errors(validate.validatePanel(bx, pid, toolrad))
+				if len(problems) > 0 and not job["force"]:
+					result["panels"][pn] = {"problem": str(problems[0])}
+					continue
+
+				gcode = gen.generate(bx, pid, toolrad)
+				fn = pn + ".nc" + COMPRESSEXT[job["compression"]]
+				gcodefile.writeGCode(os.path.join(build, fn), gcode, job["compression"])
+				result["panels"][pn] = {"file": fn, "lines": len(gcode), "seconds": round(gen.estimateTime(gcode), 1)}
+				# so one panel's program is not still held while making the next
+				del gcode
+
+	except (OSError, ValueError, TypeError, boxfile.BoxFileError, gcodefile.GCodeFileError, JobError, metrics.MemoryBudgetExceeded) as e:
+		result["error"] = str(e)
+
+	result["elapsed"] = round(time.time() - start, 3)
+	if mem.peak is not None:
+		result["memory"] = mem.result()
+	try:
+		os.makedirs(build, exist_ok=True)
+		writeResult(build, result)
+		swapIn(build, dest)
+	except OSError:
+		shutil.rmtree(build, ignore_errors=True)
+		raise
+	if metrics.enabled or metrics.memory:
+		result["metrics"] = metrics.snapshot(True)
+	return result
+
+def warmUp():
+	# pay for first use of the geometry and generator code once per worker
+	# rather than once per job
+	bx = box.fromState(boxfile.defaultState(), WARMUPTOOLRAD)
+	gcodegen.GCodeGenerator().generate(bx, box.FACE_TOP, WARMUPTOOLRAD)
+	metrics.clear()
+
+def fileSignature(path):
+	if path is None:
+		return None
+	st = os.stat(path)
+	return [st.st_mtime_ns, st.st_size]
+
+class JobDaemon:
+	# polls a drop directory for box files and their sidecars.  A job is queued
+	# once its files have stopped changing for one poll interval, and is done
+	# again whenever either file changes later.
+	def __init__(self, inDir, outDir, workers=None, interval=POLLINTERVAL, metricsFile=None):
+		self.inDir = inDir
+		self.metricsFile = metricsFile
+		self.outDir = outDir
+		self.interval = interval
+		if workers is None:
+			workers = os.cpu_count() or 1
+		self.maxRunning = workers
+		self.pool = ProcessPoolExecutor(max_workers=workers, initializer=warmUp)
+		self.queue = deque()
+		self.running = {}
+		self.seen = {}
+		self.done = {}
+		self.completed = 0
+		self.failed = 0
+		os.makedirs(outDir, exist_ok=True)
+		self.loadResults()
+
+	def loadResults(self):
+		# jobs finished by an earlier run are not redone unless their files change
+		with os.scandir(self.outDir) as it:
+			for e in it:
+				if e.name.startswith(".") and e.name.endswith((BUILDSUFFIX, OLDSUFFIX)):
+					# left behind by a worker that died part way
+					shutil.rmtree(e.path, ignore_errors=True)
+					continue
+				fn = os.path.join(e.path, RESULTFILE)
+				if not e.is_dir() or not os.path.exists(fn):
+					continue
+				try:
+					with open(fn, "r") as fp:
+						self.done[e.name] = json.load(fp).get("signature")
+				except (OSError, ValueError) as ex:
+					log.warning("Unable to read job result %s: %s", fn, str(ex))
+
+	def scan(self):
+		jobs = {}
+		for bp in boxfile.listBoxFiles(self.inDir):
+			name = os.path.splitext(os.path.basename(bp))[0]
+			jp = os.path.join(self.inDir, name + JOBEXT)
+			if not os.path.exists(jp):
+				jp = None
+			try:
+				jobs[name] = [bp, jp, [fileSignature(bp), fileSignature(jp)]]
+			except OSError:
+				# removed between listing and stat; pick it up next time round
+				pass
+		return jobs
+
+	def poll(self, settle=True):
+		for name, [bp, jp, sig] in self.scan().items():
+			if self.done.get(name) == sig or name in self.running:
+				continue
+			if settle and self.seen.get(name) != sig:
+				self.seen[name] = sig
+				continue
+			if name not in [j[0] for j in self.queue]:
+				self.queue.append([name, bp, jp, sig])
+
+		self.reap()
+		while len(self.queue) > 0 and len(self.running) < self.maxRunning:
+			name, bp, jp, sig = self.queue.popleft()
+			log.info("starting job %s", name)
+			self.running[name] = [sig, self.pool.submit(runJob, name, bp, jp, self.outDir, sig)]
+
+	def reap(self):
+		for name in list(self.running.keys()):
+			sig, f = self.running[name]
+			if not f.done():
+				continue
+			del self.running[name]
+			self.done[name] = sig
+			try:
+				result = f.result()
+			except Exception as e:
+				log.error("job %s failed: %s", name, str(e))
+				self.failed += 1
+				continue
+
+			if "metrics" in result:
+				metrics.merge(result.pop("metrics"))
+				self.exportMetrics()
+
+			if result["error"] is not None:
+				log.error("job %s failed: %s", name, result["error"])
+				self.failed += 1
+			else:
+				log.info("job %s complete: %d panels in %.1f seconds", name, len(result["panels"]), result["elapsed"])
+				self.completed += 1
+			if "memory" in result:
+				log.info("job %s peak memory %.1f MB", name, result["memory"]["peak"] / 1e6)
+
+	def exportMetrics(self):
+		if self.metricsFile is None:
+			return
+		try:
+			metrics.export(self.metricsFile)
+		except OSError as e:
+			log.warning("Unable to write metrics to %s: %s", self.metricsFile, str(e))
+
+	def idle(self):
+		return len(self.queue) == 0 and len(self.running) == 0
+
+	def run(self, stop, once=False):
+		# once processes whatever is in the drop directory now and returns
+		self.poll(not once)
+		while not stop.is_set():
+			if once and self.idle():
+				break
+			stop.wait(self.interval if not once else 0.1)
+			self.poll(not once)
+
+	def shutdown(self):
+		self.pool.shutdown()
+		self.reap()
+
+if __name__ == "__main__":
+	if len(sys.argv) < 3:
+		print("usage: %s dropdir outdir [--workers=n] [--interval=s] [--once] [--log=level] [--metrics=file.json|file.prom] [--memory] [--memory-budget=MB]" % sys.argv[0])
+		sys.exit(1)
+
+	workers = None
+	interval = POLLINTERVAL
+	once = False
+	metricsFile = None
+	logLevel = "info"
+	for a in sys.argv[3:]:
+		if a.startswith("--workers="):
+			workers = int(a[10:])
+		elif a.startswith("--interval="):
+			interval = float(a[11:])
+		elif a == "--once":
+			once = True
+		elif a.startswith("--log="):
+			logLevel = a[6:]
+		elif a.startswith("--metrics="):
+			metricsFile = a[10:]
+			metrics.enable()
+		elif a == "--memory":
+			metrics.enableMemory(metrics.budget)
+		elif a.startswith("--memory-budget="):
+			metrics.enableMemory(float(a[16:]) * 1e6)
+
+	stop = threading.Event()
+	signal.signal(signal.SIGTERM, lambda sig, frame: stop.set())
+	signal.signal(signal.SIGINT, lambda sig, frame: stop.set())
+
+	metrics.setupLogging(logLevel)
+	d = JobDaemon(sys.argv[1], sys.argv[2], workers, interval, metricsFile)
+	try:
+		d.run(stop, once)
+	finally:
+		d.shutdown()
+	print("%d jobs complete, %d failed" % (d.completed, d.failed))
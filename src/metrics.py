@@ -0,0 +1,296 @@
+import os
+import time
+import json
+import logging
+import functools
+import threading
+import tracemalloc
+
+ENVFLAG = "CNCBOX_METRICS"
+MEMFLAG = "CNCBOX_MEMORY"		# the budget in bytes, 0 for none
+PROMPREFIX = "cncbox"
+LOGFORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+# Instrumented functions are registered once, at import, and are only
+# replaced by timing wrappers while metrics are enabled.  With metrics off the
+# original functions are in place, so the hot paths pay nothing at all.
+# Enabling sets ENVFLAG so that worker processes started afterwards collect
+# too; use snapshot and merge to bring their figures back.
+enabled = False
+timers = {}			# name -> [calls, seconds, slowest call]
+counters = {}
+instrumented = []
+lock = threading.Lock()
+
+# Memory tracking is a second, separate opt-in: the instrumented functions
+# that make up the stages of a job also record the peak memory traced by
+# tracemalloc while they run.  It is far from free and is meant for batch
+# workers.  Figures are Python allocations, not the process size.
+memory = False
+budget = None		# bytes; None for no limit
+peaks = {}			# stage -> highest peak seen
+openStages = []		# highest peak so far in each stage that is running
+jobs = []			# MemoryJobs that are running
+
+# the instrumented names that are stages, and the stage each is reported as
+STAGES = {"gcode.toolpath": "render", "gcode.emit": "emit", "file.write": "write"}
+
+class MemoryBudgetExceeded(Exception):
+	pass
+
+def addTime(name, elapsed):
+	with lock:
+		t = timers.get(name)
+		if t is None:
+			timers[name] = [1, elapsed, elapsed]
+		else:
+			t[0] += 1
+			t[1] += elapsed
+			if elapsed > t[2]:
+				t[2] = elapsed
+
+def count(name, n=1):
+	# cheap, but callers on hot paths should still test enabled first
+	with lock:
+		counters[name] = counters.get(name, 0) + n
+
+def timed(name, fn):
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		start = time.perf_counter()
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			addTime(name, time.perf_counter() - start)
+	return wrapper
+
+def tracked(stage, fn):
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		beginStage()
+		try:
+			result = fn(*args, **kwargs)
+		except:
+			endStage(stage, False)
+			raise
+		endStage(stage)
+		return result
+	return wrapper
+
+def wrapperFor(name, fn):
+	if memory and name in STAGES:
+		fn = tracked(STAGES[name], fn)
+	if enabled:
+		fn = timed(name, fn)
+	return fn
+
+def patch():
+	for owner, attr, name, fn in instrumented:
+		setattr(owner, attr, wrapperFor(name, fn))
+
+def instrument(owner, attr, name):
+	# owner is a class or module; attr names the function to time
+	entry = [owner, attr, name, getattr(owner, attr)]
+	instrumented.append(entry)
+	if enabled or memory:
+		setattr(owner, attr, wrapperFor(name, entry[3]))
+
+def enable():
+	global enabled
+	if enabled:
+		return
+	enabled = True
+	os.environ[ENVFLAG] = "1"
+	patch()
+
+def disable():
+	global enabled
+	if not enabled:
+		return
+	enabled = False
+	os.environ.pop(ENVFLAG, None)
+	patch()
+
+def enableMemory(limit=None):
+	# limit is the budget in bytes
+	global memory, budget
+	budget = limit
+	os.environ[MEMFLAG] = str(int(limit or 0))
+	if not tracemalloc.is_tracing():
+		tracemalloc.start()
+	if not memory:
+		memory = True
+		patch()
+
+def disableMemory():
+	global memory, budget
+	if not memory:
+		return
+	memory = False
+	budget = None
+	os.environ.pop(MEMFLAG, None)
+	tracemalloc.stop()
+	del openStages[:]
+	patch()
+
+def beginStage():
+	# tracemalloc keeps a single peak, so a stage starting inside another
+	# banks the outer one's peak before resetting it
+	current, peak = tracemalloc.get_traced_memory()
+	if len(openStages) > 0:
+		openStages[-1] = max(openStages[-1], peak)
+	tracemalloc.reset_peak()
+	openStages.append(current)
+
+def endStage(stage, check=True):
+	# the stage's peak in bytes.  Recorded under stage unless that is None;
+	# over the budget, or the budget of a running job, is an error.
+	peak = max(openStages.pop(), tracemalloc.get_traced_memory()[1])
+	if len(openStages) > 0:
+		openStages[-1] = max(openStages[-1], peak)
+	if stage is not None:
+		with lock:
+			peaks[stage] = max(peaks.get(stage, 0), peak)
+		for j in jobs:
+			j.stages[stage] = max(j.stages.get(stage, 0), peak)
+	if check:
+		for limit in [budget] + [j.budget for j in jobs]:
+			if limit and peak > limit:
+				raise MemoryBudgetExceeded("%s used %.1f MB of memory, over the budget of %.1f MB" % (stage or "job", peak / 1e6, limit / 1e6))
+	return peak
+
+class MemoryJob:
+	# the peak memory over a whole job and in each of its stages.  budget, in
+	# bytes, applies to this job in addition to the process wide one.
+	def __init__(self, budget=None):
+		self.budget = budget
+		self.stages = {}
+		self.peak = None
+
+	def __enter__(self):
+		if memory:
+			beginStage()
+			jobs.append(self)
+		return self
+
+	def __exit__(self, exc, val, tb):
+		if memory:
+			jobs.remove(self)
+			self.peak = endStage(None, exc is None)
+		return False
+
+	def result(self):
+		if self.peak is None:
+			return None
+		return {"peak": self.peak, "stages": dict(self.stages)}
+
+class Timer:
+	# for timing a block rather than a whole function
+	def __init__(self, name):
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, exc, val, tb):
+		addTime(self.name, time.perf_counter() - self.start)
+		return False
+
+def snapshot(reset=False):
+	with lock:
+		s = {"timers": dict([[n, t[:]] for n, t in timers.items()]), "counters": dict(counters), "peaks": dict(peaks)}
+		if reset:
+			timers.clear()
+			counters.clear()
+			peaks.clear()
+	return s
+
+def merge(s):
+	with lock:
+		for n, [calls, seconds, slowest] in s["timers"].items():
+			t = timers.get(n)
+			if t is None:
+				timers[n] = [calls, seconds, slowest]
+			else:
+				t[0] += calls
+				t[1] += seconds
+				t[2] = max(t[2], slowest)
+		for n, v in s["counters"].items():
+			counters[n] = counters.get(n, 0) + v
+		for n, v in s["peaks"].items():
+			peaks[n] = max(peaks.get(n, 0), v)
+
+def clear():
+	with lock:
+		timers.clear()
+		counters.clear()
+		peaks.clear()
+
+def report():
+	s = snapshot()
+	lines = ["%-24s %8s %12s %12s %12s" % ("timer", "calls", "total ms", "mean ms", "max ms")]
+	for n in sorted(s["timers"].keys()):
+		calls, seconds, slowest = s["timers"][n]
+		lines.append("%-24s %8d %12.2f %12.3f %12.3f" % (n, calls, seconds * 1000.0, seconds * 1000.0 / calls, slowest * 1000.0))
+	for n in sorted(s["counters"].keys()):
+		lines.append("%-24s %8d" % (n, s["counters"][n]))
+	for n in sorted(s["peaks"].keys()):
+		lines.append("%-24s %8.2f MB peak" % ("memory." + n, s["peaks"][n] / 1e6))
+	return "\n".join(lines)
+
+def toJSON():
+	s = snapshot()
+	return {
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"timers": dict([[n, {"calls": t[0], "seconds": t[1], "max": t[2]}] for n, t in s["timers"].items()]),
+		"counters": s["counters"],
+		"memory": s["peaks"],
+	}
+
+def toPrometheus():
+	# text exposition format, for the node exporter's textfile collector
+	s = snapshot()
+	lines = []
+	series = [
+		["calls_total", "counter", "Calls to instrumented code", 0],
+		["seconds_total", "counter", "Time spent in instrumented code", 1],
+		["seconds_max", "gauge", "Slowest single call to instrumented code", 2],
+	]
+	for suffix, kind, text, i in series:
+		m = "%s_%s" % (PROMPREFIX, suffix)
+		lines.append("# HELP %s %s" % (m, text))
+		lines.append("# TYPE %s %s" % (m, kind))
+		for n in sorted(s["timers"].keys()):
+			lines.append('%s{name="%s"} %s' % (m, n, repr(s["timers"][n][i])))
+	m = "%s_events_total" % PROMPREFIX
+	lines.append("# HELP %s Counted events" % m)
+	lines.append("# TYPE %s counter" % m)
+	for n in sorted(s["counters"].keys()):
+		lines.append('%s{name="%s"} %d' % (m, n, s["counters"][n]))
+	if len(s["peaks"]) > 0:
+		m = "%s_memory_peak_bytes" % PROMPREFIX
+		lines.append("# HELP %s Highest memory traced in each stage" % m)
+		lines.append("# TYPE %s gauge" % m)
+		for n in sorted(s["peaks"].keys()):
+			lines.append('%s{stage="%s"} %d' % (m, n, s["peaks"][n]))
+	return "\n".join(lines) + "\n"
+
+def export(path):
+	# a path ending in .prom gets the Prometheus text format, anything else JSON
+	if path.endswith(".prom"):
+		text = toPrometheus()
+	else:
+		text = json.dumps(toJSON(), indent=1) + "\n"
+	tmpPath = "%s.%d.tmp" % (path, os.getpid())
+	with open(tmpPath, "w") as fp:
+		fp.write(text)
+	os.replace(tmpPath, path)
+
+def setupLogging(level="warning"):
+	logging.basicConfig(format=LOGFORMAT, level=getattr(logging, level.upper(), logging.WARNING))
+
+if os.environ.get(ENVFLAG):
+	enabled = True
+if os.environ.get(MEMFLAG) is not None:
+	enableMemory(int(os.environ[MEMFLAG]) or None)
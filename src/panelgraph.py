@@ -0,0 +1,140 @@
+import face
+
+# joint kinds
+EDGE = 0		# two panel edges meet at a corner; tabs on one mate with slots on the other
+TEE = 1			# a panel edge ends in the middle of another panel; its tabs go through slots in the host
+NOTCH = 2		# half of a half-lap joint between two crossing panels
+
+# panel sides, in the order face.render draws them
+SIDE_LEFT = 0
+SIDE_TOP = 1
+SIDE_RIGHT = 2
+SIDE_BOTTOM = 3
+
+sides = [SIDE_LEFT, SIDE_TOP, SIDE_RIGHT, SIDE_BOTTOM]
+
+# axis of the host panel that a TEE or NOTCH joint is fixed on
+AXIS_X = 0
+AXIS_Y = 1
+
+def sideEdge(side):
+	if side in [SIDE_LEFT, SIDE_RIGHT]:
+		return face.FHEIGHT
+	return face.FWIDTH
+
+class Panel:
+	def __init__(self, pid, name, fc):
+		self.id = pid
+		self.name = name
+		self.face = fc
+		self.sides = [None, None, None, None]
+
+class Joint:
+	def __init__(self, kind, a, aSide, b, bSide=None, axis=AXIS_X, offset=0.0, cornerType=None):
+		self.kind = kind
+		self.a = a
+		self.aSide = aSide
+		self.b = b
+		self.bSide = bSide
+		self.axis = axis
+		self.offset = offset
+		self.cornerType = cornerType
+
+	def other(self, pid):
+		if pid == self.a:
+			return self.b
+		return self.a
+
+class PanelGraph:
+	# panels are nodes and joints are edges.  Every panel side holds its joint
+	# directly and every host keeps the list of joints that cut slots into it,
+	# so adjacency and slot lookups are constant time whatever the panel count.
+	def __init__(self):
+		self.panels = {}
+		self.joints = []
+		self.hosted = {}
+
+	def addPanel(self, pid, name, fc):
+		p = Panel(pid, name, fc)
+		self.panels[pid] = p
+		self.hosted[pid] = []
+		return p
+
+	def removePanel(self, pid):
+		p = self.panels.pop(pid)
+		del self.hosted[pid]
+		dead = [j for j in self.joints if j.a == pid or j.b == pid]
+		for j in dead:
+			self.joints.remove(j)
+			for q in [j.a, j.b]:
+				if q in self.panels:
+					pq = self.panels[q]
+					pq.sides = [None if s is j else s for s in pq.sides]
+					if j in self.hosted[q]:
+						self.hosted[q].remove(j)
+		return p
+
+	def connect(self, a, aSide, b, bSide, cornerType):
+		j = Joint(EDGE, a, aSide, b, bSide, cornerType=cornerType)
+		self.panels[a].sides[aSide] = j
+		self.panels[b].sides[bSide] = j
+		self.joints.append(j)
+		return j
+
+	def attach(self, a, aSide, host, axis, offset):
+		j = Joint(TEE, a, aSide, host, axis=axis, offset=offset)
+		self.panels[a].sides[aSide] = j
+		self.hosted[host].append(j)
+		self.joints.append(j)
+		return j
+
+	def notch(self, host, other, axis, offset, fromTop):
+		# notch runs from the top edge of the host down to its middle, or from
+		# the bottom edge up
+		j = Joint(NOTCH, host, SIDE_TOP if fromTop else SIDE_BOTTOM, other, axis=axis, offset=offset)
+		self.hosted[host].append(j)
+		self.joints.append(j)
+		return j
+
+	def jointAt(self, pid, side):
+		return self.panels[pid].sides[side]
+
+	def neighbors(self, pid):
+		return [None if j is None else j.other(pid) for j in self.panels[pid].sides]
+
+	def panelIds(self):
+		return sorted(self.panels.keys())
+
+	def notchesFor(self, pid):
+		# half lap notches open onto an edge of the panel
+		notches = []
+		host = self.panels[pid].face
+		for j in self.hosted[pid]:
+			if j.kind == NOTCH:
+				h = host.height / 2.0
+				cy = h / 2.0 if j.aSide == SIDE_TOP else -h / 2.0
+				notches.append([[j.offset, cy], host.thickness, h])
+		return notches
+
+	def slotsFor(self, pid):
+		# rectangular openings the host needs for the panels that end in it or
+		# cross it, in the same [[cx, cy], width, height] form as user openings
+		slots = self.notchesFor(pid)
+		for j in self.hosted[pid]:
+			if j.kind != TEE:
+				continue
+
+			fc = self.panels[j.a].face
+			if sideEdge(j.aSide) == face.FHEIGHT:
+				tabs = fc.htabs if fc.htabct > 0 else []
+				length = fc.height
+			else:
+				tabs = fc.wtabs if fc.wtabct > 0 else []
+				length = fc.width
+			for loc, tl in tabs:
+				along = -length / 2.0 + loc
+				if j.axis == AXIS_X:
+					slots.append([[j.offset, along], fc.thickness, tl])
+				else:
+					slots.append([[along, j.offset], tl, fc.thickness])
+		return slots
@@ -0,0 +1,187 @@
+import metrics
+from toolpath import OP_COMMENT, OP_RAPIDZ, OP_RAPIDXY, OP_FEEDZ, OP_PATH, OP_ARC
+from toolpath import NOTE_SECTION, NOTE_CIRCLE, NOTE_RECTANGLE, NOTE_LAYER
+
+DEPTHFORMAT = "%8.2f"
+
+def trimNumber(s):
+	if "." in s:
+		s = s.rstrip("0").rstrip(".")
+	return "0" if s == "-0" else s
+
+class Post:
+	# turns a toolpath into the program text for one controller dialect.  All
+	# of the line templates are built once when the post is made for a set of
+	# generator settings; emitting is then a single format per line.
+	name = None
+	preamble = []
+	footer = []
+	units = ["G20", "G21"]
+	comment = "; %s"
+	rapidFeed = True	# put the feed word on rapid moves too
+	modalFeed = False	# only write F when the rate changes
+	trimZeros = False	# numbers in moves may drop trailing zeros after the point
+
+	def __init__(self, sigDigits, feeds, addSpeed=True):
+		self.sigDigits = sigDigits
+		self.feeds = feeds
+		self.addSpeed = addSpeed
+		self.feed = None
+		self.compile()
+
+	def noteText(self, s):
+		return self.comment % s
+
+	def feedWord(self, stype):
+		if not self.addSpeed:
+			return ""
+		return " F" + self.num % self.numbers([self.feeds[stype]])
+
+	def feedTemplates(self, t, stype):
+		# the template without the feed word, with it, and the rate it sets
+		return [t, t + self.feedWord(stype), self.feeds[stype]]
+
+	def arcTemplate(self, cmd):
+		f = self.num
+		return cmd + " X" + f + " Y" + f + " I" + f + " J" + f
+
+	def numbers(self, values):
+		# the values for the number slots of the move templates.  Trimmed
+		# numbers are made here, "12.5000" becoming "12.5" and "-0.0000" "0";
+		# otherwise the templates format them.  Only text with a decimal point
+		# is trimmed, so "100" stays "100".
+		if not self.trimZeros:
+			return tuple(values)
+		f = self.fmt
+		return tuple([trimNumber(f % v) for v in values])
+
+	def compile(self):
+		self.fmt = "%0." + str(self.sigDigits) + "f"
+		self.num = "%s" if self.trimZeros else self.fmt
+		f = self.num
+
+		self.tRapidZ = "G0 Z" + f
+		self.tRapidXY = "G0 X" + f + " Y" + f
+		if self.rapidFeed:
+			self.tRapidZ += self.feedWord("G0Z")
+			self.tRapidXY += self.feedWord("G0XY")
+		self.tFeedZ = self.feedTemplates("G1 Z" + f, "G1Z")
+		self.tFeedXY = self.feedTemplates("G1 X" + f + " Y" + f, "G1XY")
+		self.tArc = [self.feedTemplates(self.arcTemplate(cmd), "G1XY") for cmd in ["G3", "G2"]]
+
+		# comments keep the fixed format
+		c = self.fmt
+		self.tNotes = {
+			NOTE_SECTION: self.noteText("%s"),
+			NOTE_CIRCLE: self.noteText("New circle - center (" + c + "," + c + ") radius " + c + "(" + c + ")"),
+			NOTE_RECTANGLE: self.noteText("New rectangle - center (" + c + "," + c + ") width " + c + "(" + c + ") height " + c + "(" + c + ")"),
+			NOTE_LAYER: self.noteText("layer at depth " + DEPTHFORMAT),
+		}
+
+		self.handlers = {
+			OP_COMMENT: self.emitComment,
+			OP_RAPIDZ: self.emitRapidZ,
+			OP_RAPIDXY: self.emitRapidXY,
+			OP_FEEDZ: self.emitFeedZ,
+			OP_PATH: self.emitPath,
+			OP_ARC: self.emitArc,
+		}
+
+	def pick(self, t):
+		if not self.modalFeed:
+			return t[1]
+		if self.feed == t[2]:
+			return t[0]
+		self.feed = t[2]
+		return t[1]
+
+	def emit(self, tp):
+		self.feed = None
+		lines = list(self.preamble)
+		lines.append(self.units[1 if tp.metric else 0])
+		handlers = self.handlers
+		for op in tp.ops:
+			handlers[op[0]](lines, op)
+		lines.extend(self.footer)
+		return lines
+
+	def emitComment(self, lines, op):
+		lines.append(self.tNotes[op[1]] % op[2])
+
+	def emitRapidZ(self, lines, op):
+		lines.append(self.tRapidZ % self.numbers(op[1:2]))
+
+	def emitRapidXY(self, lines, op):
+		lines.append(self.tRapidXY % self.numbers(op[1:3]))
+
+	def emitFeedZ(self, lines, op):
+		lines.append(self.pick(self.tFeedZ) % self.numbers(op[1:2]))
+
+	def emitPath(self, lines, op):
+		# the offset is added to every x and then every y, and the whole path
+		# is formatted by a single template with a line for each point.  The
+		# sums and the conversions are the same as point by point, and so is
+		# the text.
+		pts, ox, oy = op[1], op[2], op[3]
+		n = len(pts)
+		if n == 0:
+			return
+		t = "\n".join([self.pick(self.tFeedXY)] + [self.pick(self.tFeedXY)] * (n - 1))
+		coords = [0.0] * (2 * n)
+		coords[0::2] = [p[0] + ox for p in pts]
+		coords[1::2] = [p[1] + oy for p in pts]
+		lines.extend((t % self.numbers(coords)).split("\n"))
+
+	def emitArc(self, lines, op):
+		lines.append(self.pick(self.tArc[op[1]]) % self.numbers(op[2:6]))
+
+class GrblPost(Post):
+	# the dialect this program has always written: F on every line and full
+	# circles given by their J offset alone
+	name = "GRBL"
+
+	def compile(self):
+		Post.compile(self)
+		f = self.num
+		self.tArcJ = [self.feedTemplates(cmd + " J" + f + " X" + f + " Y" + f, "G1XY") for cmd in ["G3", "G2"]]
+
+	def emitArc(self, lines, op):
+		if op[4] != 0:
+			Post.emitArc(self, lines, op)
+			return
+		lines.append(self.pick(self.tArcJ[op[1]]) % self.numbers([op[5], op[2], op[3]]))
+
+class LinuxCncPost(Post):
+	name = "LinuxCNC"
+	preamble = ["G17 G90 G94"]
+	footer = ["M2"]
+	rapidFeed = False
+	modalFeed = True
+	trimZeros = True
+
+class Mach3Post(Post):
+	# Mach3 can be set up for absolute arc centers, so ask for incremental
+	# ones explicitly.  Comments are parenthesized and may not nest.
+	name = "Mach3"
+	preamble = ["G17 G90 G91.1 G94"]
+	footer = ["M30"]
+	comment = "(%s)"
+	rapidFeed = False
+	modalFeed = True
+	trimZeros = True
+
+	def noteText(self, s):
+		return self.comment % s.replace("(", "[").replace(")", "]")
+
+metrics.instrument(Post, "emit", "gcode.emit")
+
+# adding a controller means adding a Post subclass here
+posts = [GrblPost, LinuxCncPost, Mach3Post]
+postNames = [p.name for p in posts]
+DEFAULTPOST = GrblPost.name
+
+def makePost(name, sigDigits, feeds, addSpeed=True):
+	for p in posts:
+		if p.name == name:
+			return p(sigDigits, feeds, addSpeed)
+	raise ValueError("Unknown post processor: %s" % name)
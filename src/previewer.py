@@ -0,0 +1,53 @@
+import threading
+import logging
+
+log = logging.getLogger(__name__)
+
+def renderFaces(bx, faces, toolrad):
+	# outlines for several faces of one box, one after the other.  Rendering is
+	# pure Python, so threads would only take turns holding the GIL, and worker
+	# processes would not share the render cache every result lands in.
+	return dict([[ft, bx.render(ft, toolrad)[0]] for ft in faces])
+
+class BackgroundRenderer:
+	# renders face outlines on a worker thread.  Only the most recent request is
+	# kept; anything submitted while a render is running replaces the one still
+	# waiting, so a burst of edits costs at most one render beyond the last.
+	def __init__(self, callback):
+		self.callback = callback
+		self.cond = threading.Condition()
+		self.pending = None
+		self.stopped = False
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def submit(self, generation, bx, faces, toolrad):
+		with self.cond:
+			self.pending = [generation, bx, faces, toolrad]
+			self.cond.notify()
+
+	def stop(self):
+		with self.cond:
+			self.stopped = True
+			self.pending = None
+			self.cond.notify()
+		self.thread.join()
+
+	def run(self):
+		while True:
+			with self.cond:
+				while self.pending is None and not self.stopped:
+					self.cond.wait()
+				if self.stopped:
+					return
+				generation, bx, faces, toolrad = self.pending
+				self.pending = None
+
+			try:
+				outlines = renderFaces(bx, faces, toolrad)
+			except Exception as e:
+				log.error("Unable to render faces %s: %s", str(faces), str(e))
+				continue
+
+			self.callback(generation, outlines)
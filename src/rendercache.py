@@ -0,0 +1,42 @@
+import threading
+from collections import OrderedDict
+
+MAXENTRIES = 512
+
+class RenderCache:
+	# face outlines keyed by everything that goes into computing them; safe to
+	# share between the UI thread and background renderers
+	def __init__(self, maxEntries=MAXENTRIES):
+		self.maxEntries = maxEntries
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, key):
+		with self.lock:
+			pts = self.entries.get(key)
+			if pts is None:
+				self.misses += 1
+				return None
+			self.entries.move_to_end(key)
+			self.hits += 1
+			return pts
+
+	def put(self, key, pts):
+		with self.lock:
+			self.entries[key] = pts
+			self.entries.move_to_end(key)
+			while len(self.entries) > self.maxEntries:
+				self.entries.popitem(last=False)
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.hits = 0
+			self.misses = 0
+
+	def __len__(self):
+		return len(self.entries)
+
+cache = RenderCache()
@@ -0,0 +1,147 @@
+import os
+import wx
+import logging
+import sqlite3
+
+import boxindex
+
+log = logging.getLogger(__name__)
+
+DIMFORMAT = "%8.2f"
+BUTTONDIM = (56, 56)
+
+class SearchDlg(wx.Dialog):
+	def __init__(self, parent, directory, images):
+		self.parent = parent
+		self.directory = directory
+		self.images = images
+		self.results = []
+		self.path = None
+		wx.Dialog.__init__(self, parent, wx.ID_ANY, "Search Box Library")
+		self.SetBackgroundColour("white")
+		self.Bind(wx.EVT_CLOSE, self.doCancel)
+		self.Bind(wx.EVT_WINDOW_DESTROY, self.onDestroy)
+
+		self.index = None
+		try:
+			self.index = boxindex.BoxIndex(os.path.join(directory, boxindex.INDEXFILE))
+			a, u, r = self.index.scan(directory)
+			log.info("box index: %d added, %d updated, %d removed", a, u, r)
+		except (OSError, sqlite3.Error) as e:
+			self.closeIndex()
+			dlg = wx.MessageDialog(self, "Unable to open the box index in\n%s:\n%s" % (directory, str(e)), 'Index Error', wx.OK | wx.ICON_ERROR)
+			dlg.ShowModal()
+			dlg.Destroy()
+
+		dsizer = wx.BoxSizer(wx.VERTICAL)
+		dsizer.AddSpacer(10)
+
+		t = wx.StaticText(self, wx.ID_ANY, "Query (e.g. wall=6 width>200): ")
+		tc = wx.TextCtrl(self, wx.ID_ANY, "", size=(300, -1), style=wx.TE_PROCESS_ENTER)
+		self.tcQuery = tc
+		tc.Bind(wx.EVT_TEXT_ENTER, self.onQuery)
+
+		hb = wx.BoxSizer(wx.HORIZONTAL)
+		hb.AddSpacer(10)
+		hb.Add(t, 0, wx.TOP, 3)
+		hb.Add(tc)
+		hb.AddSpacer(10)
+		dsizer.Add(hb)
+		dsizer.AddSpacer(10)
+
+		self.lcResults = wx.ListCtrl(self, wx.ID_ANY, size=(640, 400), style=wx.LC_REPORT|wx.LC_HRULES|wx.LC_VRULES|wx.LC_SINGLE_SEL)
+		colWidths = [240, 80, 80, 80, 80, 70]
+		colTitles = ["File", "Width", "Height", "Depth", "Wall", "Openings"]
+		for i in range(len(colWidths)):
+			self.lcResults.InsertColumn(i, colTitles[i])
+			self.lcResults.SetColumnWidth(i, colWidths[i])
+		self.lcResults.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.doOk)
+
+		hb = wx.BoxSizer(wx.HORIZONTAL)
+		hb.AddSpacer(10)
+		hb.Add(self.lcResults)
+		hb.AddSpacer(10)
+		dsizer.Add(hb)
+		dsizer.AddSpacer(10)
+
+		btnsizer = wx.BoxSizer(wx.HORIZONTAL)
+		btnsizer.AddSpacer(5)
+
+		self.bOk = wx.BitmapButton(self, wx.ID_ANY, self.images.pngOk, size=BUTTONDIM)
+		self.bOk.SetToolTip("Load the selected box")
+		btnsizer.Add(self.bOk)
+		self.Bind(wx.EVT_BUTTON, self.doOk, self.bOk)
+		btnsizer.AddSpacer(5)
+
+		self.bCancel = wx.BitmapButton(self, wx.ID_ANY, self.images.pngCancel, size=BUTTONDIM)
+		self.bCancel.SetToolTip("Dismiss dialog")
+		btnsizer.Add(self.bCancel)
+		self.Bind(wx.EVT_BUTTON, self.doCancel, self.bCancel)
+		btnsizer.AddSpacer(5)
+
+		dsizer.Add(btnsizer, 0, wx.ALIGN_CENTER_HORIZONTAL|wx.ALL, 5)
+		dsizer.AddSpacer(10)
+
+		self.SetSizer(dsizer)
+		dsizer.Fit(self)
+
+		self.doQuery("")
+
+	def isOpen(self):
+		return self.index is not None
+
+	def closeIndex(self):
+		if self.index is not None:
+			self.index.close()
+			self.index = None
+
+	def onDestroy(self, e):
+		if e.GetEventObject() is self:
+			self.closeIndex()
+		e.Skip()
+
+	def onQuery(self, e):
+		self.doQuery(self.tcQuery.GetValue())
+
+	def doQuery(self, q):
+		if self.index is None:
+			return
+
+		try:
+			self.results = self.index.query(q, self.directory)
+		except boxindex.QueryError as e:
+			dlg = wx.MessageDialog(self, str(e), 'Invalid query', wx.OK | wx.ICON_INFORMATION)
+			dlg.ShowModal()
+			dlg.Destroy()
+			return
+		except sqlite3.Error as e:
+			dlg = wx.MessageDialog(self, str(e), 'Index Error', wx.OK | wx.ICON_ERROR)
+			dlg.ShowModal()
+			dlg.Destroy()
+			return
+
+		self.lcResults.DeleteAllItems()
+		for i in range(len(self.results)):
+			r = self.results[i]
+			self.lcResults.InsertItem(i, os.path.basename(r["path"]))
+			self.lcResults.SetItem(i, 1, DIMFORMAT % r["width"])
+			self.lcResults.SetItem(i, 2, DIMFORMAT % r["height"])
+			self.lcResults.SetItem(i, 3, DIMFORMAT % r["depth"])
+			self.lcResults.SetItem(i, 4, DIMFORMAT % r["wall"])
+			self.lcResults.SetItem(i, 5, "%d" % (r["circles"] + r["rectangles"]))
+
+	def getPath(self):
+		return self.path
+
+	def doOk(self, e):
+		sx = self.lcResults.GetFirstSelected()
+		if sx < 0 or sx >= len(self.results):
+			return
+
+		self.path = self.results[sx]["path"]
+		self.closeIndex()
+		self.EndModal(wx.ID_OK)
+
+	def doCancel(self, e):
+		self.closeIndex()
+		self.EndModal(wx.ID_CANCEL)
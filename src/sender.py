@@ -0,0 +1,305 @@
+import os
+import sys
+import time
+import select
+import socket
+import threading
+import logging
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+try:
+	import serial
+except ImportError:
+	serial = None
+
+RXBUFFERSIZE = 128		# bytes in the GRBL serial receive buffer
+BAUDRATE = 115200
+READTIMEOUT = 0.05
+WAKEUPDELAY = 2.0
+
+# realtime commands; GRBL acts on these as soon as they arrive and does not
+# put them in the receive buffer
+FEEDHOLD = b"!"
+CYCLESTART = b"~"
+STATUSQUERY = b"?"
+SOFTRESET = b"\x18"
+
+# streaming protocols
+CHARCOUNT = 0	# keep as many lines in the receive buffer as will fit
+PINGPONG = 1	# send a line and wait for its ok
+
+class SenderError(Exception):
+	pass
+
+class TtyPort:
+	# a serial device or pty opened directly.  Used when pyserial is not
+	# installed; good enough for the USB serial adapters GRBL boards use.
+	def __init__(self, path, baud=BAUDRATE):
+		import termios
+		import tty
+
+		self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+		try:
+			tty.setraw(self.fd)
+			speed = getattr(termios, "B%d" % baud, None)
+			if speed is not None:
+				attrs = termios.tcgetattr(self.fd)
+				attrs[4] = speed
+				attrs[5] = speed
+				termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+		except termios.error:
+			pass
+
+	def write(self, data):
+		while len(data) > 0:
+			n = os.write(self.fd, data)
+			data = data[n:]
+
+	def read(self, timeout):
+		r, w, x = select.select([self.fd], [], [], timeout)
+		if len(r) == 0:
+			return b""
+		return os.read(self.fd, 4096)
+
+	def close(self):
+		os.close(self.fd)
+
+class SerialPort:
+	def __init__(self, path, baud=BAUDRATE):
+		self.port = serial.Serial(path, baud, timeout=READTIMEOUT)
+
+	def write(self, data):
+		self.port.write(data)
+
+	def read(self, timeout):
+		self.port.timeout = timeout
+		return self.port.read(max(1, self.port.in_waiting))
+
+	def close(self):
+		self.port.close()
+
+class SocketPort:
+	# a controller behind a serial to network bridge, or the simulator
+	def __init__(self, host, port):
+		self.sock = socket.create_connection((host, port))
+		self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+	def write(self, data):
+		self.sock.sendall(data)
+
+	def read(self, timeout):
+		r, w, x = select.select([self.sock], [], [], timeout)
+		if len(r) == 0:
+			return b""
+		data = self.sock.recv(4096)
+		if len(data) == 0:
+			raise SenderError("controller closed the connection")
+		return data
+
+	def close(self):
+		self.sock.close()
+
+def openPort(path, baud=BAUDRATE):
+	# path is a serial device, or tcp://host:port
+	try:
+		if path.startswith("tcp://"):
+			host, port = path[6:].rsplit(":", 1)
+			return SocketPort(host, int(port))
+		if serial is not None:
+			return SerialPort(path, baud)
+		return TtyPort(path, baud)
+	except (OSError, ValueError) as e:
+		raise SenderError("Unable to open %s: %s" % (path, str(e)))
+
+def cleanLine(l):
+	# the controller ignores comments and spaces, but they would still take up
+	# room in its receive buffer
+	p = l.find(";")
+	if p >= 0:
+		l = l[:p]
+	while "(" in l:
+		s = l.find("(")
+		e = l.find(")", s)
+		if e < 0:
+			l = l[:s]
+			break
+		l = l[:s] + l[e+1:]
+	return l.replace(" ", "").strip()
+
+class Sender:
+	# with stopOnError the first error response ends the stream with a feed
+	# hold, as the lines after a rejected one would cut the wrong shape;
+	# otherwise errors are only collected
+	def __init__(self, port, rxSize=RXBUFFERSIZE, mode=CHARCOUNT, stopOnError=True):
+		self.port = port
+		self.rxSize = rxSize
+		self.mode = mode
+		self.stopOnError = stopOnError
+		self.paused = threading.Event()
+		self.lock = threading.Lock()
+		self.pending = b""
+		self.banner = None
+		self.lastStatus = None
+		self.messages = []
+		self.reset()
+
+	def reset(self):
+		self.inFlight = deque()
+		self.bufferUsed = 0
+		self.sent = 0
+		self.acked = 0
+		self.errors = []
+		self.alarm = None
+		self.maxBufferUsed = 0
+		self.elapsed = 0.0
+
+	def realtime(self, cmd):
+		with self.lock:
+			self.port.write(cmd)
+
+	def pause(self):
+		self.paused.set()
+		self.realtime(FEEDHOLD)
+
+	def resume(self):
+		self.paused.clear()
+		self.realtime(CYCLESTART)
+
+	def isPaused(self):
+		return self.paused.is_set()
+
+	def wakeUp(self, timeout=WAKEUPDELAY):
+		# opening the port resets most boards; wait for the banner and drop
+		# anything else that arrived in the meantime
+		self.port.write(b"\r\n\r\n")
+		end = time.time() + timeout
+		while time.time() < end and self.banner is None:
+			for l in self.readLines(READTIMEOUT):
+				if l.startswith("Grbl"):
+					self.banner = l
+		self.pending = b""
+		return self.banner
+
+	def readLines(self, timeout):
+		data = self.port.read(timeout)
+		if len(data) == 0:
+			return []
+		data = self.pending + data
+		lines = data.split(b"\n")
+		self.pending = lines[-1]
+		return [l.decode("ascii", "replace").strip() for l in lines[:-1] if len(l.strip()) > 0]
+
+	def handleResponse(self, l):
+		if l == "ok" or l.startswith("error"):
+			if len(self.inFlight) == 0:
+				log.warning("unexpected response from controller: %s", l)
+				return
+			n, size = self.inFlight.popleft()
+			self.bufferUsed -= size
+			self.acked += 1
+			if l != "ok":
+				self.errors.append([n, l])
+		elif l.startswith("ALARM"):
+			self.alarm = l
+		elif l.startswith("<"):
+			self.lastStatus = l
+		elif l.startswith("Grbl"):
+			self.banner = l
+		else:
+			self.messages.append(l)
+
+	def stream(self, gcode, progress=None, cancel=None):
+		# gcode is any sequence of program lines.  Lines go out as long as the
+		# unacknowledged bytes fit in the controller's receive buffer, so its
+		# planner never runs dry waiting for the next line to cross the wire.
+		self.reset()
+		lines = []
+		for i, l in enumerate(gcode):
+			c = cleanLine(l)
+			if len(c) > 0:
+				try:
+					lines.append([i, (c + "\n").encode("ascii")])
+				except UnicodeEncodeError:
+					raise SenderError("line %d has characters the controller cannot take: %s" % (i+1, c))
+		total = len(lines)
+		for n, data in lines:
+			if len(data) > self.rxSize:
+				raise SenderError("line %d is longer than the controller's receive buffer" % (n+1))
+
+		start = time.time()
+		nextLine = 0
+		while self.acked < total:
+			if cancel is not None and cancel.is_set():
+				self.realtime(SOFTRESET)
+				break
+			if self.alarm is not None:
+				break
+			if self.stopOnError and len(self.errors) > 0:
+				break
+
+			while nextLine < total and not self.paused.is_set():
+				n, data = lines[nextLine]
+				if self.mode == PINGPONG and len(self.inFlight) > 0:
+					break
+				if self.bufferUsed + len(data) > self.rxSize:
+					break
+				with self.lock:
+					self.port.write(data)
+				self.inFlight.append([n, len(data)])
+				self.bufferUsed += len(data)
+				self.maxBufferUsed = max(self.maxBufferUsed, self.bufferUsed)
+				self.sent += 1
+				nextLine += 1
+
+			acked = self.acked
+			for l in self.readLines(READTIMEOUT):
+				self.handleResponse(l)
+			if progress is not None and self.acked != acked:
+				progress(self.sent, self.acked, total)
+
+		self.elapsed = time.time() - start
+		if self.alarm is not None:
+			raise SenderError("controller raised %s after %d of %d lines" % (self.alarm, self.acked, total))
+		if self.stopOnError and len(self.errors) > 0:
+			# lines already in the controller would still run without the hold
+			self.paused.set()
+			self.realtime(FEEDHOLD)
+			n, err = self.errors[0]
+			raise SenderError("controller rejected line %d (%s); feed hold after %d of %d lines" % (n+1, err, self.acked, total))
+		return self.acked == total
+
+	def summary(self):
+		return "%d lines sent, %d acknowledged, %d errors in %.1f seconds" % (self.sent, self.acked, len(self.errors), self.elapsed)
+
+if __name__ == "__main__":
+	import gcodefile
+
+	if len(sys.argv) < 3:
+		print("usage: %s port file.nc [--baud=n] [--pingpong] [--keep-going]" % sys.argv[0])
+		sys.exit(1)
+
+	baud = BAUDRATE
+	mode = CHARCOUNT
+	stopOnError = True
+	for a in sys.argv[3:]:
+		if a.startswith("--baud="):
+			baud = int(a[7:])
+		elif a == "--pingpong":
+			mode = PINGPONG
+		elif a == "--keep-going":
+			stopOnError = False
+
+	port = openPort(sys.argv[1], baud)
+	s = Sender(port, mode=mode, stopOnError=stopOnError)
+	s.wakeUp()
+	try:
+		s.stream(list(gcodefile.readGCode(sys.argv[2])))
+	except SenderError as e:
+		print(str(e))
+	finally:
+		port.close()
+	for n, e in s.errors:
+		print("line %d: %s" % (n+1, e))
+	print(s.summary())
@@ -0,0 +1,75 @@
+import time
+import json
+
+REPORTFLAG = "--startup-report"
+
+class StartupProfile:
+	def __init__(self, t0=None, enabled=False):
+		self.t0 = time.perf_counter() if t0 is None else t0
+		self.enabled = enabled
+		self.stages = []
+		self.reportFile = None
+
+	def stage(self, name):
+		return StartupStage(self, name)
+
+	def add(self, name, elapsed, count=None):
+		self.stages.append([name, elapsed, count])
+
+	def total(self):
+		return time.perf_counter() - self.t0
+
+	def report(self):
+		lines = ["Startup report:"]
+		for name, elapsed, count in self.stages:
+			if count is None:
+				lines.append("  %-32s %8.1f ms" % (name, elapsed * 1000.0))
+			else:
+				lines.append("  %-32s %8.1f ms  (%d)" % (name, elapsed * 1000.0, count))
+		lines.append("  %-32s %8.1f ms" % ("total", self.total() * 1000.0))
+		return "\n".join(lines)
+
+	def record(self):
+		return {
+			"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"total": self.total(),
+			"stages": dict([[name.strip(), elapsed] for name, elapsed, count in self.stages]),
+		}
+
+	def finish(self):
+		if not self.enabled:
+			return
+
+		print(self.report())
+		if self.reportFile is not None:
+			try:
+				with open(self.reportFile, "a") as fp:
+					fp.write(json.dumps(self.record()) + "\n")
+			except OSError as e:
+				print("Unable to write startup report to %s: %s" % (self.reportFile, str(e)))
+
+class StartupStage:
+	def __init__(self, profile, name):
+		self.profile = profile
+		self.name = name
+
+	def __enter__(self):
+		# reserve the slot now so that nested stages are reported after their parent
+		self.entry = [self.name, 0.0, None]
+		self.profile.stages.append(self.entry)
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, exc, val, tb):
+		self.entry[1] = time.perf_counter() - self.start
+		return False
+
+def fromArgs(t0, argv):
+	p = StartupProfile(t0)
+	for a in argv[1:]:
+		if a == REPORTFLAG:
+			p.enabled = True
+		elif a.startswith(REPORTFLAG + "="):
+			p.enabled = True
+			p.reportFile = a[len(REPORTFLAG)+1:]
+	return p
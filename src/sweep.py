@@ -0,0 +1,237 @@
+import os
+import sys
+import csv
+import json
+import hashlib
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import box
+import boxfile
+import gcodegen
+import gcodefile
+import validate
+import metrics
+
+log = logging.getLogger(__name__)
+
+PROGRAMDIR = "programs"
+MANIFEST = "manifest.csv"
+
+SWEEPPARAMS = ["width", "height", "depth", "wall", "relief", "minweb", "cornerclear", "openingclear"]
+CORNERPARAMS = ["tabcount", "tablength", "tabtype", "tabpitch"]
+
+faceNames = ["top", "bottom", "left", "right", "front", "back"]
+
+def panelColumns(state):
+	# one manifest column per panel a variant can have: the six faces and
+	# every divider of the base box, whether or not it fits the base
+	return faceNames + ["divider%d" % (i + 1) for i in range(len(state["dividers"]))]
+
+def variantPanels(bx, state):
+	# [column, panel id] for the panels this variant has.  Dividers that do
+	# not fit get no panel, so the box numbers the rest differently; columns
+	# follow the base box's list instead.
+	fits = [i for i in range(len(state["dividers"])) if bx.dividerFits(*state["dividers"][i])]
+	dividers = [pid for pid in bx.panelTypes() if pid not in box.faceTypes]
+	return [[faceNames[ft], ft] for ft in box.faceTypes] + [["divider%d" % (fits[j] + 1), dividers[j]] for j in range(len(dividers))]
+
+def parseRange(v):
+	if ":" in v:
+		parts = v.split(":")
+		if len(parts) != 3:
+			raise ValueError("expected start:stop:step")
+		start, stop, step = [float(x) for x in parts]
+		if step == 0:
+			raise ValueError("step must not be 0")
+		if (stop - start) / step < 0:
+			raise ValueError("step %g does not go from %g to %g" % (step, start, stop))
+		n = int(round((stop - start) / step))
+		return [start + i * step for i in range(n + 1)]
+	return [float(x) for x in v.split(",")]
+
+def applyParams(base, params):
+	state = json.loads(json.dumps(base))
+	for n, v in params.items():
+		if n in SWEEPPARAMS:
+			state[n] = v
+		elif n in CORNERPARAMS:
+			state[n] = [v] * 3
+		else:
+			raise ValueError("Unknown sweep parameter: %s" % n)
+	return boxfile.normalizeState(state)
+
+def variants(base, ranges):
+	names = sorted(ranges.keys())
+	for values in itertools.product(*[ranges[n] for n in names]):
+		params = dict(zip(names, values))
+		yield params, applyParams(base, params)
+
+def geometryKey(bx, ft, toolrad, settings):
+	# two faces with the same key produce byte identical programs
+	pts, crc, rct = bx.render(ft, toolrad)
+	d = {
+		"outline": pts,
+		"blind": bx.render(ft, toolrad, True)[0],
+		"circles": crc,
+		"rectangles": rct,
+		"wall": bx.Wall,
+		"dim": bx.getFaceDim(ft),
+		"toolrad": toolrad,
+		"settings": settings,
+	}
+	s = json.dumps(d, sort_keys=True, separators=(",", ":"))
+	return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+def generateFace(state, ft, toolrad, settings, path):
+	# [lines, seconds, peak memory, problem, metrics]; a panel that goes over the
+	# memory budget gets the problem and no program
+	lines = seconds = 0
+	problem = None
+	mem = metrics.MemoryJob()
+	try:
+		with mem:
+			bx = box.fromState(state, toolrad)
+			gen = gcodegen.GCodeGenerator()
+			gen.setSettings(settings)
+			gcode = gen.generate(bx, ft, toolrad)
+			gcodefile.writeGCode(path, gcode)
+			lines, seconds = len(gcode), gen.estimateTime(gcode)
+	except metrics.MemoryBudgetExceeded as e:
+		problem = str(e)
+		lines = seconds = 0
+		if os.path.exists(path):
+			os.remove(path)
+	m = metrics.snapshot(True) if metrics.enabled or metrics.memory else None
+	return lines, seconds, mem.peak, problem, m
+
+def checkVariant(bx, toolrad, panels):
+	# the first error found on any panel, or None if the variant can be cut
+	for c, pid in panels:
+		problems = validate.errors(validate.validatePanel(bx, pid, toolrad))
+		if len(problems) > 0:
+			return "%s: %s" % (c, str(problems[0]))
+	return None
+
+def prepareVariant(state, toolrad, settings):
+	# runs in a pool worker: [problem, panels, metrics], so the parent does no
+	# rendering or validation of its own.  panels maps each manifest column
+	# to the panel id and its geometry key.
+	bx = box.fromState(state, toolrad)
+	panels = variantPanels(bx, state)
+	problem = checkVariant(bx, toolrad, panels)
+	keys = dict([[c, [pid, geometryKey(bx, pid, toolrad, settings)]] for c, pid in panels])
+	missing = [c for c in panelColumns(state) if c not in keys]
+	if problem is None and len(missing) > 0:
+		problem = "%s: does not fit" % ", ".join(missing)
+	m = metrics.snapshot(True) if metrics.enabled or metrics.memory else None
+	return problem, keys, m
+
+def sweep(base, ranges, outDir, toolrad=1.5, settings=None, workers=None, force=False):
+	if settings is None:
+		settings = gcodegen.GCodeGenerator().getSettings()
+
+	pdir = os.path.join(outDir, PROGRAMDIR)
+	os.makedirs(pdir, exist_ok=True)
+
+	rows = []
+	jobs = {}
+	# workers start with empty metrics, whatever this process had collected
+	# when they were forked
+	with ProcessPoolExecutor(max_workers=workers, initializer=metrics.clear) as pool:
+		# every variant is keyed and checked in the pool; each panel program is
+		# submitted as soon as its variant's keys are in
+		prepared = [[params, state, pool.submit(prepareVariant, state, toolrad, settings)] for params, state in variants(base, ranges)]
+		for params, state, f in prepared:
+			problem, keys, m = f.result()
+			if m is not None:
+				metrics.merge(m)
+			if problem is not None and not force:
+				log.warning("skipping %s - %s", str(params), problem)
+				rows.append([params, None, problem])
+				continue
+			for pid, k in keys.values():
+				if k not in jobs:
+					jobs[k] = pool.submit(generateFace, state, pid, toolrad, settings, os.path.join(pdir, k + ".nc"))
+			rows.append([params, keys, problem])
+
+		results = dict([[k, f.result()] for k, f in jobs.items()])
+
+	for lines, seconds, peak, problem, m in results.values():
+		if m is not None:
+			metrics.merge(m)
+
+	names = sorted(ranges.keys())
+	columns = panelColumns(base)
+	with open(os.path.join(outDir, MANIFEST), "w", newline="") as fp:
+		w = csv.writer(fp)
+		w.writerow(["variant"] + names + columns + ["lines", "seconds", "problems", "peak MB"])
+		for i in range(len(rows)):
+			params, keys, problem = rows[i]
+			if keys is None:
+				w.writerow([i] + [params[n] for n in names] + [""] * len(columns) + ["", "", problem, ""])
+				continue
+			made = [[c, keys[c][1]] for c in columns if c in keys]
+			lines = sum([results[k][0] for c, k in made])
+			seconds = sum([results[k][1] for c, k in made])
+			# panels that went over the memory budget, or that this variant
+			# does not have, have no program
+			files = [os.path.join(PROGRAMDIR, keys[c][1] + ".nc") if c in keys and results[keys[c][1]][3] is None else "" for c in columns]
+			problems = [] if problem is None else [problem]
+			problems += ["%s: %s" % (c, results[k][3]) for c, k in made if results[k][3] is not None]
+			peaks = [results[k][2] for c, k in made if results[k][2] is not None]
+			w.writerow([i] + [params[n] for n in names] + files + [lines, "%.1f" % seconds, "; ".join(problems), "%.1f" % (max(peaks) / 1e6) if len(peaks) > 0 else ""])
+
+	return len(rows), len(jobs)
+
+if __name__ == "__main__":
+	if len(sys.argv) < 4:
+		print("usage: %s basebox outdir name=start:stop:step|name=v1,v2,... [...] [--toolrad=r] [--workers=n] [--post=name] [--force] [--log=level] [--metrics=file.json|file.prom] [--memory] [--memory-budget=MB]" % sys.argv[0])
+		sys.exit(1)
+
+	base = boxfile.readBox(sys.argv[1])
+	ranges = {}
+	toolrad = 1.5
+	workers = None
+	force = False
+	settings = gcodegen.GCodeGenerator().getSettings()
+	metricsFile = None
+	logLevel = "warning"
+	for a in sys.argv[3:]:
+		if a == "--force":
+			force = True
+		elif a.startswith("--toolrad="):
+			toolrad = float(a[10:])
+		elif a.startswith("--workers="):
+			workers = int(a[10:])
+		elif a.startswith("--post="):
+			settings["post"] = a[7:]
+		elif a.startswith("--log="):
+			logLevel = a[6:]
+		elif a.startswith("--metrics="):
+			metricsFile = a[10:]
+			metrics.enable()
+		elif a == "--memory":
+			metrics.enableMemory(metrics.budget)
+		elif a.startswith("--memory-budget="):
+			metrics.enableMemory(float(a[16:]) * 1e6)
+		else:
+			try:
+				if "=" not in a:
+					raise ValueError("expected name=values")
+				n, v = a.split("=", 1)
+				if n not in SWEEPPARAMS + CORNERPARAMS:
+					raise ValueError("unknown sweep parameter")
+				ranges[n] = parseRange(v)
+			except ValueError as e:
+				print("Invalid range %s: %s" % (a, str(e)))
+				sys.exit(1)
+
+	metrics.setupLogging(logLevel)
+	nv, np = sweep(base, ranges, sys.argv[2], toolrad, settings, workers=workers, force=force)
+	print("%d variants, %d distinct panel programs" % (nv, np))
+	if metrics.memory:
+		print(metrics.report())
+	if metricsFile is not None:
+		metrics.export(metricsFile)
@@ -0,0 +1,38 @@
+EPSILON = 0.0001
+
+def mergeIntervals(intervals, clearance):
+	iv = sorted([[a - clearance, b + clearance] for a, b in intervals])
+	merged = []
+	for a, b in iv:
+		if len(merged) > 0 and a <= merged[-1][1]:
+			if b > merged[-1][1]:
+				merged[-1][1] = b
+		else:
+			merged.append([a, b])
+	return merged
+
+def solveTabs(length, tabLen, pitch, minWeb=0.0, cornerClear=0.0, keepOut=[], clearance=0.0):
+	# tabs are placed at a constant pitch, centered on the edge, so the layout is
+	# symmetric and reads the same from either end of the edge.  That is what
+	# lets both mating faces use the identical list.
+	pitch = max(pitch, tabLen + minWeb)
+	usable = length - 2 * cornerClear
+	if pitch <= 0 or usable < tabLen:
+		return []
+
+	n = int((usable - tabLen) / pitch + EPSILON) + 1
+	first = length / 2.0 - (n - 1) * pitch / 2.0
+	centers = [first + i * pitch for i in range(n)]
+
+	blocked = [False] * n
+	iv = mergeIntervals(keepOut, clearance)
+	j = 0
+	for i in range(n):
+		lo = centers[i] - tabLen / 2.0
+		hi = centers[i] + tabLen / 2.0
+		while j < len(iv) and iv[j][1] < lo:
+			j += 1
+		if j < len(iv) and iv[j][0] < hi:
+			blocked[i] = True
+
+	return [(centers[i], tabLen) for i in range(n) if not blocked[i] and not blocked[n - 1 - i]]
@@ -0,0 +1,43 @@
+import unittest
+
+import box
+
+def slotCenters(bx, pid):
+	return sorted(set([(round(c[0], 6), round(c[1], 6)) for c, w, h in bx.getSlots(pid)]))
+
+class DividerSlotTest(unittest.TestCase):
+	def setUp(self):
+		self.bx = box.box(60, 160, 120, 6)
+		self.bx.setDividers([[box.DIVIDER_ALONG, 40.0], [box.DIVIDER_ACROSS, 30.0]])
+
+	def testAcrossMeetsLeftAndRightAtOnePlace(self):
+		# seen from outside, the left face's x runs front to back and the
+		# right face's back to front
+		left = slotCenters(self.bx, box.FACE_LEFT)
+		right = slotCenters(self.bx, box.FACE_RIGHT)
+		self.assertTrue(len(left) > 0)
+		self.assertEqual([x for x, y in left], [30.0] * len(left))
+		self.assertEqual(sorted([(-x, y) for x, y in right]), left)
+
+	def testAlongMeetsFrontAndBackAtOnePlace(self):
+		front = slotCenters(self.bx, box.FACE_FRONT)
+		back = slotCenters(self.bx, box.FACE_BACK)
+		self.assertTrue(len(front) > 0)
+		self.assertEqual([x for x, y in front], [40.0] * len(front))
+		self.assertEqual(sorted([(-x, y) for x, y in back]), front)
+
+	def testBottomSlotsUnderDividers(self):
+		# the bottom's x runs right to left and its y front to back
+		bottom = self.bx.getSlots(box.FACE_BOTTOM)
+		along = [c for c, w, h in bottom if w == self.bx.Wall]
+		across = [c for c, w, h in bottom if h == self.bx.Wall]
+		self.assertTrue(len(along) > 0 and len(across) > 0)
+		self.assertEqual(set([x for x, y in along]), set([-40.0]))
+		self.assertEqual(set([y for x, y in across]), set([30.0]))
+
+	def testSlotsMatchDividerTabs(self):
+		for ft in [box.FACE_LEFT, box.FACE_RIGHT, box.FACE_FRONT, box.FACE_BACK]:
+			self.assertEqual(len(self.bx.getSlots(ft)), self.bx.DividerTabCt)
+
+if __name__ == "__main__":
+	unittest.main()
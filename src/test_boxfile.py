@@ -0,0 +1,74 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import boxfile
+
+class BoxFileTest(unittest.TestCase):
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.fn = os.path.join(self.dir, "b" + boxfile.BOXEXT)
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def writeJSON(self, d):
+		with open(self.fn, "w") as fp:
+			json.dump(d, fp)
+
+	def testRoundTrip(self):
+		state = boxfile.defaultState()
+		state["width"] = 123.5
+		state["dividers"] = [[0, 10.0]]
+		boxfile.writeBox(self.fn, state)
+		self.assertEqual(boxfile.readBox(self.fn), state)
+		with open(self.fn, "r") as fp:
+			self.assertEqual(json.load(fp)["version"], boxfile.BOXVERSION)
+
+	def testCurrentAndOlderVersionsLoad(self):
+		for d in [{"format": boxfile.BOXFORMAT, "version": boxfile.BOXVERSION}, {"format": boxfile.BOXFORMAT}]:
+			self.writeJSON(d)
+			self.assertEqual(boxfile.readBox(self.fn), boxfile.defaultState())
+
+	def testNewerVersionRejected(self):
+		self.writeJSON({"format": boxfile.BOXFORMAT, "version": boxfile.BOXVERSION + 1})
+		with self.assertRaisesRegex(boxfile.BoxFileError, "newer"):
+			boxfile.readBox(self.fn)
+
+	def testInvalidVersionRejected(self):
+		for v in ["2", None, 1.5, [1], True]:
+			self.writeJSON({"format": boxfile.BOXFORMAT, "version": v})
+			with self.assertRaises(boxfile.BoxFileError):
+				boxfile.readBox(self.fn)
+
+	def testNotABoxFile(self):
+		for d in [{"format": "other", "version": 1}, {"version": 1}]:
+			self.writeJSON(d)
+			with self.assertRaises(boxfile.BoxFileError):
+				boxfile.readBox(self.fn)
+
+	def testLegacyFileLoads(self):
+		with open(self.fn, "w") as fp:
+			fp.write("[box]\nwidth = 150.0\ntabcount = [1, 2, 3]\n")
+		state = boxfile.readBox(self.fn)
+		self.assertEqual(state["width"], 150.0)
+		self.assertEqual(state["tabcount"], [1, 2, 3])
+
+	def testUndecodableFilesRejected(self):
+		for data in [b"[box]\nwidth = \xff\xfe\n", b'{"format": "cncbox", "width": "\xff"}']:
+			with open(self.fn, "wb") as fp:
+				fp.write(data)
+			with self.assertRaises(boxfile.BoxFileError):
+				boxfile.readBox(self.fn)
+
+	def testFailedWriteLeavesNoTempFile(self):
+		# the target is a directory, so the final rename fails
+		os.mkdir(self.fn)
+		with self.assertRaises(OSError):
+			boxfile.writeBox(self.fn, boxfile.defaultState())
+		self.assertFalse(os.path.exists(self.fn + ".tmp"))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+import box
+import gcodegen
+
+class SettingsTest(unittest.TestCase):
+	def setUp(self):
+		self.gen = gcodegen.GCodeGenerator()
+
+	def testDefaultsRoundTrip(self):
+		self.gen.setSettings(self.gen.getSettings())
+
+	def testRejectsCutDepthThatNeverReachesBottom(self):
+		for v in [0, 0.0, -1.0]:
+			with self.assertRaises(ValueError):
+				self.gen.setSettings({"depthPerCut": v})
+
+	def testRejectsNonNumbers(self):
+		for n in gcodegen.POSITIVESETTINGS + gcodegen.NUMBERSETTINGS:
+			for v in ["1", None, True, [1], float("nan"), float("inf")]:
+				with self.assertRaises(ValueError):
+					self.gen.setSettings({n: v})
+
+	def testRejectsBadChoices(self):
+		for s in [{"sigDigits": 0}, {"sigDigits": 2.5}, {"origin": 9}, {"post": "nope"}, {"metric": 1}]:
+			with self.assertRaises(ValueError):
+				self.gen.setSettings(s)
+
+	def testRejectedSettingsChangeNothing(self):
+		before = self.gen.getSettings()
+		with self.assertRaises(ValueError):
+			self.gen.setSettings({"feedG1XY": 10.0, "depthPerCut": -1.0})
+		self.assertEqual(self.gen.getSettings(), before)
+
+	def testAcceptsWholeNumbers(self):
+		self.gen.setSettings({"depthPerCut": 2, "feedG1XY": 100, "safeZ": 0, "extraDepth": -0.5})
+		self.assertEqual(self.gen.depthPerCut, 2)
+
+	def testTinyCutDepthFailsInsteadOfHanging(self):
+		bx = box.box(60, 100, 80, 6)
+		self.gen.setSettings({"depthPerCut": 1e-9})
+		with self.assertRaises(ValueError):
+			self.gen.generate(bx, box.FACE_TOP, 1.5)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,46 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import boxfile
+import jobdaemon
+
+class JobFileTest(unittest.TestCase):
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.boxPath = os.path.join(self.dir, "b.box")
+		boxfile.writeBox(self.boxPath, boxfile.defaultState())
+		self.jobPath = os.path.join(self.dir, "b" + jobdaemon.JOBEXT)
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def writeJob(self, d):
+		with open(self.jobPath, "w") as fp:
+			json.dump(d, fp)
+
+	def testDefaultsWithoutSidecar(self):
+		self.assertEqual(jobdaemon.readJob(None), jobdaemon.JOBDEFAULTS)
+
+	def testRejectsCutDepthThatWouldHang(self):
+		for v in [0, -1.5]:
+			self.writeJob({"settings": {"depthPerCut": v}})
+			with self.assertRaises(jobdaemon.JobError):
+				jobdaemon.readJob(self.jobPath)
+
+	def testRejectsSettingsThatAreNotAnObject(self):
+		self.writeJob({"settings": [1, 2]})
+		with self.assertRaises(jobdaemon.JobError):
+			jobdaemon.readJob(self.jobPath)
+
+	def testRejectedJobReportsError(self):
+		self.writeJob({"settings": {"depthPerCut": 0}})
+		out = os.path.join(self.dir, "out")
+		result = jobdaemon.runJob("b", self.boxPath, self.jobPath, out, None)
+		self.assertIn("depthPerCut", result["error"])
+		self.assertEqual(os.listdir(os.path.join(out, "b")), [jobdaemon.RESULTFILE])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,35 @@
+import copy
+import unittest
+
+import undo
+
+def openings(n):
+	return [[[float(i % 50) - 25.0, float(i // 50) - 25.0], 1.0 + (i % 7) / 10.0] for i in range(n)]
+
+def shared(prev, chunks):
+	ids = set([id(ch) for ch in prev])
+	return len([ch for ch in chunks if id(ch) in ids])
+
+class FreezeListTest(unittest.TestCase):
+	def testRoundTrip(self):
+		items = openings(1000)
+		self.assertEqual(undo.thawList(undo.freezeList(items)), items)
+
+	def testInsertAtFrontSharesTheRest(self):
+		items = openings(5000)
+		prev = undo.freezeList(items)
+		chunks = undo.freezeList([[[0.5, 0.5], 3.0]] + copy.deepcopy(items), prev)
+		self.assertGreaterEqual(shared(prev, chunks), len(chunks) - 2)
+
+	def testDeleteSharesTheRest(self):
+		items = openings(5000)
+		prev = undo.freezeList(items)
+		chunks = undo.freezeList(items[:1000] + items[1001:], prev)
+		self.assertGreaterEqual(shared(prev, chunks), len(chunks) - 2)
+
+	def testChunkSizeIsBounded(self):
+		chunks = undo.freezeList([[[1.0, 1.0], 2.0]] * 1000)
+		self.assertTrue(max([len(ch) for ch in chunks]) <= undo.MAXCHUNK)
+
+if __name__ == "__main__":
+	unittest.main()
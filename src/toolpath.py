@@ -0,0 +1,40 @@
+# a toolpath is the list of machine operations for one panel, free of any
+# controller dialect.  Coordinates are work coordinates: already moved to the
+# chosen origin, in the units of the box.  Paths are the exception; their
+# points come with the offset that moves them there, so that the post can
+# apply it to the whole list at once.
+OP_COMMENT = 0		# kind, values
+OP_RAPIDZ = 1		# z
+OP_RAPIDXY = 2		# x, y
+OP_FEEDZ = 3		# z
+OP_PATH = 4			# list of [x, y] points, cut in order at the XY feed rate, offset x, y
+OP_ARC = 5			# clockwise, end x, end y, center i, j relative to the start
+
+# comment kinds; the wording belongs to the post processor
+NOTE_SECTION = 0	# name
+NOTE_CIRCLE = 1		# cx, cy, radius, tool path radius
+NOTE_RECTANGLE = 2	# cx, cy, width, tool path width, height, tool path height
+NOTE_LAYER = 3		# depth
+
+class Toolpath:
+	def __init__(self, metric=True):
+		self.metric = metric
+		self.ops = []
+
+	def comment(self, kind, *values):
+		self.ops.append([OP_COMMENT, kind, values])
+
+	def rapidZ(self, z):
+		self.ops.append([OP_RAPIDZ, z])
+
+	def rapidXY(self, x, y):
+		self.ops.append([OP_RAPIDXY, x, y])
+
+	def feedZ(self, z):
+		self.ops.append([OP_FEEDZ, z])
+
+	def path(self, pts, ox=0, oy=0):
+		self.ops.append([OP_PATH, pts, ox, oy])
+
+	def arc(self, cw, x, y, i, j):
+		self.ops.append([OP_ARC, cw, x, y, i, j])
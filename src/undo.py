@@ -0,0 +1,127 @@
+import box
+
+CHUNK = 64			# average openings per chunk; a power of two
+MAXCHUNK = 4 * CHUNK
+MAXSTEPS = 500
+
+def freeze(v):
+	if isinstance(v, (list, tuple)):
+		return tuple([freeze(x) for x in v])
+	return v
+
+def thaw(v):
+	if isinstance(v, tuple):
+		return [thaw(x) for x in v]
+	return v
+
+def freezeList(items, prev=None):
+	# openings are stored as a tuple of chunks of frozen (tuple) openings.  A
+	# chunk ends after any opening whose hash picks it as a boundary, so the
+	# boundaries depend on content rather than position: an insert or delete
+	# only changes the chunk it falls in, and every other chunk still equals
+	# one of the previous snapshot.  Such a chunk is that very chunk, so a
+	# step only costs memory for the chunks that actually changed.  Chunks
+	# are matched by value because the editor hands the box copies of its
+	# openings, never the objects it already holds.
+	old = {}
+	if prev is not None:
+		for ch in prev:
+			old[ch] = ch
+
+	chunks = []
+	run = []
+	for x in items:
+		fx = freeze(x)
+		run.append(fx)
+		if hash(fx) & (CHUNK - 1) == 0 or len(run) >= MAXCHUNK:
+			ch = tuple(run)
+			chunks.append(old.get(ch, ch))
+			run = []
+	if len(run) > 0:
+		ch = tuple(run)
+		chunks.append(old.get(ch, ch))
+	return tuple(chunks)
+
+def thawList(chunks):
+	return [thaw(x) for ch in chunks for x in ch]
+
+def sameChunks(a, b):
+	if len(a) != len(b):
+		return False
+	for i in range(len(a)):
+		if a[i] is not b[i]:
+			return False
+	return True
+
+class Snapshot:
+	def __init__(self, bx, prev=None):
+		st = bx.getSettingsState()
+		self.settings = tuple([(k, tuple(v) if isinstance(v, list) else v) for k, v in sorted(st.items())])
+		if prev is not None and prev.settings == self.settings:
+			self.settings = prev.settings
+
+		self.circles = tuple([freezeList(bx.faces[f].circles, None if prev is None else prev.circles[f]) for f in box.faceTypes])
+		self.rects = tuple([freezeList(bx.faces[f].rects, None if prev is None else prev.rects[f]) for f in box.faceTypes])
+
+	def sameAs(self, other):
+		if other is None or self.settings != other.settings:
+			return False
+		for f in box.faceTypes:
+			if not sameChunks(self.circles[f], other.circles[f]) or not sameChunks(self.rects[f], other.rects[f]):
+				return False
+		return True
+
+	def restore(self, bx, toolrad):
+		state = dict([(k, list(v) if isinstance(v, tuple) else v) for k, v in self.settings])
+		state["circles"] = [thawList(self.circles[f]) for f in box.faceTypes]
+		state["rectangles"] = [thawList(self.rects[f]) for f in box.faceTypes]
+		bx.setState(state, toolrad)
+
+class UndoHistory:
+	def __init__(self, maxSteps=MAXSTEPS):
+		self.maxSteps = maxSteps
+		self.undoStack = []
+		self.redoStack = []
+		self.current = None
+
+	def reset(self, bx):
+		self.undoStack = []
+		self.redoStack = []
+		self.current = Snapshot(bx)
+
+	def record(self, bx):
+		snap = Snapshot(bx, self.current)
+		if snap.sameAs(self.current):
+			return False
+
+		if self.current is not None:
+			self.undoStack.append(self.current)
+			if len(self.undoStack) > self.maxSteps:
+				del self.undoStack[0]
+		self.redoStack = []
+		self.current = snap
+		return True
+
+	def canUndo(self):
+		return len(self.undoStack) > 0
+
+	def canRedo(self):
+		return len(self.redoStack) > 0
+
+	def undo(self, bx, toolrad):
+		if not self.canUndo():
+			return False
+
+		self.redoStack.append(self.current)
+		self.current = self.undoStack.pop()
+		self.current.restore(bx, toolrad)
+		return True
+
+	def redo(self, bx, toolrad):
+		if not self.canRedo():
+			return False
+
+		self.undoStack.append(self.current)
+		self.current = self.redoStack.pop()
+		self.current.restore(bx, toolrad)
+		return True
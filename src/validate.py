@@ -0,0 +1,288 @@
+import sys
+from math import floor, sqrt
+
+EPS = 1e-6
+
+ERROR = 0
+WARNING = 1
+
+SELFINTERSECT = "self-intersection"
+NARROW = "narrower than the tool"
+COLLISION = "opening meets edge"
+OUTSIDE = "opening outside panel"
+OVERLAP = "openings overlap"
+
+class Problem:
+	def __init__(self, severity, kind, loc, text):
+		self.severity = severity
+		self.kind = kind
+		self.loc = loc
+		self.text = text
+
+	def __str__(self):
+		return "%s at (%.2f, %.2f): %s" % (self.kind, self.loc[0], self.loc[1], self.text)
+
+def errors(problems):
+	return [p for p in problems if p.severity == ERROR]
+
+class Grid:
+	# uniform spatial hash.  Every item is filed under each cell its bounding box
+	# touches, so a query only looks at items near the area asked about.
+	def __init__(self, cell):
+		self.cell = cell
+		self.cells = {}
+		self.rows = {}
+
+	def span(self, x0, y0, x1, y1):
+		c = self.cell
+		return int(floor(x0/c)), int(floor(y0/c)), int(floor(x1/c)), int(floor(y1/c))
+
+	def add(self, i, x0, y0, x1, y1):
+		cx0, cy0, cx1, cy1 = self.span(x0, y0, x1, y1)
+		for cx in range(cx0, cx1+1):
+			for cy in range(cy0, cy1+1):
+				self.cells.setdefault((cx, cy), []).append(i)
+		for cy in range(cy0, cy1+1):
+			self.rows.setdefault(cy, []).append(i)
+
+	def query(self, x0, y0, x1, y1):
+		cx0, cy0, cx1, cy1 = self.span(x0, y0, x1, y1)
+		found = set()
+		if (cx1-cx0+1) * (cy1-cy0+1) > len(self.cells):
+			# a large area covers more empty cells than there are full ones
+			for (cx, cy), items in self.cells.items():
+				if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+					found.update(items)
+			return found
+
+		for cx in range(cx0, cx1+1):
+			for cy in range(cy0, cy1+1):
+				items = self.cells.get((cx, cy))
+				if items is not None:
+					found.update(items)
+		return found
+
+def orient(a, b, c):
+	v = (b[0]-a[0])*(c[1]-a[1]) - (b[1]-a[1])*(c[0]-a[0])
+	if v > EPS:
+		return 1
+	if v < -EPS:
+		return -1
+	return 0
+
+def onSegment(a, b, p):
+	return min(a[0], b[0]) - EPS <= p[0] <= max(a[0], b[0]) + EPS and min(a[1], b[1]) - EPS <= p[1] <= max(a[1], b[1]) + EPS
+
+def samePoint(a, b):
+	return abs(a[0]-b[0]) <= EPS and abs(a[1]-b[1]) <= EPS
+
+def crossing(a, b, c, d):
+	# how segments ab and cd meet: None, "cross", or "overlap" when they are
+	# collinear and share more than a point.  Touching at an end point of both
+	# is not reported, since the outline doubles back on itself at every relief.
+	o1 = orient(a, b, c)
+	o2 = orient(a, b, d)
+	o3 = orient(c, d, a)
+	o4 = orient(c, d, b)
+
+	if o1 == 0 and o2 == 0:
+		# collinear; compare the extents along the longer axis
+		k = 0 if abs(b[0]-a[0]) >= abs(b[1]-a[1]) else 1
+		lo = max(min(a[k], b[k]), min(c[k], d[k]))
+		hi = min(max(a[k], b[k]), max(c[k], d[k]))
+		if hi - lo > EPS and o3 == 0 and o4 == 0:
+			return "overlap"
+		return None
+
+	if o1 != o2 and o3 != o4:
+		if o1 != 0 and o2 != 0 and o3 != 0 and o4 != 0:
+			return "cross"
+		for p in [a, b]:
+			for q in [c, d]:
+				if samePoint(p, q):
+					return None
+		return "cross"
+
+	for p, s, t in [[c, a, b], [d, a, b], [a, c, d], [b, c, d]]:
+		if orient(s, t, p) == 0 and onSegment(s, t, p):
+			for q in [s, t]:
+				if samePoint(p, q):
+					break
+			else:
+				return "cross"
+	return None
+
+def intersection(a, b, c, d):
+	dx1 = b[0]-a[0]
+	dy1 = b[1]-a[1]
+	dx2 = d[0]-c[0]
+	dy2 = d[1]-c[1]
+	den = dx1*dy2 - dy1*dx2
+	if abs(den) < EPS:
+		return [(max(min(a[0], b[0]), min(c[0], d[0])) + min(max(a[0], b[0]), max(c[0], d[0])))/2.0,
+			(max(min(a[1], b[1]), min(c[1], d[1])) + min(max(a[1], b[1]), max(c[1], d[1])))/2.0]
+	t = ((c[0]-a[0])*dy2 - (c[1]-a[1])*dx2) / den
+	return [a[0] + t*dx1, a[1] + t*dy1]
+
+def pointSegDist(p, a, b):
+	dx = b[0]-a[0]
+	dy = b[1]-a[1]
+	l2 = dx*dx + dy*dy
+	if l2 < EPS*EPS:
+		return sqrt((p[0]-a[0])**2 + (p[1]-a[1])**2)
+	t = max(0.0, min(1.0, ((p[0]-a[0])*dx + (p[1]-a[1])*dy) / l2))
+	x = a[0] + t*dx
+	y = a[1] + t*dy
+	return sqrt((p[0]-x)**2 + (p[1]-y)**2)
+
+def pointRectDist(p, x0, y0, x1, y1):
+	dx = max(x0 - p[0], 0.0, p[0] - x1)
+	dy = max(y0 - p[1], 0.0, p[1] - y1)
+	return sqrt(dx*dx + dy*dy)
+
+def rectSegDist(x0, y0, x1, y1, a, b):
+	corners = [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+	for i in range(4):
+		if crossing(a, b, corners[i], corners[(i+1) % 4]) is not None:
+			return 0.0
+	if pointRectDist(a, x0, y0, x1, y1) == 0.0:
+		return 0.0
+	return min([pointRectDist(a, x0, y0, x1, y1), pointRectDist(b, x0, y0, x1, y1)] + [pointSegDist(c, a, b) for c in corners])
+
+def insidePolygon(p, segs, grid):
+	# even-odd ray cast to the right, looking only at the segments filed in the
+	# row of cells the ray runs through
+	inside = False
+	for i in grid.rows.get(int(floor(p[1]/grid.cell)), []):
+		a, b = segs[i]
+		if (a[1] > p[1]) != (b[1] > p[1]):
+			x = a[0] + (p[1]-a[1]) * (b[0]-a[0]) / (b[1]-a[1])
+			if x > p[0]:
+				inside = not inside
+	return inside
+
+def openingBox(o):
+	if len(o) == 2:
+		(cx, cy), r = o
+		return cx-r, cy-r, cx+r, cy+r
+	(cx, cy), w, h = o
+	return cx-w/2.0, cy-h/2.0, cx+w/2.0, cy+h/2.0
+
+def openingSegDist(o, a, b):
+	if len(o) == 2:
+		return pointSegDist(o[0], a, b) - o[1]
+	x0, y0, x1, y1 = openingBox(o)
+	return rectSegDist(x0, y0, x1, y1, a, b)
+
+def openingsMeet(o, p):
+	if len(o) == 2 and len(p) == 2:
+		return sqrt((o[0][0]-p[0][0])**2 + (o[0][1]-p[0][1])**2) < o[1] + p[1] - EPS
+	if len(o) == 2 or len(p) == 2:
+		c, r = (o, p) if len(o) == 2 else (p, o)
+		x0, y0, x1, y1 = openingBox(r)
+		return pointRectDist(c[0], x0, y0, x1, y1) < c[1] - EPS
+	ax0, ay0, ax1, ay1 = openingBox(o)
+	bx0, by0, bx1, by1 = openingBox(p)
+	return ax0 < bx1 - EPS and bx0 < ax1 - EPS and ay0 < by1 - EPS and by0 < ay1 - EPS
+
+def validate(pts, circles, rects, toolrad, notches=[]):
+	# pts is the tool path around the panel as returned by face.render, i.e.
+	# already offset outwards by the tool radius; circles and rects are the
+	# openings at their finished size.  notches are rectangles that are meant to
+	# run off the edge of the panel.  Every check files its items in a spatial
+	# hash, so the cost grows with the number of features, not its square.
+	problems = []
+
+	segs = [[pts[i], pts[i+1]] for i in range(len(pts)-1) if not samePoint(pts[i], pts[i+1])]
+	n = len(segs)
+	if n < 3:
+		return problems
+
+	total = sum([abs(b[0]-a[0]) + abs(b[1]-a[1]) for a, b in segs])
+	grid = Grid(max(2.0 * total / n, toolrad, EPS))
+	for i in range(n):
+		a, b = segs[i]
+		grid.add(i, min(a[0], b[0]), min(a[1], b[1]), max(a[0], b[0]), max(a[1], b[1]))
+
+	seen = set()
+	for items in grid.cells.values():
+		for j in range(len(items)):
+			for k in range(j+1, len(items)):
+				i1, i2 = items[j], items[k]
+				if i1 > i2:
+					i1, i2 = i2, i1
+				if i2 - i1 == 1 or (i1 == 0 and i2 == n-1) or (i1, i2) in seen:
+					continue
+				seen.add((i1, i2))
+				a, b = segs[i1]
+				c, d = segs[i2]
+				how = crossing(a, b, c, d)
+				if how == "cross":
+					problems.append(Problem(ERROR, SELFINTERSECT, intersection(a, b, c, d), "tool path crosses itself"))
+				elif how == "overlap":
+					# the path only folds back over itself like this where a slot
+					# or the gap between two tabs is narrower than the tool
+					problems.append(Problem(ERROR, NARROW, intersection(a, b, c, d), "slot or gap narrower than %.2f" % (2*toolrad)))
+
+	openings = [[c, "circle", openingBox(c)] for c in circles] + [[r, "rectangle", openingBox(r)] for r in rects]
+	openings += [[r, "notch", openingBox(r)] for r in notches]
+	for o, name, (x0, y0, x1, y1) in openings:
+		if len(o) == 2 and o[1] - toolrad < -EPS:
+			problems.append(Problem(ERROR, NARROW, o[0], "%s of radius %.2f is smaller than the tool" % (name, o[1])))
+		elif len(o) == 3 and min(o[1], o[2]) - 2*toolrad < -EPS:
+			problems.append(Problem(ERROR, NARROW, o[0], "%s %.2f x %.2f is narrower than the tool" % (name, o[1], o[2])))
+		if name == "notch":
+			continue
+
+		hit = None
+		for i in grid.query(x0-toolrad, y0-toolrad, x1+toolrad, y1+toolrad):
+			if openingSegDist(o, segs[i][0], segs[i][1]) < toolrad - EPS:
+				hit = i
+				break
+		if hit is not None:
+			problems.append(Problem(ERROR, COLLISION, o[0], "%s runs into the panel edge" % name))
+		elif not insidePolygon(o[0], segs, grid):
+			problems.append(Problem(ERROR, OUTSIDE, o[0], "%s is not inside the panel" % name))
+
+	if len(openings) > 1:
+		sizes = [max(x1-x0, y1-y0) for o, name, (x0, y0, x1, y1) in openings]
+		ogrid = Grid(max(sum(sizes) / len(sizes), EPS))
+		for i in range(len(openings)):
+			ogrid.add(i, *openings[i][2])
+		for i in range(len(openings)):
+			o = openings[i][0]
+			for j in ogrid.query(*openings[i][2]):
+				if j > i and openingsMeet(o, openings[j][0]):
+					problems.append(Problem(WARNING, OVERLAP, o[0], "%s overlaps %s" % (openings[i][1], openings[j][1])))
+
+	return problems
+
+def validatePanel(bx, ft, toolrad):
+	pts, circles, rects = bx.render(ft, toolrad)
+	notches = bx.getNotches(ft)
+	return validate(pts, circles, [r for r in rects if r not in notches], toolrad, notches)
+
+def validateBox(bx, toolrad):
+	return dict([[ft, validatePanel(bx, ft, toolrad)] for ft in bx.panelTypes()])
+
+if __name__ == "__main__":
+	import box
+	import boxfile
+
+	if len(sys.argv) < 2:
+		print("usage: %s boxfile [--toolrad=r]" % sys.argv[0])
+		sys.exit(1)
+
+	toolrad = 1.5
+	for a in sys.argv[2:]:
+		if a.startswith("--toolrad="):
+			toolrad = float(a[10:])
+
+	bx = box.fromState(boxfile.readBox(sys.argv[1]), toolrad)
+	failed = False
+	for ft, problems in validateBox(bx, toolrad).items():
+		for p in problems:
+			print("%s: %s%s" % (bx.panelName(ft), "" if p.severity == ERROR else "warning: ", str(p)))
+		if len(errors(problems)) > 0:
+			failed = True
+	sys.exit(1 if failed else 0)